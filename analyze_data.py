@@ -1,20 +1,29 @@
-import pandas as pd
-import openpyxl
+import sys
 
-# Carregar a planilha
+from engine.ingest import ingest_files
+
+# Planilha padrão (outros arquivos podem ser passados na linha de comando)
 excel_file = 'LICENCIAMENTO MICROSOFT (1).xlsx'
 
-# Ler todas as abas
-xls = pd.ExcelFile(excel_file)
-print("Abas disponíveis:", xls.sheet_names)
-print("\n" + "="*80 + "\n")
-
-# Analisar cada aba
-for sheet_name in xls.sheet_names:
-    df = pd.read_excel(excel_file, sheet_name=sheet_name)
-    print(f"ABA: {sheet_name}")
-    print(f"Dimensões: {df.shape[0]} linhas x {df.shape[1]} colunas")
-    print(f"Colunas: {list(df.columns)}")
-    print(f"\nPrimeiras linhas:")
-    print(df.head(3))
-    print("\n" + "="*80 + "\n")
+
+def main(paths):
+    # Ler todas as abas de todos os arquivos em paralelo
+    results, report = ingest_files(paths)
+
+    for info in report:
+        print(f"ARQUIVO: {info['arquivo']} ({info['linhas']} linhas em {info['segundos']:.2f}s)")
+        print("Abas disponíveis:", list(info['abas']))
+        print("\n" + "="*80 + "\n")
+
+        # Analisar cada aba
+        for sheet_name, df in results[info['arquivo']].items():
+            print(f"ABA: {sheet_name} ({info['abas'][sheet_name]['segundos']:.2f}s)")
+            print(f"Dimensões: {df.shape[0]} linhas x {df.shape[1]} colunas")
+            print(f"Colunas: {list(df.columns)}")
+            print(f"\nPrimeiras linhas:")
+            print(df.head(3))
+            print("\n" + "="*80 + "\n")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [excel_file])
@@ -0,0 +1,369 @@
+"""Entrada ASGI do dashboard: API com I/O no event loop e pandas num executor limitado
+
+As rotas mais acessadas rodam direto aqui (sem passar pelo Flask):
+    GET /api/usuarios, GET /api/usuarios/<licenca>, GET /api/rateio_contrato (CSV),
+    GET /api/jobs/<id>, GET /api/jobs/<id>/download e GET /api/events (SSE)
+    (também sob /t/<tenant>)
+O restante (página, POSTs de rateio/exportação, métricas...) é repassado ao app
+Flask: o corpo da requisição é lido no event loop, a view roda no executor e a
+resposta é enviada em blocos, sem prender uma thread esperando o cliente.
+
+Uso (requer um servidor ASGI, ex.: pip install uvicorn):
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+O servidor Flask (python dashboard_flask.py) continua funcionando como antes.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import dashboard_flask
+from engine.metrics import end_trace, server_timing, start_trace
+
+
+# Threads para o trabalho pesado (pandas, leitura das planilhas, views do Flask)
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 4))
+
+# Tamanho dos blocos ao enviar arquivos de exportação
+CHUNK_SIZE = 256 * 1024
+
+executor = ThreadPoolExecutor(ASGI_WORKERS, thread_name_prefix='asgi')
+
+_ROUTE = re.compile(r'^(?P<prefix>/t/(?P<tenant>[^/]+))?(?P<rule>/api/.+)$')
+_USUARIOS = re.compile(r'^/api/usuarios/(?P<licenca>[^/]+)$')
+_JOB = re.compile(r'^/api/jobs/(?P<job_id>[^/]+)(?P<download>/download)?$')
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def run_sync(fn, *args, ctx=None):
+    """Roda `fn` no executor, levando o contexto (spans da requisição) para a thread
+
+    Com `ctx`, roda nesse contexto em vez de uma cópia nova: chamadas em sequência
+    compartilham o que as anteriores guardaram nele (ex.: o contexto de requisição
+    do Flask aberto por stream_with_context).
+    """
+    ctx = ctx or contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, ctx.run, fn, *args)
+
+
+def _header_list(headers):
+    return [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers]
+
+
+async def send_bytes(send, status, body, content_type, headers=()):
+    headers = [('Content-Type', content_type), ('Content-Length', len(body))] + list(headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': _header_list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+# ---------------------------------------------------------------------------
+# Rotas nativas: devolvem None quando o caso deve ficar com o Flask
+# (tenant inexistente, parâmetros inválidos, XLSX, perfil...)
+
+def parse_query(scope):
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+
+def _known(tenant):
+    return dashboard_flask.registry.get(tenant) is not None
+
+
+async def usuarios(scope, tenant, licenca=None):
+    query = parse_query(scope)
+
+    def build():
+        if not _known(tenant):
+            return None
+        snapshot = dashboard_flask.registry.snapshot(tenant)
+        if dashboard_flask.paged(query):
+            return dashboard_flask.usuarios_page_json(snapshot, licenca, query)
+        if licenca is None:
+            return dashboard_flask.todos_usuarios_json(snapshot)
+        return dashboard_flask.licenca_usuarios_json(snapshot, licenca)
+
+    payload = await run_sync(build)
+    if payload is None:
+        return None
+    return 200, payload.encode('utf-8'), 'application/json', []
+
+
+async def rateio_contrato(scope, tenant):
+    query = parse_query(scope)
+    empresa, licenca, modalidade = query.get('empresa'), query.get('licenca'), query.get('modalidade')
+    if not empresa or not licenca or query.get('format', 'csv').lower() != 'csv':
+        return None
+
+    def build():
+        if not _known(tenant):
+            return None
+        return dashboard_flask.contract_rateio(dashboard_flask.registry.snapshot(tenant), empresa, licenca, modalidade)
+
+    result = await run_sync(build)
+    if result is None:
+        return None
+    csv_data, file_name = result
+    return 200, csv_data.encode('utf-8'), 'text/csv; charset=utf-8', [
+        ('Content-Disposition', f'attachment; filename="{file_name}"')
+    ]
+
+
+async def job(scope, send, tenant, prefix, job_id, download=False):
+    # Consulta em memória: responde direto no event loop
+    source = dashboard_flask.registry.get(tenant)
+    found = dashboard_flask.jobs.get(job_id)
+    if source is None or found is None or found.slug != source.slug:
+        return None
+    if not download:
+        info = dashboard_flask.job_json(found, scope.get('root_path', '') + prefix)
+        return 200, dashboard_flask.app.json.dumps(info).encode('utf-8'), 'application/json', []
+    if found.status != 'concluido':
+        return None
+
+    # Arquivo enviado em blocos; a leitura do disco fica no executor
+    fh = await run_sync(open, found.path, 'rb')
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': _header_list([
+            ('Content-Type', found.mimetype),
+            ('Content-Length', found.size),
+            ('Content-Disposition', f'attachment; filename="{found.file_name}"'),
+            ('X-Filename', found.file_name),
+            ('Cache-Control', 'no-cache')
+        ])})
+        while True:
+            chunk = await run_sync(fh.read, CHUNK_SIZE)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': bool(chunk)})
+            if not chunk:
+                break
+    finally:
+        fh.close()
+    return 200, None, None, None
+
+
+async def events(scope, receive, send, tenant):
+    """SSE da versão do dataset: a espera fica no event loop, sem ocupar o executor"""
+    source = dashboard_flask.registry.get(tenant)
+    if source is None:
+        return None
+    slug, feed = source.slug, dashboard_flask.dataset_feed
+    headers = dict((k.decode('latin-1'), v.decode('latin-1')) for k, v in scope.get('headers', []))
+    version = parse_query(scope).get('versao') or headers.get('last-event-id') or feed.version(slug)
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_publish(published, _version):
+        if published == slug:
+            loop.call_soon_threadsafe(changed.set)
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    feed.subscribe(on_publish)
+    watch = asyncio.ensure_future(disconnected())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': _header_list([
+            ('Content-Type', 'text/event-stream; charset=utf-8'),
+            ('Cache-Control', 'no-cache'),
+            ('X-Accel-Buffering', 'no')
+        ])})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        deadline = time.monotonic() + dashboard_flask.SSE_MAX_SECONDS
+        while not watch.done() and time.monotonic() < deadline:
+            changed.clear()
+            current = feed.version(slug)
+            if current is not None and current != version:
+                version = current
+                message = dashboard_flask.dataset_event(slug, version)
+            else:
+                message = ': ping\n\n'
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            timeout = min(dashboard_flask.SSE_HEARTBEAT_SECONDS, deadline - time.monotonic())
+            waiter = asyncio.ensure_future(changed.wait())
+            await asyncio.wait([watch, waiter], timeout=max(0, timeout), return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        if not watch.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        feed.unsubscribe(on_publish)
+        watch.cancel()
+    return 200, None, None, None
+
+
+async def native(scope, receive, send):
+    """Atende a rota sem o Flask; devolve (rota, status, início) ou None para repassar ao Flask"""
+    match = _ROUTE.match(scope['path'])
+    if not match or scope['method'] != 'GET' or b'__profile' in scope.get('query_string', b''):
+        return None
+    tenant, prefix, rule = match.group('tenant'), match.group('prefix') or '', match.group('rule')
+    route_prefix = '/t/<tenant>' if tenant else ''
+
+    if rule == '/api/usuarios':
+        route, handler = '/api/usuarios', usuarios(scope, tenant)
+    elif _USUARIOS.match(rule):
+        licenca = _USUARIOS.match(rule).group('licenca')
+        route, handler = '/api/usuarios/<licenca>', usuarios(scope, tenant, licenca)
+    elif rule == '/api/rateio_contrato':
+        route, handler = '/api/rateio_contrato', rateio_contrato(scope, tenant)
+    elif rule == '/api/events':
+        route, handler = '/api/events', events(scope, receive, send, tenant)
+    elif _JOB.match(rule):
+        m = _JOB.match(rule)
+        route = '/api/jobs/<job_id>' + (m.group('download') or '')
+        handler = job(scope, send, tenant, prefix, m.group('job_id'), bool(m.group('download')))
+    else:
+        return None
+
+    spans = start_trace()
+    started = time.perf_counter()
+    try:
+        result = await handler
+    finally:
+        end_trace()
+    if result is None:
+        return None
+    status, body, content_type, headers = result
+    if body is not None:
+        elapsed = time.perf_counter() - started
+        headers = headers + [('Server-Timing', server_timing(spans, elapsed))]
+        await send_bytes(send, status, body, content_type, headers)
+    return route_prefix + route, status, started
+
+
+# ---------------------------------------------------------------------------
+# Demais rotas: app Flask (WSGI) executado no executor
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def call_wsgi(scope, receive, send):
+    body = await read_body(receive)
+    environ = wsgi_environ(scope, body)
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+        return lambda data: None
+
+    def call():
+        result = dashboard_flask.app(environ, start_response)
+        # Respostas em memória (a maioria) saem inteiras; arquivos e streams em blocos
+        if isinstance(result, (list, tuple)):
+            return result, None
+        return None, result
+
+    # Um único contexto para a chamada, cada bloco e o close(): respostas em streaming
+    # continuam no contexto de requisição do Flask empilhado no primeiro bloco
+    ctx = contextvars.copy_context()
+    chunks, iterable = await run_sync(call, ctx=ctx)
+    await send({'type': 'http.response.start', 'status': started['status'],
+                'headers': _header_list(started['headers'])})
+    if chunks is not None:
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+        return
+
+    iterator = iter(iterable)
+    try:
+        while True:
+            chunk = await run_sync(next, iterator, None, ctx=ctx)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            await run_sync(close, ctx=ctx)
+
+
+# ---------------------------------------------------------------------------
+
+def startup():
+    dashboard_flask.preload_sources()
+    dashboard_flask.start_background_jobs()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await run_sync(startup)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    try:
+        handled = await native(scope, receive, send)
+        if handled is not None:
+            route, status, started = handled
+            dashboard_flask.REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                                    method=scope['method'], status=status)
+            return
+        await call_wsgi(scope, receive, send)
+    except ClientDisconnected:
+        pass
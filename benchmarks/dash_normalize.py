@@ -0,0 +1,122 @@
+"""Benchmark da normalização de valores do dashboard Dash (dashboard.py)
+
+Compara o load_data() antigo do dashboard Dash (total vazio preenchido com
+df.apply linha a linha) com o caminho que o Dash usa hoje: validação e modelo
+de custos do motor (engine.dataset.prepare_planilha) seguidos da visão com os
+nomes do Dash (engine.schema.view). Os dois partem da mesma planilha
+sintética, com datas em texto e ~10% de totais vazios.
+
+Os totais vazios seguem regras diferentes (unitário x quantidade no antigo, o
+pro-rata validado no motor), então a conferência cobre as datas e os totais
+já preenchidos na planilha.
+
+Uso:
+    python benchmarks/dash_normalize.py                  # 100k linhas
+    python benchmarks/dash_normalize.py --sizes 10k,100k,1m --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine.dataset import prepare_planilha  # noqa: E402
+from engine.schema import DASH_COLUMNS, DASH_VIEW, view  # noqa: E402
+from engine.sources import Snapshot  # noqa: E402
+from synthetic import generate_frame, parse_size  # noqa: E402
+
+
+# Colunas de data, com os nomes canônicos e os do dashboard.py
+DATE_COLUMNS = ['DataCriacaoFormatada', 'inicioContrato', 'finalContrato']
+DASH_DATE_COLUMNS = [DASH_COLUMNS[c] for c in DATE_COLUMNS]
+
+
+def planilha_frame(rows):
+    """DataFrame sintético como lido da planilha: datas em texto e ~10% de totais vazios"""
+    df = generate_frame(rows)
+    for column in DATE_COLUMNS:
+        df[column] = df[column].dt.strftime('%Y-%m-%d')
+    df.loc[df.index[::10], 'valorTotalLicenca'] = None
+    df['valorTotalLicenca'] = df['valorTotalLicenca'].astype(object)
+    return df
+
+
+def normalize_apply(df):
+    """Versão anterior do load_data(): colunas do Dash e total vazio preenchido linha a linha"""
+    df = df.rename(columns=DASH_COLUMNS)
+    df['valor unitario'] = pd.to_numeric(df['valor unitario'], errors='coerce')
+    df['quantidade de licenças'] = pd.to_numeric(df['quantidade de licenças'], errors='coerce')
+    df['total'] = pd.to_numeric(df['total'], errors='coerce')
+    df['total'] = df.apply(
+        lambda row: row['valor unitario'] * row['quantidade de licenças']
+        if pd.isna(row['total']) else row['total'],
+        axis=1
+    )
+    for column in DASH_DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+
+def normalize_engine(df):
+    """Caminho atual: validação e custos do motor, depois a visão com os nomes do Dash"""
+    df, _ = prepare_planilha(df)
+    return view(Snapshot(df, 'benchmark', 0), DASH_VIEW)
+
+
+def check(antigo, novo, preenchido):
+    """Mesmas linhas, mesmas datas e mesmos totais onde a planilha já tinha o valor"""
+    assert len(antigo) == len(novo), 'quantidade de linhas diferente'
+    for column in DASH_DATE_COLUMNS:
+        pd.testing.assert_series_equal(novo[column], antigo[column].reset_index(drop=True), check_names=False)
+    assert np.allclose(novo['total'][preenchido], antigo['total'].reset_index(drop=True)[preenchido])
+    assert novo['total'].notna().all(), 'total vazio depois da validação'
+
+
+def measure(fns, frame, repeat):
+    """Tempos (ms) de cada função sobre cópias de `frame`, e os últimos resultados
+
+    As funções se alternam a cada repetição, para que a carga da máquina afete
+    todas igualmente.
+    """
+    times = [[] for _ in fns]
+    outs = [None] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            df = frame.copy()
+            start = time.perf_counter()
+            outs[i] = fn(df)
+            times[i].append((time.perf_counter() - start) * 1000)
+    return times, outs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da normalização do dashboard Dash')
+    parser.add_argument('--sizes', default='100k', help='tamanhos (ex.: 10k,100k,1m)')
+    parser.add_argument('--repeat', type=int, default=7, help='repetições por caso')
+    args = parser.parse_args(argv)
+
+    print(f"{'linhas':>10}{'apply ms':>14}{'motor ms':>12}{'razão':>10}")
+    lentos = []
+    for rows in [parse_size(s) for s in args.sizes.split(',') if s.strip()]:
+        frame = planilha_frame(rows)
+        preenchido = frame['valorTotalLicenca'].notna().to_numpy()
+        (antigo, novo), (esperado, obtido) = measure([normalize_apply, normalize_engine], frame, args.repeat)
+        check(esperado, obtido, preenchido)
+        antigo, novo = statistics.median(antigo), statistics.median(novo)
+        print(f'{rows:>10}{antigo:>14.1f}{novo:>12.1f}{antigo / novo:>9.1f}x')
+        if novo > antigo:
+            lentos.append(rows)
+    # O caminho do motor não pode ser mais lento que o apply que ele substituiu
+    assert not lentos, f'motor mais lento que o apply antigo em {lentos} linhas'
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""Teste de carga: reproduz o tráfego do dashboard e mede latência por rota
+
+Cliente HTTP puro em asyncio (sem dependências extras), com usuários virtuais
+que alternam entre os cenários reais:
+    - pagina:   GET / com combinações aleatórias de filtros
+    - licenca:  GET /api/usuarios/<licenca> (drill-down de licença)
+    - usuarios: GET /api/usuarios (modal "todos os usuários")
+    - rateio:   POST /api/rateio_contratos com vários contratos
+
+Uso:
+    python benchmarks/loadtest.py --rows 100k --users 16 --duration 60
+    python benchmarks/loadtest.py --url http://localhost:5000 --workbook "LICENCIAMENTO MICROSOFT (1).xlsx"
+    python benchmarks/loadtest.py --server ambos --mix licenca=40,usuarios=40,rateio=20
+
+Com --server, a instância local roda no servidor multithread do werkzeug
+(padrão), na entrada ASGI (asgi.py, via uvicorn) ou nos dois, em sequência,
+com a comparação de vazão e p95 por rota.
+
+Sem --url, sobe uma instância local (em outro processo) com uma planilha
+sintética de --rows linhas. Os valores usados nos cenários são lidos da mesma
+planilha servida pela instância (--workbook).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import quote, urlencode, urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# Peso padrão de cada cenário no tráfego
+DEFAULT_MIX = 'pagina=50,licenca=25,usuarios=10,rateio=15'
+
+# Tempo máximo de espera para a instância local ficar pronta (s)
+STARTUP_TIMEOUT = 600
+
+
+class HTTPClient:
+    """Conexão HTTP/1.1 keep-alive mínima sobre asyncio"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+    async def request(self, method, path, body=None):
+        """Retorna (status, corpo); reconecta se o servidor fechou"""
+        for attempt in (0, 1):
+            if self.writer is None:
+                await self._connect()
+            try:
+                return await self._request(method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _request(self, method, path, body):
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if body is not None:
+            head += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        if not status_line:
+            raise ConnectionError('conexão fechada')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                chunk = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                parts.append((await self.reader.readexactly(chunk + 2))[:chunk])
+                if chunk == 0:
+                    break
+            data = b''.join(parts)
+        else:
+            data = await self.reader.read()
+            await self.close()
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, data
+
+
+def scenario_values(workbook):
+    """Valores reais de filtros, licenças e contratos da planilha servida"""
+    import dashboard_flask
+    from engine.dataset import read_planilha
+
+    df, _ = read_planilha(workbook, 'Planilha1')
+    filtros = {key: sorted(df[column].dropna().unique().tolist())
+               for key, (column, _) in dashboard_flask.FILTER_COLUMNS.items()}
+    contratos = (df[['empresa', 'licenca', 'modalidadeLicenca']].dropna().drop_duplicates()
+                 .rename(columns={'modalidadeLicenca': 'modalidade'}).to_dict('records'))
+    return filtros, contratos
+
+
+def make_scenarios(filtros, contratos, rng):
+    """Cenários do tráfego: função que devolve (rota, método, caminho, corpo)"""
+
+    def pagina():
+        chaves = rng.sample(list(filtros), rng.randint(0, 3))
+        query = {k: rng.choice(filtros[k]) for k in chaves if filtros[k]}
+        return 'GET /', 'GET', '/' + ('?' + urlencode(query) if query else ''), None
+
+    def licenca():
+        return 'GET /api/usuarios/<licenca>', 'GET', '/api/usuarios/' + quote(rng.choice(filtros['licenca']), safe=''), None
+
+    def usuarios():
+        return 'GET /api/usuarios', 'GET', '/api/usuarios', None
+
+    def rateio():
+        escolhidos = rng.sample(contratos, min(len(contratos), rng.randint(1, 10)))
+        return 'POST /api/rateio_contratos', 'POST', '/api/rateio_contratos', {'contracts': escolhidos}
+
+    return {'pagina': pagina, 'licenca': licenca, 'usuarios': usuarios, 'rateio': rateio}
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def virtual_user(host, port, scenarios, mix, rng, deadline, budget, think, samples):
+    client = HTTPClient(host, port)
+    names, weights = list(mix), list(mix.values())
+    try:
+        while time.perf_counter() < deadline and budget['restantes'] != 0:
+            budget['restantes'] -= 1
+            route, method, path, body = scenarios[rng.choices(names, weights)[0]]()
+            start = time.perf_counter()
+            try:
+                status, data = await client.request(method, path, body)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status, data = 0, b''
+                await client.close()
+            elapsed = time.perf_counter() - start
+            # Página em streaming interrompida no meio chega com status 200: conta como erro
+            if route == 'GET /' and status == 200 and not data.rstrip().endswith(b'</html>'):
+                status = 0
+            samples.append((route, elapsed, status, len(data)))
+            if think:
+                await asyncio.sleep(rng.uniform(0, 2 * think))
+    finally:
+        await client.close()
+
+
+async def run_load(host, port, scenarios, mix, users, duration, requests, think, seed):
+    samples = []
+    budget = {'restantes': requests or -1}
+    started = time.perf_counter()
+    deadline = started + duration if duration else float('inf')
+    await asyncio.gather(*[
+        virtual_user(host, port, scenarios, mix, random.Random(seed + i), deadline, budget, think, samples)
+        for i in range(users)
+    ])
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Resumo por rota: p50/p95/p99 (ms), vazão (req/s) e erros"""
+    by_route = {}
+    for route, seconds, status, size in samples:
+        by_route.setdefault(route, []).append((seconds, status, size))
+    by_route['TOTAL'] = [(s, st, sz) for _, s, st, sz in samples]
+
+    report = []
+    for route, items in by_route.items():
+        lat = np.array([s for s, _, _ in items]) * 1000
+        report.append({
+            'rota': route,
+            'requisicoes': len(items),
+            'erros': sum(1 for _, st, _ in items if not 200 <= st < 400),
+            'p50_ms': round(float(np.percentile(lat, 50)), 2),
+            'p95_ms': round(float(np.percentile(lat, 95)), 2),
+            'p99_ms': round(float(np.percentile(lat, 99)), 2),
+            'max_ms': round(float(lat.max()), 2),
+            'req_s': round(len(items) / elapsed, 2),
+            'kb_medio': round(sum(sz for _, _, sz in items) / len(items) / 1024, 1)
+        })
+    return report
+
+
+def print_report(report, elapsed):
+    print(f"\n{'rota':<30}{'req':>7}{'erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'req/s':>9}{'KB':>9}")
+    for r in report:
+        print(f"{r['rota']:<30}{r['requisicoes']:>7}{r['erros']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['req_s']:>9.1f}{r['kb_medio']:>9.1f}")
+    print(f'\nDuração: {elapsed:.1f}s')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local(workbook, port, server='werkzeug'):
+    """Sobe o dashboard em outro processo (werkzeug multithread ou ASGI via uvicorn)"""
+    env = dict(os.environ, EXCEL_FILE=os.path.abspath(workbook), WARMUP_ENABLED='0')
+    env.pop('DATA_SOURCES', None)
+    env.pop('DATA_SOURCES_FILE', None)
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port), '--server', server],
+                            cwd=ROOT, env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('a instância local terminou durante a inicialização')
+        try:
+            # A primeira requisição também carrega a planilha (aquecimento)
+            with urllib.request.urlopen(url + '/api/dataset/quality', timeout=STARTUP_TIMEOUT):
+                return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError('a instância local não respondeu a tempo')
+
+
+def check_page(url):
+    """Confere que GET / devolve a página inteira (o corpo em streaming chega até </html>)"""
+    with urllib.request.urlopen(url + '/', timeout=STARTUP_TIMEOUT) as response:
+        body = response.read()
+    if response.status != 200 or not body.rstrip().endswith(b'</html>'):
+        raise RuntimeError(f'GET / não renderizou a página completa (status {response.status}, {len(body)} bytes)')
+    return len(body)
+
+
+def serve(port, server='werkzeug'):
+    import logging
+
+    if server == 'asgi':
+        import uvicorn
+
+        # Sem o log de acesso por requisição, que distorce a medição
+        uvicorn.run('asgi:app', host='127.0.0.1', port=port, log_level='warning', access_log=False)
+        return
+
+    from werkzeug.serving import make_server
+
+    import dashboard_flask
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, dashboard_flask.app, threaded=True).serve_forever()
+
+
+def print_comparison(reports):
+    """Vazão e p95 de cada rota nos dois servidores"""
+    (name_a, report_a), (name_b, report_b) = reports
+    b_by_route = {r['rota']: r for r in report_b}
+    print(f"\n{'rota':<30}{'req/s ' + name_a:>16}{'req/s ' + name_b:>16}{'p95 ' + name_a:>16}{'p95 ' + name_b:>16}")
+    for a in report_a:
+        b = b_by_route.get(a['rota'])
+        if b:
+            print(f"{a['rota']:<30}{a['req_s']:>16.1f}{b['req_s']:>16.1f}{a['p95_ms']:>16.1f}{b['p95_ms']:>16.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do dashboard de licenciamento')
+    parser.add_argument('--url', help='instância já em execução (ex.: http://localhost:5000)')
+    parser.add_argument('--workbook', help='planilha servida pela instância (padrão: sintética com --rows)')
+    parser.add_argument('--rows', default='10k', help='linhas da planilha sintética (ex.: 10k, 100k, 1m)')
+    parser.add_argument('--users', type=int, default=16, help='usuários virtuais simultâneos')
+    parser.add_argument('--duration', type=float, default=30, help='duração em segundos')
+    parser.add_argument('--requests', type=int, help='número total de requisições (em vez da duração)')
+    parser.add_argument('--think', type=float, default=0, help='pausa média entre requisições (s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='peso de cada cenário')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='grava o relatório neste arquivo')
+    parser.add_argument('--server', choices=['werkzeug', 'asgi', 'ambos'], default='werkzeug',
+                        help='servidor da instância local (ambos: compara werkzeug e ASGI)')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.server)
+        return 0
+    if args.url and args.server == 'ambos':
+        parser.error('--server ambos só vale para instâncias locais (sem --url)')
+
+    from synthetic import cached_workbook, parse_size
+
+    if args.workbook:
+        workbook = args.workbook
+    elif args.url:
+        workbook = os.path.join(ROOT, 'LICENCIAMENTO MICROSOFT (1).xlsx')
+    else:
+        workbook = cached_workbook(parse_size(args.rows))
+
+    mix = parse_mix(args.mix)
+    filtros, contratos = scenario_values(workbook)
+    scenarios = make_scenarios(filtros, contratos, random.Random(args.seed))
+    unknown = set(mix) - set(scenarios)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+
+    servers = ['werkzeug', 'asgi'] if args.server == 'ambos' else [args.server]
+    results = []
+    for server in servers:
+        proc = None
+        url = args.url
+        if not url:
+            print(f'Subindo instância local ({server}) com {os.path.basename(workbook)}...')
+            proc, url = start_local(workbook, free_port(), server)
+        try:
+            print(f'GET / renderizado: {check_page(url) / 1024:.0f} KB')
+            parts = urlsplit(url)
+            duration = None if args.requests else args.duration
+            print(f'Carga: {args.users} usuários, ' +
+                  (f'{args.requests} requisições' if args.requests else f'{args.duration:.0f}s') + f' em {url}')
+            samples, elapsed = asyncio.run(run_load(
+                parts.hostname, parts.port or 80, scenarios, mix, args.users,
+                duration, args.requests, args.think, args.seed
+            ))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+        report = summarize(samples, elapsed)
+        print_report(report, elapsed)
+        results.append({'servidor': server, 'url': url, 'usuarios': args.users, 'segundos': round(elapsed, 2),
+                        'rotas': report})
+
+    if len(results) > 1:
+        print_comparison([(r['servidor'], r['rotas']) for r in results])
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(results[0] if len(results) == 1 else results, fh, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Benchmarks dos caminhos críticos: carga, filtros, agregações e exportações
+
+Roda offline, sobre planilhas sintéticas (benchmarks/synthetic.py), e mede a
+latência e o pico de memória de cada função e de cada endpoint (via o
+test_client do Flask, sem rede).
+
+Uso:
+    python benchmarks/run_benchmarks.py                      # 1k, 10k e 100k linhas
+    python benchmarks/run_benchmarks.py --sizes 1k,10k,100k,1m
+    python benchmarks/run_benchmarks.py --json atual.json --baseline base.json
+
+Com --baseline, termina com código 1 se algum caso ficar mais lento que a
+tolerância (regressão).
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Sem pré-cálculo: as entradas fixadas por ele sobrevivem ao limpar_cache e
+# mascarariam o custo das rotas
+os.environ['WARMUP_ENABLED'] = '0'
+
+import dashboard_flask  # noqa: E402
+from engine import DataSource, SourceRegistry  # noqa: E402
+from engine.dataset import prepare_planilha, read_planilha  # noqa: E402
+from engine.ingest import read_projected  # noqa: E402
+from engine.schema import PLANILHA_COLUMNS  # noqa: E402
+from engine.sources import Snapshot  # noqa: E402
+from synthetic import cached_workbook, parse_size  # noqa: E402
+
+
+DEFAULT_SIZES = '1k,10k,100k'
+
+# Casos caros (leitura da planilha) rodam uma única vez por tamanho
+HEAVY_CASES = ('ler_planilha',)
+
+# Diferença mínima (ms) para considerar regressão, evitando ruído em casos rápidos
+MIN_REGRESSION_MS = 2.0
+
+
+def measure(fn, setup=None, repeat=3, memory=True):
+    """Executa `fn` `repeat` vezes e retorna (tempos em ms, pico de memória em MB)"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return times, peak
+
+
+def install_dataset(path, loaded):
+    """Aponta o app para a planilha sintética, com o dataset já preparado"""
+    source = DataSource('bench', path)
+    source.install(loaded, *source.file_version())
+    dashboard_flask.registry = SourceRegistry([source], read_planilha)
+    return dashboard_flask.registry.snapshot()
+
+
+def cases(path, rows):
+    """Gera (nome, função, setup) para uma planilha sintética"""
+    app = dashboard_flask
+    state = {}
+
+    def ler():
+        state['raw'] = read_projected(path, 'Planilha1', PLANILHA_COLUMNS)
+
+    def preparar():
+        state['loaded'] = prepare_planilha(state['raw'])
+
+    yield 'ler_planilha', ler, None
+    yield 'preparar', preparar, None
+
+    snap = install_dataset(path, state['loaded'])
+    df = snap.df
+    client = app.app.test_client()
+
+    # Valores mais frequentes, como os escolhidos nos filtros reais
+    empresa = df['empresa'].value_counts().index[0]
+    licenca = df['licenca'].value_counts().index[0]
+    estado = df['estado'].value_counts().index[0]
+    filtros = {'empresa': empresa, 'licenca': licenca}
+    contratos = (df[['empresa', 'licenca', 'modalidadeLicenca']].drop_duplicates().head(5)
+                 .rename(columns={'modalidadeLicenca': 'modalidade'}).to_dict('records'))
+    emails = df['email'].drop_duplicates().head(min(500, rows)).tolist()
+
+    def novo_snapshot():
+        fresh = Snapshot(df, snap.version, snap.mtime)
+        fresh.filter_options()
+        for column, _ in app.FILTER_COLUMNS.values():
+            fresh.index(column)
+
+    def limpar_cache():
+        snap._figures.clear()
+
+    def check(url, r):
+        # Lê o corpo inteiro dentro da medição: GET / é enviado em streaming
+        body = r.get_data()
+        assert r.status_code == 200, (url, r.status_code)
+        if r.mimetype == 'text/html':
+            assert body.rstrip().endswith(b'</html>'), (url, 'página incompleta')
+
+    def get(url):
+        def run():
+            check(url, client.get(url))
+        return run
+
+    def post(url, payload):
+        def run():
+            check(url, client.post(url, json=payload))
+        return run
+
+    yield 'snapshot_indices', novo_snapshot, None
+    yield 'apply_filters', lambda: app.apply_filters(df, filtros, snap), None
+    yield 'apply_filters_mascara', lambda: app.apply_filters(df, filtros), None
+    yield 'build_graphs', lambda: app.build_graphs(snap, None), None
+    yield 'build_graphs_filtrado', lambda: app.build_graphs(snap, {'estado': estado}), None
+    yield 'gerar_tabela_contratos', lambda: app.gerar_tabela_contratos(df), None
+    yield 'GET /', get('/'), limpar_cache
+    yield 'GET / (cache)', get('/'), None
+    yield 'GET /api/usuarios', get('/api/usuarios'), None
+    yield 'GET /api/usuarios/<licenca>', get(f'/api/usuarios/{licenca}'), None
+    c = contratos[0]
+    yield 'GET /api/rateio_contrato', get(
+        f"/api/rateio_contrato?empresa={c['empresa']}&licenca={c['licenca']}&modalidade={c['modalidade']}"), None
+    yield 'POST /api/rateio_contratos', post('/api/rateio_contratos', {'contracts': contratos, 'async': False}), None
+    yield 'POST /api/rateio_contratos (xlsx)', post('/api/rateio_contratos',
+                                                   {'contracts': contratos, 'format': 'xlsx', 'async': False}), None
+    yield 'POST /api/export_selected', post('/api/export_selected', {'emails': emails}), None
+    yield 'POST /api/export_selected (xlsx)', post('/api/export_selected',
+                                                   {'emails': emails, 'format': 'xlsx', 'async': False}), None
+
+
+def run(sizes, repeat, memory, data_dir, only=None):
+    results = []
+    for rows in sizes:
+        started = time.perf_counter()
+        path = cached_workbook(rows, data_dir=data_dir)
+        print(f'\n== {rows} linhas ({os.path.basename(path)}, gerada/cacheada em '
+              f'{time.perf_counter() - started:.1f}s)')
+        print(f"{'caso':<32}{'mediana ms':>12}{'mín ms':>12}{'pico MB':>10}")
+        for name, fn, setup in cases(path, rows):
+            # A leitura e a preparação sempre rodam: os demais casos dependem delas
+            if only and name not in ('ler_planilha', 'preparar') and not any(o in name for o in only):
+                continue
+            n = 1 if name in HEAVY_CASES else repeat
+            times, peak = measure(fn, setup, n, memory and name not in HEAVY_CASES or memory == 'all')
+            result = {
+                'linhas': rows,
+                'caso': name,
+                'mediana_ms': round(statistics.median(times), 3),
+                'min_ms': round(min(times), 3),
+                'pico_mb': round(peak, 2) if peak is not None else None,
+                'repeticoes': n
+            }
+            results.append(result)
+            pico = f"{result['pico_mb']:.1f}" if peak is not None else '-'
+            print(f"{name:<32}{result['mediana_ms']:>12.1f}{result['min_ms']:>12.1f}{pico:>10}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Lista os casos mais lentos que a linha de base além da tolerância"""
+    base = {(r['linhas'], r['caso']): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r['linhas'], r['caso']))
+        if not b:
+            continue
+        limit = max(b['mediana_ms'] * (1 + tolerance), b['mediana_ms'] + MIN_REGRESSION_MS)
+        if r['mediana_ms'] > limit:
+            regressions.append((r, b))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do dashboard de licenciamento')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='tamanhos (ex.: 1k,10k,100k,1m)')
+    parser.add_argument('--repeat', type=int, default=5, help='repetições por caso')
+    parser.add_argument('--only', help='roda só os casos que contêm estes textos (separados por vírgula)')
+    parser.add_argument('--memory', choices=['on', 'off', 'all'], default='on',
+                        help="pico de memória (tracemalloc); 'all' inclui a leitura da planilha")
+    parser.add_argument('--data-dir', help='pasta das planilhas sintéticas (padrão: temporário do sistema)')
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    parser.add_argument('--baseline', help='resultados anteriores (JSON) para detectar regressões')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='tolerância de regressão (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    only = [o.strip() for o in args.only.split(',')] if args.only else None
+    memory = {'on': True, 'off': False, 'all': 'all'}[args.memory]
+    results = run(sizes, args.repeat, memory, args.data_dir, only)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for r, b in regressions:
+            print(f"REGRESSÃO {r['linhas']} linhas / {r['caso']}: "
+                  f"{b['mediana_ms']:.1f}ms -> {r['mediana_ms']:.1f}ms")
+        if regressions:
+            return 1
+        print('\nSem regressões em relação à linha de base.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Gerador de planilhas sintéticas com o esquema real da aba Planilha1
+
+Uso:
+    python benchmarks/synthetic.py 100000 -o planilha_100k.xlsx
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+
+# Colunas da aba Planilha1, na ordem da planilha original
+COLUMNS = [
+    'empresa', 'nomeColaborador', 'email', 'DataCriacaoEmail', 'DataCriacaoFormatada',
+    'setor', 'Centro de Custo', 'estado', 'licenca', 'modalidadeLicenca',
+    'inicioContrato', 'finalContrato', 'mesesContrato', 'proRata', 'valorAnual',
+    'valorUnitarioMensal', 'qtdLicenca', 'valorTotalLicenca', 'faturador'
+]
+
+EMPRESAS = ['EVO SOLUCOES TERMOACUSTICAS', 'FLEXIVEL-JGS', 'FLEXIVEL-SP', 'POLIVEDO']
+
+# Licenças e valor anual por usuário (as primeiras são as mais comuns)
+LICENCAS = [
+    ('Microsoft 365 Business Basic', 354.6),
+    ('Exchange Online (Plan 1)', 298.8),
+    ('Microsoft 365 Business Standard', 938.6),
+    ('Microsoft 365 Business Premium', 1794.5),
+    ('Office 365 E3', 1663.0),
+    ('Microsoft 365 E3', 2640.0),
+    ('Power BI Pro', 838.8),
+    ('Microsoft 365 E5', 3865.9),
+    ('Visio Plan 2', 1080.0),
+    ('Project Plan 3', 2160.0),
+    ('Microsoft Teams Essentials', 240.0),
+    ('Exchange Online (Plan 2)', 597.6),
+]
+
+ESTADOS = ['SC', 'PR', 'SP', 'RS', 'MG', 'RJ', 'BA', 'PE', 'GO', 'AM']
+SETORES = [
+    'Administrativo', 'Comercial', 'Compras', 'Contabilidade', 'Departamento Pessoal',
+    'Engenharia', 'Expedição', 'Financeiro', 'Fiscal', 'Jurídico', 'Logística',
+    'Manutenção', 'Marketing', 'Produção', 'Qualidade', 'Recursos Humanos', 'TI'
+]
+NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+         'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Costa', 'Rodrigues',
+              'Almeida', 'Nascimento', 'Lima', 'Araújo', 'Fernandes', 'Carvalho', 'Rocha']
+FATURADORES = ['INGRAM', 'INGRAM', 'INGRAM', 'INGRAM', 'TD SYNNEX', 'MICROSOFT']
+
+
+def _zipf_choice(rng, values, size, a=1.3):
+    # Distribuição concentrada nos primeiros valores, como nos dados reais
+    weights = 1.0 / np.arange(1, len(values) + 1) ** a
+    idx = rng.choice(len(values), size=size, p=weights / weights.sum())
+    return np.asarray(values, dtype=object)[idx], idx
+
+
+def cardinalities(rows):
+    """Quantidade de empresas, centros de custo e setores para o tamanho pedido"""
+    return {
+        'empresas': int(np.clip(rows // 2500, len(EMPRESAS), 40)),
+        'centros_custo': int(np.clip(rows // 150, 60, 2000)),
+        'setores': int(np.clip(rows // 250, 43, 600)),
+    }
+
+
+def generate_frame(rows, seed=0, hoje=None):
+    """DataFrame com o esquema e os valores (não as fórmulas) da Planilha1"""
+    rng = np.random.default_rng(seed)
+    hoje = pd.Timestamp(hoje or '2025-10-01')
+    card = cardinalities(rows)
+
+    empresas = EMPRESAS + [f'EMPRESA {i:02d} LTDA' for i in range(len(EMPRESAS) + 1, card['empresas'] + 1)]
+    centros = [f'1.{i // 100 + 1:02d}.2.2.01.{i % 1000:03d}-{SETORES[i % len(SETORES)][:3].upper()}'
+               for i in range(card['centros_custo'])]
+    setores = SETORES + [f'{SETORES[i % len(SETORES)]} {i // len(SETORES)}'
+                         for i in range(len(SETORES), card['setores'])]
+
+    empresa, emp_idx = _zipf_choice(rng, empresas, rows, a=0.8)
+    cc_idx = rng.integers(0, len(centros), rows)
+    centro = np.asarray(centros, dtype=object)[cc_idx]
+    setor = np.asarray(setores, dtype=object)[cc_idx % len(setores)]
+    estado, _ = _zipf_choice(rng, ESTADOS, rows, a=2.0)
+    licenca, lic_idx = _zipf_choice(rng, [l for l, _ in LICENCAS], rows)
+    anual = np.array([v for _, v in LICENCAS])[lic_idx]
+
+    # ~10% dos usuários têm uma segunda licença (mesmo e-mail em duas linhas)
+    usuario = np.arange(rows)
+    repetidos = rng.random(rows) < 0.1
+    usuario[repetidos] = np.maximum(usuario[repetidos] - 1, 0)
+    nome = np.array([f'{NOMES[u % len(NOMES)]} {SOBRENOMES[u // len(NOMES) % len(SOBRENOMES)]} {u}'
+                     for u in usuario], dtype=object)
+    dominio = np.array([f"{e.split()[0].lower().replace('-', '')}.com.br" for e in empresas], dtype=object)
+    email = np.array([f'{n.split()[0].lower()}.{u}@{d}' for n, u, d in zip(nome, usuario, dominio[emp_idx])],
+                     dtype=object)
+
+    criacao = hoje - pd.to_timedelta(rng.integers(0, 4 * 365 * 86400, rows), unit='s')
+    inicio = hoje.normalize() - pd.to_timedelta(rng.integers(-60, 330, rows), unit='D')
+    final = inicio + pd.DateOffset(months=12)
+    meses = np.full(rows, 12.0)
+    pro_rata = np.clip(((final - criacao.normalize()).days.to_numpy() // 30), 0, None).astype(float)
+    qtd = np.where(rng.random(rows) < 0.95, 1.0, rng.integers(2, 6, rows).astype(float))
+    mensal = anual / meses
+    total = np.where(pro_rata <= meses, pro_rata * mensal, anual) * qtd
+
+    df = pd.DataFrame({
+        'empresa': empresa,
+        'nomeColaborador': nome,
+        'email': email,
+        'DataCriacaoEmail': criacao.strftime('%Y-%m-%d %H:%M:%SZ'),
+        'DataCriacaoFormatada': criacao.normalize(),
+        'setor': setor,
+        'Centro de Custo': centro,
+        'estado': estado,
+        'licenca': licenca,
+        'modalidadeLicenca': np.where(rng.random(rows) < 0.7, 'Anual', 'Mensal').astype(object),
+        'inicioContrato': inicio,
+        'finalContrato': final,
+        'mesesContrato': meses,
+        'proRata': pro_rata,
+        'valorAnual': anual,
+        'valorUnitarioMensal': mensal,
+        'qtdLicenca': qtd,
+        'valorTotalLicenca': total,
+        'faturador': np.asarray(FATURADORES, dtype=object)[rng.integers(0, len(FATURADORES), rows)],
+    }, columns=COLUMNS)
+
+    # Imperfeições como as da planilha real: totais vazios e valores em texto
+    df.loc[rng.random(rows) < 0.01, 'valorTotalLicenca'] = np.nan
+    texto = rng.random(rows) < 0.005
+    df['valorAnual'] = df['valorAnual'].astype(object)
+    df.loc[texto, 'valorAnual'] = [f'R$ {v:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+                                   for v in anual[texto]]
+    return df
+
+
+def write_workbook(df, path, sheet='Planilha1', footer_rows=3):
+    """Grava o DataFrame em .xlsx (modo write_only), com linhas de rodapé em branco"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+    ws.append(COLUMNS)
+    columns = []
+    for column in COLUMNS:
+        values = df[column].astype(object).tolist()
+        columns.append([None if v is None or v != v else v for v in values])
+    for row in zip(*columns):
+        ws.append(row)
+    for _ in range(footer_rows):
+        ws.append([None] * (len(COLUMNS) - 1) + [0])
+    wb.save(path)
+    return path
+
+
+def cached_workbook(rows, seed=0, data_dir=None):
+    """Caminho de uma planilha sintética, gerada só na primeira vez"""
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'ms-license-bench')
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'planilha_{rows}_{seed}.xlsx')
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        write_workbook(generate_frame(rows, seed), tmp)
+        os.replace(tmp, path)
+    return path
+
+
+def parse_size(text):
+    """'1k' -> 1000, '1m' -> 1000000"""
+    text = str(text).strip().lower()
+    mult = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * mult)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera uma planilha sintética de licenciamento')
+    parser.add_argument('rows', help='quantidade de linhas (ex.: 1000, 10k, 1m)')
+    parser.add_argument('-o', '--output', help='arquivo .xlsx de saída')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = parse_size(args.rows)
+    output = args.output or f'planilha_{rows}.xlsx'
+    write_workbook(generate_frame(rows, args.seed), output)
+    print(f'{output}: {rows} linhas')
@@ -3,47 +3,168 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, dash_table, Input, Output, State, no_update
+from dash.dash_table.Format import Format, Group, Scheme, Symbol
 import dash_bootstrap_components as dbc
 from datetime import datetime
 import os
+import re
+
+import numpy as np
+
+import dashboard_flask
+from engine.dataset import registry
+from engine.schema import ALIASES, DASH_VIEW, view
 
 # ========================================
 # CONFIGURAÇÕES E CARREGAMENTO DE DADOS
 # ========================================
 
-EXCEL_FILE = 'LICENCIAMENTO MICROSOFT (1).xlsx'
+# A planilha é lida, validada e mantida em cache pelo motor compartilhado
+# (engine.dataset), o mesmo do dashboard Flask: só é relida quando o arquivo
+# muda. Este app usa uma visão com os nomes de coluna do layout antigo.
 
-def load_data():
-    """Carrega e processa os dados da planilha"""
-    df = pd.read_excel(EXCEL_FILE, sheet_name='Planilha1')
-    
-    # Limpeza e conversão de dados
-    df['valor unitario'] = pd.to_numeric(df['valor unitario'], errors='coerce')
-    df['quantidade de licenças'] = pd.to_numeric(df['quantidade de licenças'], errors='coerce')
-    df['total'] = pd.to_numeric(df['total'], errors='coerce')
-    
-    # Calcular total se estiver vazio
-    df['total'] = df.apply(
-        lambda row: row['valor unitario'] * row['quantidade de licenças'] 
-        if pd.isna(row['total']) else row['total'], 
-        axis=1
-    )
-    
-    # Converter datas
-    df['data criação do e-mail'] = pd.to_datetime(df['data criação do e-mail'], errors='coerce')
-    df['inicio contrato'] = pd.to_datetime(df['inicio contrato'], errors='coerce')
-    df['final contrato'] = pd.to_datetime(df['final contrato'], errors='coerce')
-    
-    return df
+def get_snapshot():
+    """Versão atual do dataset da fonte padrão (recarrega só se a planilha mudou)"""
+    return registry.snapshot()
 
 # ========================================
 # CRIAÇÃO DO DASHBOARD
 # ========================================
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Montado no mesmo servidor do dashboard Flask (em /dash/): no mesmo
+# processo, os dois front-ends compartilham os snapshots e os caches
+app = dash.Dash(__name__, server=dashboard_flask.app, url_base_pathname='/dash/',
+                external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "Dashboard - Licenciamento Microsoft"
 
+# ========================================
+# TABELAS PAGINADAS NO SERVIDOR
+# ========================================
+
+# Colunas das tabelas e linhas por página: o navegador recebe só a página
+# visível; paginação, ordenação e filtros rodam aqui sobre o snapshot em cache
+CONTRATOS_COLUMNS = ['Empresa', 'Nome do colaborador', 'licenca', 'final contrato', 'total']
+DETALHE_COLUMNS = ['Empresa', 'Nome do colaborador', 'licenca', 'Centro de Custo', 'estado', 'total']
+
+# Prazo (dias) para um contrato aparecer como vencendo
+DIAS_VENCIMENTO = 90
+
+BRL_FORMAT = Format(precision=2, scheme=Scheme.fixed, group=Group.yes, group_delimiter='.',
+                    decimal_delimiter=',', symbol=Symbol.yes, symbol_prefix='R$ ')
+
+# Cláusula do filter_query do DataTable: {coluna} operador valor
+FILTER_CLAUSE = re.compile(
+    r"^\{(?P<col>[^}]+)\}\s*(?P<op>s?(?:>=|<=|!=|=|<|>)|eq|ne|lt|le|gt|ge|contains|datestartswith)\s*(?P<value>.*)$"
+)
+FILTER_OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+def paged_table(table_id, columns, page_size):
+    """DataTable com paginação, ordenação e filtros no servidor (page_action='custom')"""
+    specs = []
+    for name in columns:
+        spec = {'name': name, 'id': name}
+        if name == 'total':
+            spec.update(type='numeric', format=BRL_FORMAT)
+        elif name == 'final contrato':
+            spec['type'] = 'datetime'
+        specs.append(spec)
+    return dash_table.DataTable(
+        id=table_id, columns=specs, data=[],
+        page_action='custom', page_current=0, page_size=page_size, page_count=0,
+        sort_action='custom', sort_mode='multi', sort_by=[],
+        filter_action='custom', filter_query='',
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'fontSize': 13, 'padding': '4px 8px'},
+        style_header={'fontWeight': 'bold', 'backgroundColor': '#f1f3f5'}
+    )
+
+def parse_filter(filter_query):
+    """[(coluna, operador, valor)] a partir do filter_query do DataTable"""
+    clauses = []
+    for part in (filter_query or '').split(' && '):
+        m = FILTER_CLAUSE.match(part.strip())
+        if not m:
+            continue
+        op = m.group('op').lstrip('s')
+        value = m.group('value').strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        clauses.append((m.group('col'), FILTER_OPERATORS.get(op, op), value))
+    return clauses
+
+def filter_positions(snapshot, df, positions, column, op, value):
+    """Aplica uma cláusula às posições; igualdade em texto usa o índice do snapshot"""
+    series = df[column]
+    if op == '=' and series.dtype == object:
+        canonical = ALIASES.get(column, column)
+        return positions[np.isin(positions, snapshot.positions(canonical, value, casefold=True))]
+
+    values = series.iloc[positions]
+    if op == 'contains':
+        keep = values.astype(str).str.contains(value, case=False, regex=False, na=False)
+    elif op == 'datestartswith':
+        keep = values.dt.strftime('%Y-%m-%d').str.startswith(value, na=False)
+    else:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            value = pd.to_datetime(value, errors='coerce', dayfirst='/' in value)
+        elif pd.api.types.is_numeric_dtype(series):
+            value = pd.to_numeric(value.replace(',', '.'), errors='coerce')
+        if pd.isna(value):
+            return positions[:0]
+        keep = {
+            '=': values == value, '!=': values != value, '<': values < value,
+            '<=': values <= value, '>': values > value, '>=': values >= value
+        }[op]
+    return positions[np.asarray(keep, dtype=bool)]
+
+def sorted_positions(df, positions, sort_by):
+    """Posições na ordem pedida pelo DataTable (vazios por último)"""
+    if not sort_by:
+        return positions
+    columns = [s['column_id'] for s in sort_by]
+    sub = pd.DataFrame({c: df[c].to_numpy()[positions] for c in columns})
+    order = sub.sort_values(columns, ascending=[s['direction'] == 'asc' for s in sort_by],
+                            kind='stable', na_position='last').index.to_numpy()
+    return positions[order]
+
+def table_positions(snapshot, table):
+    """Posições das linhas de cada tabela (contratos vencendo: ordenados pelo vencimento)"""
+    df = view(snapshot, DASH_VIEW)
+    if table == 'tabela-detalhada':
+        return np.arange(len(df))
+    hoje = pd.Timestamp.now().normalize()
+    final = df['final contrato']
+    positions = np.flatnonzero(((final >= hoje) & (final <= hoje + pd.Timedelta(days=DIAS_VENCIMENTO))).to_numpy())
+    return positions[np.argsort(final.to_numpy()[positions], kind='stable')]
+
+def table_page(snapshot, table, columns, page, page_size, sort_by, filter_query):
+    """Linhas da página pedida e total de páginas, montando só a página visível"""
+    df = view(snapshot, DASH_VIEW)
+    hoje = pd.Timestamp.now().date()
+    base = snapshot.cached_payload(('dash-tabela', table, hoje), lambda: table_positions(snapshot, table))
+
+    clauses = parse_filter(filter_query)
+    sort_key = tuple((s['column_id'], s['direction']) for s in sort_by or [])
+    if clauses:
+        positions = base
+        for column, op, value in clauses:
+            if column in columns:
+                positions = filter_positions(snapshot, df, positions, column, op, value)
+        positions = sorted_positions(df, positions, sort_by)
+    else:
+        # Sem filtro, a ordenação fica em cache: trocar de página só fatia o array
+        positions = snapshot.cached_payload(('dash-ordem', table, hoje, sort_key),
+                                            lambda: sorted_positions(df, base, sort_by))
+
+    page_count = max(1, -(-len(positions) // page_size))
+    page = min(page or 0, page_count - 1)
+    rows = df.iloc[positions[page * page_size:(page + 1) * page_size]][columns]
+    for column in columns:
+        if pd.api.types.is_datetime64_any_dtype(rows[column]):
+            rows[column] = rows[column].dt.strftime('%Y-%m-%d')
+    return rows.astype(object).where(rows.notna(), None).to_dict('records'), page_count, len(positions)
+
 # ========================================
 # LAYOUT
 # ========================================
@@ -185,7 +306,8 @@ app.layout = dbc.Container([
             dbc.Card([
                 dbc.CardBody([
                     html.H5("📅 Contratos Vencendo nos Próximos 90 Dias", className="card-title"),
-                    html.Div(id="contratos-vencendo")
+                    html.Div(id="contratos-vencendo"),
+                    paged_table('tabela-contratos', CONTRATOS_COLUMNS, 10)
                 ])
             ], className="mb-3 shadow-sm border-warning")
         ], md=12),
@@ -197,14 +319,15 @@ app.layout = dbc.Container([
             dbc.Card([
                 dbc.CardBody([
                     html.H5("📋 Detalhamento Completo", className="card-title"),
-                    html.Div(id="tabela-detalhada")
+                    paged_table('tabela-detalhada', DETALHE_COLUMNS, 25)
                 ])
             ], className="mb-3 shadow-sm")
         ], md=12),
     ]),
     
-    # Storage para armazenar timestamp
+    # Versão do dataset disponível e versão já desenhada nesta aba
     dcc.Store(id='data-store'),
+    dcc.Store(id='graphs-version'),
     dcc.Interval(id='interval-component', interval=60*1000, n_intervals=0)  # Atualiza a cada 1 minuto
     
 ], fluid=True, style={'backgroundColor': '#f8f9fa'})
@@ -220,9 +343,10 @@ app.layout = dbc.Container([
      Input('interval-component', 'n_intervals')]
 )
 def update_data(n_clicks, n_intervals):
-    """Atualiza os dados quando o botão é clicado ou automaticamente"""
-    now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    return {'timestamp': now}, f"Última atualização: {now}"
+    """Verifica a versão dos dados quando o botão é clicado ou automaticamente"""
+    snapshot = get_snapshot()
+    carregado = datetime.fromtimestamp(snapshot.loaded_at).strftime("%d/%m/%Y %H:%M:%S")
+    return {'versao': snapshot.version}, f"Última atualização: {carregado}"
 
 @app.callback(
     [Output('total-gasto', 'children'),
@@ -236,14 +360,22 @@ def update_data(n_clicks, n_intervals):
      Output('graph-modalidade', 'figure'),
      Output('graph-setor', 'figure'),
      Output('graph-faturador', 'figure'),
-     Output('contratos-vencendo', 'children'),
-     Output('tabela-detalhada', 'children')],
-    [Input('data-store', 'data')]
+     Output('graphs-version', 'data')],
+    [Input('data-store', 'data')],
+    [State('graphs-version', 'data')]
 )
-def update_graphs(data):
-    """Atualiza todos os gráficos e KPIs"""
-    df = load_data()
+def update_graphs(data, rendered):
+    """Atualiza todos os gráficos e KPIs (só quando a versão dos dados muda)"""
+    snapshot = get_snapshot()
+    if rendered == snapshot.version:
+        return (no_update,) * 12
     
+    # Figuras montadas uma vez por versão e compartilhadas entre as abas
+    outputs = snapshot.cached_figures('dash', lambda: build_outputs(view(snapshot, DASH_VIEW)))
+    return outputs + (snapshot.version,)
+
+def build_outputs(df):
+    """KPIs e gráficos do dashboard"""
     # KPIs
     total_gasto = f"R$ {df['total'].sum():,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
     total_usuarios = f"{len(df)}"
@@ -334,43 +466,48 @@ def update_graphs(data):
     )
     fig_faturador.update_layout(height=400)
     
-    # Contratos Vencendo
-    hoje = pd.Timestamp.now()
-    df_vencendo = df[df['final contrato'].notna()].copy()
-    df_vencendo = df_vencendo[df_vencendo['final contrato'] <= hoje + pd.Timedelta(days=90)]
-    df_vencendo = df_vencendo[df_vencendo['final contrato'] >= hoje]
-    df_vencendo = df_vencendo.sort_values('final contrato')
-    
-    if len(df_vencendo) > 0:
-        contratos_html = dbc.Table.from_dataframe(
-            df_vencendo[['Empresa', 'Nome do colaborador', 'licenca', 'final contrato', 'total']].head(10),
-            striped=True,
-            bordered=True,
-            hover=True,
-            responsive=True,
-            size='sm'
-        )
-    else:
-        contratos_html = html.P("✅ Nenhum contrato vencendo nos próximos 90 dias", className="text-success")
-    
-    # Tabela Detalhada
-    tabela_df = df[['Empresa', 'Nome do colaborador', 'licenca', 'Centro de Custo', 'estado', 'total']].head(50)
-    tabela_html = dbc.Table.from_dataframe(
-        tabela_df,
-        striped=True,
-        bordered=True,
-        hover=True,
-        responsive=True,
-        size='sm'
-    )
-    
     return (
         total_gasto, total_usuarios, total_empresas, total_licencas,
         fig_empresa, fig_estado, fig_centro, fig_licencas, 
-        fig_modalidade, fig_setor, fig_faturador,
-        contratos_html, tabela_html
+        fig_modalidade, fig_setor, fig_faturador
     )
 
+@app.callback(
+    [Output('tabela-detalhada', 'data'),
+     Output('tabela-detalhada', 'page_count')],
+    [Input('data-store', 'data'),
+     Input('tabela-detalhada', 'page_current'),
+     Input('tabela-detalhada', 'page_size'),
+     Input('tabela-detalhada', 'sort_by'),
+     Input('tabela-detalhada', 'filter_query')]
+)
+def update_detalhe(data, page, page_size, sort_by, filter_query):
+    """Página da tabela detalhada (todas as licenças)"""
+    rows, page_count, _ = table_page(get_snapshot(), 'tabela-detalhada', DETALHE_COLUMNS,
+                                     page, page_size, sort_by, filter_query)
+    return rows, page_count
+
+@app.callback(
+    [Output('tabela-contratos', 'data'),
+     Output('tabela-contratos', 'page_count'),
+     Output('contratos-vencendo', 'children')],
+    [Input('data-store', 'data'),
+     Input('tabela-contratos', 'page_current'),
+     Input('tabela-contratos', 'page_size'),
+     Input('tabela-contratos', 'sort_by'),
+     Input('tabela-contratos', 'filter_query')]
+)
+def update_contratos(data, page, page_size, sort_by, filter_query):
+    """Página da tabela de contratos vencendo e o resumo acima dela"""
+    snapshot = get_snapshot()
+    rows, page_count, total = table_page(snapshot, 'tabela-contratos', CONTRATOS_COLUMNS,
+                                         page, page_size, sort_by, filter_query)
+    if total == 0 and not filter_query:
+        resumo = html.P(f"✅ Nenhum contrato vencendo nos próximos {DIAS_VENCIMENTO} dias", className="text-success")
+    else:
+        resumo = html.P(f"{total} licença(s) encontrada(s)", className="text-muted mb-2")
+    return rows, page_count, resumo
+
 # ========================================
 # EXECUTAR APLICAÇÃO
 # ========================================
@@ -380,8 +517,14 @@ if __name__ == '__main__':
     print("🚀 Dashboard de Licenciamento Microsoft")
     print("="*80)
     print("\n📊 Dashboard iniciando...")
-    print("🌐 Acesse: http://127.0.0.1:8050")
+    print("🌐 Acesse: http://127.0.0.1:8050/dash/")
+    print("🌐 Dashboard Flask no mesmo servidor: http://127.0.0.1:8050/")
     print("\n💡 Dica: Clique em 'Atualizar Dados' após modificar a planilha")
     print("="*80 + "\n")
     
+    dashboard_flask.preload_sources()
+    # Com o reloader do modo debug, só o processo filho (o que atende) roda as tarefas de
+    # fundo; sem reloader, elas começam na primeira requisição (ensure_background_jobs)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        dashboard_flask.start_background_jobs()
     app.run(debug=True, port=8050)
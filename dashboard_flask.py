@@ -1,15 +1,37 @@
-from flask import Flask, render_template_string, request, jsonify, Response
+from flask import (Flask, request, jsonify, Response, abort, g, has_request_context,
+                   redirect, send_file, send_from_directory, stream_with_context, url_for)
+from markupsafe import Markup
+import gzip
+import hashlib
+import hmac
+import os
+import threading
+import time
 import pandas as pd
 import numpy as np
 import math
+import mimetypes
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import json
 from datetime import datetime
 from urllib.parse import quote
 import re
 from io import StringIO
 import csv
+import tempfile
+from collections import Counter
+
+from engine import assets, columnar, dataset, xlsx
+from engine.costs import remaining_value
+from engine.dataset import registry
+from engine.jobs import JobQueue, QueueFull
+from engine.events import VersionFeed
+from engine.metrics import CONTENT_TYPE, REGISTRY, end_trace, server_timing, span, start_trace
+from engine.profiling import RequestProfiler
+from engine.schema import DASH_VIEW, view
+from engine.warmup import SourceWatcher, WarmupScheduler
 
 app = Flask(__name__)
 
@@ -29,260 +51,529 @@ class SafeJSONProvider(DefaultJSONProvider):
 
 app.json = SafeJSONProvider(app)
 
-# Caminho do arquivo Excel utilizado pelo dashboard
-EXCEL_FILE = 'LICENCIAMENTO MICROSOFT (1).xlsx'
+# Leitura, validação e snapshots ficam no motor compartilhado com o dashboard Dash
+# (engine.dataset), que lê EXCEL_FILE / DATA_SOURCES das variáveis de ambiente
+
+def get_snapshot(tenant=None):
+    """Snapshot em cache da fonte (404 se o tenant não existir)"""
+    if registry.get(tenant) is None:
+        abort(404)
+    return registry.snapshot(tenant)
+
+def load_data(tenant=None):
+    """Carrega os dados da fonte (relendo a planilha apenas quando ela muda)"""
+    return get_snapshot(tenant).df
+
+def tenant_route(rule, **options):
+    """Registra a rota na raiz (fonte padrão) e sob /t/<tenant> (por fonte)"""
+    def decorator(view):
+        app.add_url_rule(rule, view.__name__, view, **options)
+        app.add_url_rule('/t/<tenant>' + rule, view.__name__ + '_tenant', view, **options)
+        return view
+    return decorator
+
+def base_path(tenant=None):
+    return f"/t/{tenant}" if tenant else ''
+
+# Métricas por rota (Prometheus) e spans por etapa de cada requisição
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Latência das requisições por rota', ('route', 'method', 'status')
+)
+DATASET_ROWS = REGISTRY.gauge('dashboard_dataset_rows', 'Linhas válidas do dataset carregado', ('tenant',))
+DATASET_BYTES = REGISTRY.gauge('dashboard_dataset_bytes', 'Memória do dataset carregado', ('tenant',))
+DATASET_REJECTED = REGISTRY.gauge('dashboard_dataset_rejected_rows', 'Linhas rejeitadas na carga', ('tenant',))
+DATASET_LOADED_AT = REGISTRY.gauge(
+    'dashboard_dataset_loaded_timestamp_seconds', 'Momento da última carga do dataset', ('tenant',)
+)
+DATASET_INFO = REGISTRY.gauge('dashboard_dataset_info', 'Versão do dataset carregado', ('tenant', 'version'))
+FIGURE_CACHE_ENTRIES = REGISTRY.gauge(
+    'dashboard_figure_cache_entries', 'Combinações de filtros em cache', ('tenant',)
+)
+MEMORY_USED = REGISTRY.gauge('dashboard_memory_used_bytes', 'Memória usada pelos datasets carregados')
+MEMORY_BUDGET = REGISTRY.gauge('dashboard_memory_budget_bytes', 'Orçamento de memória dos datasets')
+
+# Requisições mais lentas que isso são registradas no log com os spans
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 2000))
+
+@REGISTRY.collector
+def collect_dataset_metrics():
+    for gauge in (DATASET_ROWS, DATASET_BYTES, DATASET_REJECTED, DATASET_LOADED_AT, DATASET_INFO,
+                  FIGURE_CACHE_ENTRIES):
+        gauge.clear()
+    for info in registry.stats():
+        tenant = info['slug']
+        DATASET_ROWS.set(info['linhas'], tenant=tenant)
+        DATASET_BYTES.set(info['bytes'], tenant=tenant)
+        DATASET_REJECTED.set(info['rejeitadas'], tenant=tenant)
+        FIGURE_CACHE_ENTRIES.set(info['figuras_em_cache'], tenant=tenant)
+        if info['carregado']:
+            DATASET_LOADED_AT.set(info['carregado_em'], tenant=tenant)
+            DATASET_INFO.set(1, tenant=tenant, version=info['versao'])
+    MEMORY_USED.set(registry.memory_usage())
+    MEMORY_BUDGET.set(registry.memory_budget)
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.spans = start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else '<sem rota>'
+    REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    spans = g.get('spans') or []
+    response.headers['Server-Timing'] = server_timing(spans, elapsed)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning(json.dumps({
+            'requisicao_lenta': request.full_path, 'rota': route, 'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+            'spans': [{'etapa': st, 'passo': sp, 'ms': round(sec * 1000, 1)} for st, sp, sec in spans]
+        }, ensure_ascii=False))
+    return response
+
+@app.teardown_request
+def end_request_timing(exc=None):
+    end_trace()
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# Perfil de uma requisição sob demanda (?__profile=pstats|collapsed), liberado
+# apenas quando PROFILE_TOKEN está configurado e é enviado na requisição
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+
+def profile_authorized():
+    token = request.headers.get('X-Profile-Token') or request.args.get('__token', '')
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+@app.before_request
+def start_profile():
+    mode = request.args.get('__profile')
+    if not mode or not profile_authorized():
+        return None
+    try:
+        interval = float(request.args.get('__interval', 5))
+        limit = int(request.args.get('__limit', 40))
+        if not (math.isfinite(interval) and interval > 0 and limit > 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': '__interval (ms) e __limit devem ser números positivos'}), 400
+    profiler = RequestProfiler(
+        'collapsed' if mode == 'collapsed' else 'pstats',
+        interval=interval / 1000,
+        limit=limit,
+        alloc=request.args.get('__alloc', '1') != '0'
+    )
+    if not profiler.start():
+        return jsonify({'error': 'Já existe um perfil em andamento'}), 429
+    g.profiler = profiler
+    # Por padrão ignora o cache de figuras, para medir o caminho pesado
+    g.profile_fresh = request.args.get('__fresh', '1') != '0'
+    return None
+
+@app.after_request
+def finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    report = profiler.stop(f'{request.method} {request.full_path} -> {response.status_code}')
+    headers = {'X-Profile-Status': str(response.status_code), 'X-Profile-Ms': f'{profiler.seconds * 1000:.1f}'}
+    if profiler.alloc_peak is not None:
+        headers['X-Profile-Alloc-Peak-Bytes'] = str(profiler.alloc_peak)
+    return Response(report, mimetype='text/plain', headers=headers)
+
+@app.teardown_request
+def abort_profile(exc=None):
+    # A view falhou antes do after_request: libera o perfil
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Perfila a rota em `path` (ex.: /admin/profile?path=/?empresa=X&format=collapsed)"""
+    if not profile_authorized():
+        abort(404)
+    path = request.args.get('path', '/')
+    if not path.startswith('/') or path.startswith('/admin/'):
+        return jsonify({'error': 'Caminho inválido'}), 400
+    params = {
+        '__profile': request.args.get('format', 'pstats'),
+        '__interval': request.args.get('interval', '5'),
+        '__limit': request.args.get('limit', '40'),
+        '__alloc': request.args.get('alloc', '1'),
+        '__fresh': request.args.get('fresh', '1')
+    }
+    target = path + ('&' if '?' in path else '?') + '&'.join(f'{k}={quote(v)}' for k, v in params.items())
+    with app.test_client() as client:
+        r = client.get(target, headers={'X-Profile-Token': PROFILE_TOKEN})
+    return Response(r.get_data(), status=r.status_code, headers={
+        k: v for k, v in r.headers.items() if k.startswith('X-Profile') or k == 'Content-Type'
+    })
 
-def load_data():
-    """Carrega e processa os dados da planilha"""
-    df = pd.read_excel(EXCEL_FILE, sheet_name='Planilha1')
-    
-    # Limpeza e conversão de dados
-    df['valorAnual'] = pd.to_numeric(df['valorAnual'], errors='coerce')
-    df['valorUnitarioMensal'] = pd.to_numeric(df['valorUnitarioMensal'], errors='coerce')
-    df['qtdLicenca'] = pd.to_numeric(df['qtdLicenca'], errors='coerce')
-    df['mesesContrato'] = pd.to_numeric(df['mesesContrato'], errors='coerce')
-    df['proRata'] = pd.to_numeric(df['proRata'], errors='coerce')
-    df['valorTotalLicenca'] = pd.to_numeric(df['valorTotalLicenca'], errors='coerce')
-    
-    # Converter datas
-    df['DataCriacaoEmail'] = pd.to_datetime(df['DataCriacaoEmail'], errors='coerce')
-    df['DataCriacaoFormatada'] = pd.to_datetime(df['DataCriacaoFormatada'], errors='coerce')
-    df['inicioContrato'] = pd.to_datetime(df['inicioContrato'], errors='coerce')
-    df['finalContrato'] = pd.to_datetime(df['finalContrato'], errors='coerce')
-    
-    return df
+# Filtro da URL -> (coluna, valor que significa "sem filtro")
+FILTER_COLUMNS = {
+    'empresa': ('empresa', 'Todas'),
+    'estado': ('estado', 'Todos'),
+    'setor': ('setor', 'Todos'),
+    'centro_custo': ('Centro de Custo', 'Todos'),
+    'licenca': ('licenca', 'Todas'),
+    'modalidade': ('modalidadeLicenca', 'Todas')
+}
+
+# Filtros da página inicial (nenhum filtro aplicado)
+DEFAULT_FILTERS = {key: todos for key, (_, todos) in FILTER_COLUMNS.items()}
+
+def apply_filters(df, filters, snapshot=None):
+    """Aplica filtros ao dataframe (usando os índices do snapshot quando disponível)"""
+    if snapshot is not None and snapshot.df is df:
+        positions = None
+        for key, (column, todos) in FILTER_COLUMNS.items():
+            value = filters.get(key)
+            if value and value != todos:
+                pos = snapshot.positions(column, value)
+                positions = pos if positions is None else np.intersect1d(positions, pos, assume_unique=True)
+        return df if positions is None else df.iloc[positions]
 
-def apply_filters(df, filters):
-    """Aplica filtros ao dataframe"""
     filtered_df = df.copy()
     
-    if filters.get('empresa') and filters['empresa'] != 'Todas':
-        filtered_df = filtered_df[filtered_df['empresa'] == filters['empresa']]
-    
-    if filters.get('estado') and filters['estado'] != 'Todos':
-        filtered_df = filtered_df[filtered_df['estado'] == filters['estado']]
-    
-    if filters.get('setor') and filters['setor'] != 'Todos':
-        filtered_df = filtered_df[filtered_df['setor'] == filters['setor']]
-    
-    if filters.get('centro_custo') and filters['centro_custo'] != 'Todos':
-        filtered_df = filtered_df[filtered_df['Centro de Custo'] == filters['centro_custo']]
-    
-    if filters.get('licenca') and filters['licenca'] != 'Todas':
-        filtered_df = filtered_df[filtered_df['licenca'] == filters['licenca']]
-    
-    if filters.get('modalidade') and filters['modalidade'] != 'Todas':
-        filtered_df = filtered_df[filtered_df['modalidadeLicenca'] == filters['modalidade']]
-    
-
+    for key, (column, todos) in FILTER_COLUMNS.items():
+        if filters.get(key) and filters[key] != todos:
+            filtered_df = filtered_df[filtered_df[column] == filters[key]]
     
     return filtered_df
 
-def create_graphs(filters=None):
-    """Cria todos os gráficos"""
-    df = load_data()
-    
-    # Aplicar filtros se fornecidos
-    if filters:
-        df = apply_filters(df, filters)
-    
-    graphs = {}
-    
-    # KPIs
-    kpis = {
-        'total_gasto': f"R$ {df['valorTotalLicenca'].sum():,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-        'total_usuarios': len(df),
-        'total_empresas': df['empresa'].nunique(),
-        'total_licencas': int(df['qtdLicenca'].sum())
-    }
-    
-    # 1. Gastos por Empresa
-
-    gastos_empresa = df.groupby('empresa')['valorTotalLicenca'].sum().sort_values(ascending=False).head(15)
-    fig1 = px.bar(x=gastos_empresa.values, y=gastos_empresa.index, orientation='h',
-                  labels={'x': 'Gasto Total (R$)', 'y': 'Empresa'},
-                  title='💼 Top 15 Empresas por Gasto')
-    fig1.update_traces(marker_color='#609369')
-    fig1.update_layout(
-        plot_bgcolor='#FFFFFF',
-        paper_bgcolor='#FFFFFF',
-        font=dict(color='#333333', family='Cairo, sans-serif'),
-        title_font=dict(size=18, color='#333333', family='Cairo')
-    )
-    graphs['empresas'] = fig1.to_html(full_html=False, div_id="graph1")
-    
-    # 2. Distribuição por Estado
-    estado_counts = df.groupby('estado')['valorTotalLicenca'].sum()
-    fig2 = px.pie(values=estado_counts.values, names=estado_counts.index,
-                  title='🗺️ Distribuição por Estado', hole=0.4,
-                  color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41', '#EEEEEE'])
-    fig2.update_layout(
-        plot_bgcolor='#FFFFFF',
-        paper_bgcolor='#FFFFFF',
-        font=dict(color='#333333', family='Cairo, sans-serif'),
-        title_font=dict(size=18, color='#333333', family='Cairo')
-    )
-    graphs['estados'] = fig2.to_html(full_html=False, div_id="graph2")
-    
-    # 3. Top 10 Centros de Custo
-    centro_custo = df.groupby('Centro de Custo')['valorTotalLicenca'].sum().sort_values(ascending=False).head(10)
-    fig3 = px.bar(x=centro_custo.index, y=centro_custo.values,
-                  labels={'x': 'Centro de Custo', 'y': 'Gasto Total (R$)'},
-                  title='🏦 Top 10 Centros de Custo (Maior Gasto)')
-    fig3.update_traces(marker_color='#026B69')
-    fig3.update_layout(
-        xaxis_tickangle=-45,
-        plot_bgcolor='#FFFFFF',
-        paper_bgcolor='#FFFFFF',
-        font=dict(color='#333333', family='Cairo, sans-serif'),
-        title_font=dict(size=18, color='#333333', family='Cairo')
-    )
-    graphs['centro_custo'] = fig3.to_html(full_html=False, div_id="graph3")
-    
-    # 4. Licenças Mais Usadas
-    try:
-        licencas_count = df.groupby('licenca')['qtdLicenca'].sum().sort_values(ascending=False).head(10)
-    except Exception as e:
-        app.logger.error(f"Erro ao agrupar licencas: {e}")
-        licencas_count = pd.Series(dtype='float64')
-
-    app.logger.info(f"Licenças - linhas df: {len(df)}, colunas: {list(df.columns)}")
-    app.logger.info(f"Licenças - tamanho licencas_count: {len(licencas_count)}")
-
-    if licencas_count is not None and len(licencas_count) > 0:
-        fig4 = px.bar(x=licencas_count.values, y=licencas_count.index, orientation='h',
-                      labels={'x': 'Quantidade', 'y': 'Tipo de Licença'},
-                      title='📊 Top 10 Licenças Mais Usadas')
-        fig4.update_traces(marker_color='#026B69')
-        fig4.update_layout(
+def figure_fragment(fig, div_id):
+    """(HTML, JSON) do gráfico: o HTML equivale ao to_html do plotly; o JSON atualiza a página aberta"""
+    fig_json = pio.to_json(fig, validate=False)
+    html = (f'<div><div id="{div_id}" class="plotly-graph-div" style="height:100%; width:100%;"></div>'
+            '<script type="text/javascript">window.PLOTLYENV=window.PLOTLYENV || {};'
+            f'if (document.getElementById("{div_id}")) {{ (function(fig) {{ '
+            f'Plotly.newPlot("{div_id}", fig.data, fig.layout, {{"responsive": true}}); }})({fig_json}); }}'
+            '</script></div>')
+    return html, fig_json
+
+# Seções da página: cada uma devolve (HTML, JSON da figura ou None), é guardada em
+# cache separadamente (snapshot, filtros e dia) e servida em /api/graph/<nome>,
+# para a página carregar primeiro o que está visível
+def graph_empresas(df):
+    """Gastos por Empresa"""
+    with span('aggregate', 'empresas'):
+        gastos_empresa = df.groupby('empresa')['custoTotal'].sum().sort_values(ascending=False).head(15)
+    with span('figure', 'empresas'):
+        fig1 = px.bar(x=gastos_empresa.values, y=gastos_empresa.index, orientation='h',
+                      labels={'x': 'Gasto Total (R$)', 'y': 'Empresa'},
+                      title='💼 Top 15 Empresas por Gasto')
+        fig1.update_traces(marker_color='#609369')
+        fig1.update_layout(
+            plot_bgcolor='#FFFFFF',
+            paper_bgcolor='#FFFFFF',
+            font=dict(color='#333333', family='Cairo, sans-serif'),
+            title_font=dict(size=18, color='#333333', family='Cairo')
+        )
+    with span('serialize', 'empresas'):
+        return figure_fragment(fig1, "graph1")
+
+def graph_estados(df):
+    """Distribuição por Estado"""
+    with span('aggregate', 'estados'):
+        estado_counts = df.groupby('estado')['custoTotal'].sum()
+    with span('figure', 'estados'):
+        fig2 = px.pie(values=estado_counts.values, names=estado_counts.index,
+                      title='🗺️ Distribuição por Estado', hole=0.4,
+                      color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41', '#EEEEEE'])
+        fig2.update_layout(
             plot_bgcolor='#FFFFFF',
             paper_bgcolor='#FFFFFF',
             font=dict(color='#333333', family='Cairo, sans-serif'),
             title_font=dict(size=18, color='#333333', family='Cairo')
         )
-        graphs['licencas'] = fig4.to_html(full_html=False, div_id="graph4")
+    with span('serialize', 'estados'):
+        return figure_fragment(fig2, "graph2")
+
+def graph_centro_custo(df):
+    """Top 10 Centros de Custo"""
+    with span('aggregate', 'centro_custo'):
+        centro_custo = df.groupby('Centro de Custo')['custoTotal'].sum().sort_values(ascending=False).head(10)
+    with span('figure', 'centro_custo'):
+        fig3 = px.bar(x=centro_custo.index, y=centro_custo.values,
+                      labels={'x': 'Centro de Custo', 'y': 'Gasto Total (R$)'},
+                      title='🏦 Top 10 Centros de Custo (Maior Gasto)')
+        fig3.update_traces(marker_color='#026B69')
+        fig3.update_layout(
+            xaxis_tickangle=-45,
+            plot_bgcolor='#FFFFFF',
+            paper_bgcolor='#FFFFFF',
+            font=dict(color='#333333', family='Cairo, sans-serif'),
+            title_font=dict(size=18, color='#333333', family='Cairo')
+        )
+    with span('serialize', 'centro_custo'):
+        return figure_fragment(fig3, "graph3")
+
+def graph_licencas(df):
+    """Licenças Mais Usadas"""
+    with span('aggregate', 'licencas'):
+        try:
+            licencas_count = df.groupby('licenca')['qtdLicenca'].sum().sort_values(ascending=False).head(10)
+        except Exception as e:
+            app.logger.error(f"Erro ao agrupar licencas: {e}")
+            licencas_count = pd.Series(dtype='float64')
+
+    if licencas_count is not None and len(licencas_count) > 0:
+        with span('figure', 'licencas'):
+            fig4 = px.bar(x=licencas_count.values, y=licencas_count.index, orientation='h',
+                          labels={'x': 'Quantidade', 'y': 'Tipo de Licença'},
+                          title='📊 Top 10 Licenças Mais Usadas')
+            fig4.update_traces(marker_color='#026B69')
+            fig4.update_layout(
+                plot_bgcolor='#FFFFFF',
+                paper_bgcolor='#FFFFFF',
+                font=dict(color='#333333', family='Cairo, sans-serif'),
+                title_font=dict(size=18, color='#333333', family='Cairo')
+            )
+        with span('serialize', 'licencas'):
+            return figure_fragment(fig4, "graph4")
     else:
-        graphs['licencas'] = """
+        return """
         <div class='alert alert-warning'>
             Não há dados suficientes para montar o gráfico de Licenças. Verifique se as colunas 'licenca' e 'qtdLicenca' possuem valores na planilha e se os filtros não zeraram os resultados.
         </div>
-        """
-    
-    # 5. Modalidade de Licença
-    modalidade = df.groupby('modalidadeLicenca')['valorTotalLicenca'].sum()
-    fig5 = px.pie(values=modalidade.values, names=modalidade.index,
-                  title='💳 Gastos por Modalidade de Licença', hole=0.3,
-                  color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41'])
-    fig5.update_layout(
-        plot_bgcolor='#FFFFFF',
-        paper_bgcolor='#FFFFFF',
-        font=dict(color='#333333', family='Cairo, sans-serif'),
-        title_font=dict(size=18, color='#333333', family='Cairo')
-    )
-    graphs['modalidade'] = fig5.to_html(full_html=False, div_id="graph5")
-    
-    # 6. Gastos por Setor
-    setor = df.groupby('setor')['valorTotalLicenca'].sum().sort_values(ascending=False).head(15)
-    fig6 = px.bar(x=setor.values, y=setor.index, orientation='h',
-                  labels={'x': 'Gasto Total (R$)', 'y': 'Setor'},
-                  title='🏢 Top 15 Setores por Gasto')
-    fig6.update_traces(marker_color='#609369')
-    fig6.update_layout(
-        plot_bgcolor='#FFFFFF',
-        paper_bgcolor='#FFFFFF',
-        font=dict(color='#333333', family='Cairo, sans-serif'),
-        title_font=dict(size=18, color='#333333', family='Cairo')
-    )
-    graphs['setor'] = fig6.to_html(full_html=False, div_id="graph6")
-    
-    # 7. Faturadores
-    faturador = df.groupby('faturador')['valorTotalLicenca'].sum().dropna()
-    if len(faturador) > 0:
-        fig7 = px.pie(values=faturador.values, names=faturador.index,
-                      title='🔄 Distribuição por Fornecedor (Faturador)',
-                      color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41', '#EEEEEE'])
-        fig7.update_layout(
+        """, None
+
+def graph_modalidade(df):
+    """Modalidade de Licença"""
+    with span('aggregate', 'modalidade'):
+        modalidade = df.groupby('modalidadeLicenca')['custoTotal'].sum()
+    with span('figure', 'modalidade'):
+        fig5 = px.pie(values=modalidade.values, names=modalidade.index,
+                      title='💳 Gastos por Modalidade de Licença', hole=0.3,
+                      color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41'])
+        fig5.update_layout(
             plot_bgcolor='#FFFFFF',
             paper_bgcolor='#FFFFFF',
             font=dict(color='#333333', family='Cairo, sans-serif'),
             title_font=dict(size=18, color='#333333', family='Cairo')
         )
-        graphs['faturador'] = fig7.to_html(full_html=False, div_id="graph7")
-    else:
-        graphs['faturador'] = '<p class="text-muted">Sem dados de faturador</p>'
-    
-    # 8. Tabela de Contratos
-    contratos_html = gerar_tabela_contratos(df)
-    graphs['contratos'] = contratos_html
-    
-    return kpis, graphs
+    with span('serialize', 'modalidade'):
+        return figure_fragment(fig5, "graph5")
+
+def graph_setor(df):
+    """Gastos por Setor"""
+    with span('aggregate', 'setor'):
+        setor = df.groupby('setor')['custoTotal'].sum().sort_values(ascending=False).head(15)
+    with span('figure', 'setor'):
+        fig6 = px.bar(x=setor.values, y=setor.index, orientation='h',
+                      labels={'x': 'Gasto Total (R$)', 'y': 'Setor'},
+                      title='🏢 Top 15 Setores por Gasto')
+        fig6.update_traces(marker_color='#609369')
+        fig6.update_layout(
+            plot_bgcolor='#FFFFFF',
+            paper_bgcolor='#FFFFFF',
+            font=dict(color='#333333', family='Cairo, sans-serif'),
+            title_font=dict(size=18, color='#333333', family='Cairo')
+        )
+    with span('serialize', 'setor'):
+        return figure_fragment(fig6, "graph6")
 
+def graph_faturador(df):
+    """Faturadores"""
+    with span('aggregate', 'faturador'):
+        faturador = df.groupby('faturador')['custoTotal'].sum().dropna()
+    if len(faturador) > 0:
+        with span('figure', 'faturador'):
+            fig7 = px.pie(values=faturador.values, names=faturador.index,
+                          title='🔄 Distribuição por Fornecedor (Faturador)',
+                          color_discrete_sequence=['#609369', '#026B69', '#7FB88A', '#014847', '#EEFF41', '#EEEEEE'])
+            fig7.update_layout(
+                plot_bgcolor='#FFFFFF',
+                paper_bgcolor='#FFFFFF',
+                font=dict(color='#333333', family='Cairo, sans-serif'),
+                title_font=dict(size=18, color='#333333', family='Cairo')
+            )
+        with span('serialize', 'faturador'):
+            return figure_fragment(fig7, "graph7")
+    else:
+        return '<p class="text-muted">Sem dados de faturador</p>', None
+
+def graph_contratos(df):
+    """Tabela de Contratos"""
+    with span('aggregate', 'contratos'):
+        return gerar_tabela_contratos(df), None
+
+GRAPH_SECTIONS = {
+    'empresas': graph_empresas,
+    'estados': graph_estados,
+    'centro_custo': graph_centro_custo,
+    'licencas': graph_licencas,
+    'modalidade': graph_modalidade,
+    'setor': graph_setor,
+    'faturador': graph_faturador,
+    'contratos': graph_contratos
+}
+
+def build_kpis(df):
+    """KPIs do topo da página"""
+    with span('aggregate', 'kpis'):
+        return {
+            'total_gasto': f"R$ {df['custoTotal'].sum():,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
+            'total_usuarios': len(df),
+            'total_empresas': df['empresa'].nunique(),
+            'total_licencas': int(df['qtdLicenca'].sum())
+        }
+
+def filtered_frame(snapshot, filters=None):
+    df = snapshot.df
+    if filters:
+        with span('filter'):
+            df = apply_filters(df, filters, snapshot)
+    return df
 
-@app.route('/api/export_selected', methods=['POST'])
-def api_export_selected():
+def section_key(name, filters=None):
+    return (datetime.now().date(), name) + tuple(sorted((filters or {}).items()))
+
+def cached_section(snapshot, name, filters=None, frame=None):
+    """(HTML, JSON da figura) de uma seção (ou os KPIs, name='kpis'), em cache por filtros e dia"""
+    builder = build_kpis if name == 'kpis' else GRAPH_SECTIONS[name]
+    frame = frame or (lambda: filtered_frame(snapshot, filters))
+    return snapshot.cached_figures(section_key(name, filters), lambda: builder(frame()))
+
+def profiling_fresh():
+    # Perfil de requisição pedido sem cache: recalcula em vez de ler do cache
+    return has_request_context() and g.get('profile_fresh')
+
+def create_section(name, filters=None, tenant=None):
+    """Uma seção (ou os KPIs) para os filtros, em cache por snapshot"""
+    snapshot = get_snapshot(tenant)
+    if profiling_fresh():
+        builder = build_kpis if name == 'kpis' else GRAPH_SECTIONS[name]
+        return builder(filtered_frame(snapshot, filters))
+    return cached_section(snapshot, name, filters)
+
+def create_graphs(filters=None, tenant=None):
+    """Cria todos os gráficos (em cache por snapshot, filtros e dia)"""
+    snapshot = get_snapshot(tenant)
+    return build_graphs(snapshot, filters, cached=not profiling_fresh())
+
+def cached_graphs(snapshot, filters=None):
+    """KPIs e gráficos do snapshot, cada seção em cache por filtros e dia"""
+    return build_graphs(snapshot, filters, cached=True)
+
+def build_graphs(snapshot, filters=None, cached=False):
+    """Monta KPIs, gráficos (HTML) e o JSON de cada figura a partir do snapshot"""
+    # Filtra uma vez só, e só se alguma seção precisar ser montada
+    memo = []
+    def frame():
+        if not memo:
+            memo.append(filtered_frame(snapshot, filters))
+        return memo[0]
+
+    if cached:
+        kpis = cached_section(snapshot, 'kpis', filters, frame)
+    else:
+        kpis = build_kpis(frame())
+    graphs = {}
+    figures = {}
+    for name, builder in GRAPH_SECTIONS.items():
+        html, fig_json = cached_section(snapshot, name, filters, frame) if cached else builder(frame())
+        graphs[name] = html
+        if fig_json is not None:
+            figures[name] = fig_json
+    return kpis, graphs, figures
+
+
+# Colunas do CSV de usuários selecionados
+EXPORT_SELECTED_COLUMNS = ['Empresa', 'Colaborador', 'Email', 'Licenca', 'Centro de Custo',
+                           'Valor por Centro de Custo', '% por Centro de Custo']
+
+def selected_users(df, emails):
+    """Linhas dos e-mails selecionados (e-mails normalizados na carga)"""
+    emails = [str(e).strip().lower() for e in emails]
+    return df[df['email'].isin(emails)]
+
+def export_selected_csv(sel_df):
+    """CSV com uma linha por usuário e o % de cada um sobre o total selecionado"""
+    # sum total of all selected users
+    total_selected_valor = sel_df['custoTotal'].sum()
+
+    si = StringIO()
+    writer = csv.writer(si)
+    writer.writerow(EXPORT_SELECTED_COLUMNS)
+
+    columns = ['empresa', 'nomeColaborador', 'email', 'licenca', 'Centro de Custo', 'custoTotal']
+    for empresa, colaborador, email, licenca, centro, user_val in sel_df[columns].itertuples(index=False, name=None):
+        # calculate percentage: (user value / total selected) * 100
+        pct = (user_val / total_selected_valor * 100) if total_selected_valor else 0.0
+
+        writer.writerow([
+            empresa or '',
+            colaborador or '',
+            email or '',
+            licenca or '',
+            centro or '',
+            f"{user_val:.2f}",
+            f"{pct:.2f}"
+        ])
+    return si.getvalue()
+
+SELECTED_FORMATS = {
+    'Valor por Centro de Custo': xlsx.BRL,
+    '% por Centro de Custo': xlsx.PERCENT,
+    'Usuários': xlsx.INTEGER,
+    'Valor': xlsx.BRL,
+    '% do Total': xlsx.PERCENT
+}
+
+def export_selected_xlsx(fh, sel_df):
+    """XLSX com uma aba por usuário e outra consolidada por Centro de Custo"""
+    total = sel_df['custoTotal'].sum()
+    columns = ['empresa', 'nomeColaborador', 'email', 'licenca', 'Centro de Custo', 'custoTotal']
+    users = sel_df[columns].assign(pct=sel_df['custoTotal'] / total * 100 if total else 0.0)
+
+    centros = sel_df.groupby('Centro de Custo', dropna=False).agg(
+        usuarios=('email', 'size'), valor=('custoTotal', 'sum')
+    ).reset_index().sort_values('valor', ascending=False)
+    centros['pct'] = centros['valor'] / total * 100 if total else 0.0
+
+    xlsx.write_workbook(fh, [
+        ('Usuários', EXPORT_SELECTED_COLUMNS, users.itertuples(index=False, name=None), SELECTED_FORMATS),
+        ('Por Centro de Custo', ['Centro de Custo', 'Usuários', 'Valor', '% do Total'],
+         centros.itertuples(index=False, name=None), SELECTED_FORMATS)
+    ])
+
+@tenant_route('/api/export_selected', methods=['POST'])
+def api_export_selected(tenant=None):
     try:
         payload = request.get_json(force=True)
         emails = payload.get('emails') if payload else None
         if not emails or not isinstance(emails, list):
             return jsonify({'error':'emails list required'}), 400
-
-        df = load_data()
-        # normalize email column name variations
-        email_col = None
-        for c in df.columns:
-            if c.lower() in ('email','e-mail'):
-                email_col = c
-                break
-        if email_col is None:
-            return jsonify({'error':'Email column not found in data'}), 500
-
-        # filter rows where email in selected emails
-        sel_df = df[df[email_col].isin(emails)].copy()
-
-        if sel_df.empty:
-            # return empty CSV
-            si = StringIO()
-            writer = csv.writer(si)
-            writer.writerow(['Empresa','Colaborador','Email','Licenca','Centro de Custo','Valor por Centro de Custo','% por Centro de Custo'])
-            output = si.getvalue()
-            return Response(output, mimetype='text/csv', headers={'X-Filename':'export_selected.csv'})
-
-        # ensure valorTotalLicenca is numeric
-        if 'valorTotalLicenca' not in sel_df.columns:
-            sel_df['valorTotalLicenca'] = pd.to_numeric(sel_df.get('valorTotalLicenca', pd.Series([0]*len(sel_df))), errors='coerce').fillna(0)
-        else:
-            sel_df['valorTotalLicenca'] = pd.to_numeric(sel_df['valorTotalLicenca'], errors='coerce').fillna(0)
-
-        # sum total of all selected users
-        total_selected_valor = sel_df['valorTotalLicenca'].sum()
-
-        # Build CSV: one row per user (no duplication)
-        si = StringIO()
-        writer = csv.writer(si)
-        writer.writerow(['Empresa','Colaborador','Email','Licenca','Centro de Custo','Valor por Centro de Custo','% por Centro de Custo'])
-
-        for idx, row in sel_df.iterrows():
-            empresa = row.get('empresa','')
-            colaborador = row.get('Colaborador','') if 'Colaborador' in row else row.get('colaborador','')
-            email = row.get(email_col,'')
-            licenca = row.get('licenca','')
-            centro = row.get('Centro de Custo','')
-            user_val = float(row.get('valorTotalLicenca') or 0)
-
-            # calculate percentage: (user value / total selected) * 100
-            pct = (user_val / total_selected_valor * 100) if total_selected_valor else 0.0
-
-            writer.writerow([
-                empresa,
-                colaborador,
-                email,
-                licenca,
-                centro,
-                f"{user_val:.2f}",
-                f"{pct:.2f}"
-            ])
-
-        output = si.getvalue()
+        fmt = export_format(payload)
+        if fmt is None:
+            return jsonify({'error': 'Formato inválido (use csv ou xlsx)'}), 400
+
+        sel_df = selected_users(load_data(tenant), emails)
+        file_name = 'export_selected.' + fmt
+
+        # Seleções grandes (ou ?async=1) viram exportação em segundo plano
+        if wants_async(payload, len(sel_df)):
+            if fmt == 'xlsx':
+                return submit_export(tenant, 'export_selected', file_name, xlsx.MIMETYPE,
+                                     lambda fh: export_selected_xlsx(fh, sel_df))
+            return submit_export(tenant, 'export_selected', file_name, 'text/csv',
+                                 lambda fh: fh.write(export_selected_csv(sel_df).encode('utf-8')))
+
+        if fmt == 'xlsx':
+            response = xlsx_response(lambda fh: export_selected_xlsx(fh, sel_df), file_name)
+            response.headers['X-Filename'] = file_name
+            return response
+
+        output = export_selected_csv(sel_df)
         return Response(output, mimetype='text/csv', headers={'X-Filename':'export_selected.csv'})
     except Exception as e:
         app.logger.exception('Erro gerando CSV de export_selected')
@@ -298,11 +589,15 @@ def gerar_tabela_contratos(df):
     if len(df_contratos) == 0:
         return '<p class="text-muted">Nenhum contrato encontrado com data de vencimento.</p>'
     
+    # Valor a vencer calculado para o dia de hoje (a seção fica em cache por dia)
+    df_contratos['valorRestante'] = remaining_value(df_contratos)
+    
     # Agrupar por empresa e licença para mostrar cada contrato
     contratos_detalhados = df_contratos.groupby(['empresa', 'licenca', 'modalidadeLicenca']).agg({
         'inicioContrato': 'min',
         'finalContrato': 'max',
-        'valorTotalLicenca': 'sum',
+        'custoTotal': 'sum',
+        'valorRestante': 'sum',
         'qtdLicenca': 'sum'
     }).reset_index()
     
@@ -320,6 +615,9 @@ def gerar_tabela_contratos(df):
             <button id="export_rateio_btn" class="btn btn-success btn-sm" disabled>
                 📥 Exportar Rateio CSV (contratos selecionados)
             </button>
+            <button id="export_rateio_xlsx_btn" class="btn btn-outline-success btn-sm ms-1" disabled>
+                📊 Exportar Rateio XLSX
+            </button>
             <span class="ms-3 text-muted small" id="sel_count">(0 contratos selecionados)</span>
         </div>
         <div>
@@ -344,6 +642,7 @@ def gerar_tabela_contratos(df):
                     <th>Dias Restantes</th>
                     <th>Qtd</th>
                     <th>Valor Total</th>
+                    <th>Valor Restante</th>
                 </tr>
             </thead>
             <tbody>
@@ -355,7 +654,8 @@ def gerar_tabela_contratos(df):
         modalidade = row['modalidadeLicenca']
         inicio = row['inicioContrato']
         fim = row['finalContrato']
-        total = row['valorTotalLicenca']
+        total = row['custoTotal']
+        restante = row['valorRestante']
         qtd_licencas = row['qtdLicenca']
         
         # Calcular dias restantes
@@ -383,6 +683,7 @@ def gerar_tabela_contratos(df):
             inicio_formatado = inicio.strftime('%d/%m/%Y') if pd.notna(inicio) else 'N/A'
             fim_formatado = fim.strftime('%d/%m/%Y') if pd.notna(fim) else 'N/A'
             total_formatado = f"R$ {total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            restante_formatado = f"R$ {restante:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
             html += f'''
                 <tr class="{row_class}">
@@ -401,6 +702,7 @@ def gerar_tabela_contratos(df):
                     <td><strong>{dias_texto}</strong></td>
                     <td>{int(qtd_licencas)}</td>
                     <td>{total_formatado}</td>
+                    <td>{restante_formatado}</td>
                 </tr>
             '''
     
@@ -421,67 +723,8 @@ def gerar_tabela_contratos(df):
     <script>
     (function(){
         const checkAll = document.getElementById('checkAllContratos');
-    // Handler para abrir a modal com todos os usuários ao clicar no KPI
-    (function(){
-        function renderUsersTable(usuarios, container, page=1, pageSize=25){
-            const start = (page-1)*pageSize;
-            const end = start + pageSize;
-            const pageItems = usuarios.slice(start, end);
-
-            let html = '<div class="table-responsive"><table class="table table-sm table-striped"><thead><tr>';
-            const keys = Object.keys(usuarios[0] || {});
-            for(const k of keys){ html += `<th>${k}</th>` }
-            html += '</tr></thead><tbody>';
-            for(const u of pageItems){
-                html += '<tr>';
-                for(const k of keys){ html += `<td>${u[k]===null||u[k]===undefined?'':u[k]}</td>` }
-                html += '</tr>';
-            }
-            html += `</tbody></table></div>`;
-
-            // paginação simples
-            const totalPages = Math.max(1, Math.ceil(usuarios.length / pageSize));
-            html += '<nav><ul class="pagination pagination-sm">';
-            for(let p=1;p<=totalPages;p++){
-                html += `<li class="page-item ${p===page?'active':''}"><a href="#" class="page-link" data-page="${p}">${p}</a></li>`;
-            }
-            html += '</ul></nav>';
-
-            container.innerHTML = html;
-            // attach page click
-            container.querySelectorAll('.page-link').forEach(a=>{
-                a.addEventListener('click', function(e){
-                    e.preventDefault();
-                    const p = parseInt(this.getAttribute('data-page'))||1;
-                    renderUsersTable(usuarios, container, p, pageSize);
-                })
-            })
-        }
-
-        const kpi = document.getElementById('kpi-total-usuarios');
-        if(kpi){
-            kpi.style.cursor = 'pointer';
-            kpi.addEventListener('click', function(){
-                const modal = document.getElementById('modalUsuarios');
-                const modalBody = modal.querySelector('.modal-body');
-                modal.querySelector('.modal-title').textContent = 'Todos os Usuários';
-                modalBody.innerHTML = '<p>Carregando usuários...</p>';
-                // abrir modal
-                const bsModal = new bootstrap.Modal(modal);
-                bsModal.show();
-
-                fetch('/api/usuarios').then(r=>r.json()).then(data=>{
-                    const usuarios = data.usuarios || [];
-                    if(usuarios.length===0){ modalBody.innerHTML = '<p>Nenhum usuário encontrado.</p>'; return; }
-                    renderUsersTable(usuarios, modalBody, 1, 25);
-                }).catch(err=>{
-                    console.error('Erro ao carregar todos os usuários', err);
-                    modalBody.innerHTML = '<div class="text-danger">Erro ao carregar usuários. Veja console.</div>';
-                })
-            })
-        }
-    })();
         const exportBtn = document.getElementById('export_rateio_btn');
+        const exportXlsxBtn = document.getElementById('export_rateio_xlsx_btn');
         const clearBtn = document.getElementById('clear_selection');
         const selCountEl = document.getElementById('sel_count');
 
@@ -490,6 +733,7 @@ def gerar_tabela_contratos(df):
             const count = checked.length;
             selCountEl.textContent = '(' + count + ' contratos selecionados)';
             exportBtn.disabled = count === 0;
+            if (exportXlsxBtn) exportXlsxBtn.disabled = count === 0;
             const all = document.querySelectorAll('.contrato-checkbox');
             if (all.length > 0 && checkAll) {
                 checkAll.checked = checked.length === all.length;
@@ -515,1719 +759,563 @@ def gerar_tabela_contratos(df):
             });
         }
 
-        function downloadBlob(blob, filename) {
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = filename;
-            document.body.appendChild(a);
-            a.click();
-            a.remove();
-            window.URL.revokeObjectURL(url);
-        }
-
-        if (exportBtn) {
-            exportBtn.addEventListener('click', function(){
-                const checked = Array.from(document.querySelectorAll('.contrato-checkbox:checked'));
-                if (checked.length === 0) {
-                    alert('Selecione pelo menos um contrato para exportar.');
-                    return;
-                }
-                const contracts = checked.map(function(cb){
-                    return {
-                        empresa: cb.getAttribute('data-empresa'),
-                        licenca: cb.getAttribute('data-licenca'),
-                        modalidade: cb.getAttribute('data-modalidade')
-                    };
-                });
-                exportBtn.disabled = true;
-                exportBtn.textContent = 'Gerando CSV...';
-                fetch('/api/rateio_contratos', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ contracts: contracts })
-                }).then(function(res){
-                    if (!res.ok) throw new Error('Falha na geração do CSV');
-                    const disposition = res.headers.get('Content-Disposition') || '';
-                    const filenameMatch = /filename="(.+)"/.exec(disposition);
-                    const filename = filenameMatch ? filenameMatch[1] : 'rateio_consolidado.csv';
-                    return res.blob().then(function(blob){ return { blob: blob, filename: filename }; });
-                }).then(function(data){
-                    downloadBlob(data.blob, data.filename);
-                }).catch(function(err){
-                    console.error(err);
-                    alert('Erro ao gerar o CSV: ' + err.message);
-                }).finally(function(){
-                    exportBtn.disabled = false;
-                    exportBtn.textContent = '📥 Exportar Rateio CSV (contratos selecionados)';
-                    updateState();
-                });
-            });
-        }
-
-        updateState();
-    })();
-    </script>
-    <script>
-    // Inline All Users list: fetch, sort by creation date desc, search, and render
-    (function(){
-        const container = document.getElementById('allusers-container');
-        const listEl = document.getElementById('allusers-list');
-        const loadingEl = document.getElementById('allusers-loading');
-        const input = document.getElementById('allusers-search');
-        const refreshBtn = document.getElementById('allusers-refresh');
-        const exportBtn = document.getElementById('allusers-export');
-
-        if(!container || !listEl || !loadingEl) return;
-
-        let allUsers = [];
-
-        function parseDateSafe(val){
-            if(!val) return null;
-            // try ISO parse
-            const d = new Date(val);
-            if(!isNaN(d)) return d;
-            // try dd/mm/yyyy
-            const parts = String(val).split('/');
-            if(parts.length===3){
-                const dd = parts[0], mm = parts[1], yyyy = parts[2];
-                const dx = new Date(`${yyyy}-${mm}-${dd}`);
-                if(!isNaN(dx)) return dx;
-            }
-            return null;
-        }
-
-        function updateExportButton(){
-            const any = Array.from(document.querySelectorAll('.user-select-checkbox')).some(x=>x.checked);
-            if(exportBtn) exportBtn.disabled = !any;
-            // sync select-all checkbox
-            const allCheckboxes = Array.from(document.querySelectorAll('.user-select-checkbox'));
-            const selAll = document.getElementById('allusers-select-all');
-            if(selAll) selAll.checked = allCheckboxes.length>0 && allCheckboxes.every(x=>x.checked);
-        }
-
-        function renderRows(arr){
-            if(!Array.isArray(arr)) arr = [];
-            if(arr.length===0){
-                listEl.innerHTML = '<div class="text-muted p-3">Nenhum usuário encontrado.</div>';
-                listEl.style.display = '';
+        function exportRateio(btn, format) {
+            const checked = Array.from(document.querySelectorAll('.contrato-checkbox:checked'));
+            if (checked.length === 0) {
+                alert('Selecione pelo menos um contrato para exportar.');
                 return;
             }
-
-            const html = arr.map(u=>{
-                const created = u['Data de Criação'] || u['DataCriacaoEmail'] || u['DataCriacaoFormatada'] || '';
-                const createdFmt = created ? String(created).replace('T00:00:00','') : '';
-                const centro = u['Centro de Custo'] || '';
-                const empresa = u['Empresa'] || '';
-                const fmtNumber = (n)=> Number(n||0).toLocaleString('pt-BR', {minimumFractionDigits:2, maximumFractionDigits:2});
-                const totalNum = u['Total'] ?? u['total'] ?? 0;
-                const valorTotalStr = u['Valor Total'] || u['ValorTotal'] || (totalNum ? ('R$ ' + fmtNumber(totalNum)) : 'R$ 0,00');
-                // Surround each user with a checkbox for selection
-                return `
-                    <div class="user-card mb-2 p-2 border rounded d-flex align-items-center">
-                        <div style="width:36px; flex:0 0 36px;">
-                            <input type="checkbox" class="user-select-checkbox form-check-input" data-email="${(u['Email']||'').replace(/"/g,'')}">
-                        </div>
-                        <div style="flex:1;">
-                            <strong>${u['Colaborador'] || ''}</strong><br>
-                            <small class="text-muted">${u['Email'] || ''} • ${empresa} • ${centro}</small>
-                        </div>
-                        <div style="width:200px; text-align:right;">
-                            <p class="mb-1"><small class="text-muted">${createdFmt}</small></p>
-                            <p class="mb-1"><strong>Qtd:</strong> ${u['Quantidade'] ?? ''}</p>
-                            <p class="mb-1"><strong>Valor Unit:</strong> ${u['Valor Unitário']? 'R$ ' + Number(u['Valor Unitário']).toLocaleString('pt-BR', {minimumFractionDigits:2}): ''}</p>
-                            <p class="mb-0"><strong>Valor Total:</strong> ${valorTotalStr}</p>
-                        </div>
-                    </div>`;
-            }).join('');
-
-            listEl.innerHTML = html;
-            listEl.style.display = '';
-        }
-
-        function applySearchAndRender(){
-            const term = (input && input.value || '').toLowerCase();
-            let filtered = allUsers.filter(u => {
-                const txt = [u['Colaborador'], u['Email'], u['Empresa'], u['Centro de Custo']].map(x => (x||'').toString().toLowerCase()).join(' ');
-                return txt.includes(term);
+            const contracts = checked.map(function(cb){
+                return {
+                    empresa: cb.getAttribute('data-empresa'),
+                    licenca: cb.getAttribute('data-licenca'),
+                    modalidade: cb.getAttribute('data-modalidade')
+                };
             });
-            renderRows(filtered);
-        }
-
-        function fetchAndRender(){
-            loadingEl.style.display = '';
-            listEl.style.display = 'none';
-            fetch('/api/usuarios').then(r=>{ if(!r.ok) throw new Error('HTTP '+r.status); return r.json(); }).then(data=>{
-                const users = (data && data.usuarios) ? data.usuarios : [];
-                // normalize dates
-                users.forEach(u=>{
-                    const candidates = ['Data de Criação','DataCriacaoEmail','DataCriacaoFormatada'];
-                    let found = null;
-                    for(const c of candidates){ if(u[c]) { found = u[c]; break; } }
-                    u.__created = parseDateSafe(found);
-                });
-
-                // sort desc by __created (nulls last)
-                users.sort((a,b)=>{
-                    const da = a.__created, db = b.__created;
-                    if(da && db) return db - da;
-                    if(da && !db) return -1;
-                    if(!da && db) return 1;
-                    return 0;
-                });
-
-                allUsers = users;
-                loadingEl.style.display = 'none';
-                applySearchAndRender();
-            }).catch(err=>{
-                console.error('Erro fetching all users inline:', err);
-                loadingEl.innerHTML = `<div class="text-danger p-3">Erro ao carregar usuários: ${err.message}</div>`;
+            const label = btn.textContent;
+            const tipo = format.toUpperCase();
+            btn.disabled = true;
+            btn.textContent = 'Gerando ' + tipo + '...';
+            window.fetchExport(window.API_BASE + '/api/rateio_contratos', { contracts: contracts, format: format },
+                               'rateio_consolidado.' + format).then(function(data){
+                window.saveExport(data);
+            }).catch(function(err){
+                console.error(err);
+                alert('Erro ao gerar o ' + tipo + ': ' + err.message);
+            }).finally(function(){
+                btn.disabled = false;
+                btn.textContent = label;
+                updateState();
             });
         }
 
-        // Event delegation: attach handlers once to container (not to individual checkboxes)
-        if(container){
-            container.addEventListener('change', function(e){
-                if(e.target && e.target.classList.contains('user-select-checkbox')){
-                    updateExportButton();
-                }
-            });
+        if (exportBtn) {
+            exportBtn.addEventListener('click', function(){ exportRateio(exportBtn, 'csv'); });
         }
-
-        // select-all behavior (attach once)
-        const selAll = document.getElementById('allusers-select-all');
-        if(selAll){
-            selAll.addEventListener('change', function(){
-                const on = !!this.checked;
-                document.querySelectorAll('.user-select-checkbox').forEach(x=>{ x.checked = on; });
-                if(exportBtn) exportBtn.disabled = !on;
-            });
+        if (exportXlsxBtn) {
+            exportXlsxBtn.addEventListener('click', function(){ exportRateio(exportXlsxBtn, 'xlsx'); });
         }
 
-        if(input) input.addEventListener('input', applySearchAndRender);
-        if(refreshBtn) refreshBtn.addEventListener('click', fetchAndRender);
-        if(exportBtn) exportBtn.addEventListener('click', function(){
-            // collect selected users
-            const selected = Array.from(document.querySelectorAll('.user-select-checkbox')).filter(x=>x.checked).map(x=>x.getAttribute('data-email'));
-            if(selected.length===0){ alert('Selecione pelo menos um usuário para exportar.'); return; }
-
-            // prepare payload: send list of emails to server which will compute per-centro totals
-            fetch('/api/export_selected', {
-                method: 'POST',
-                headers: {'Content-Type':'application/json'},
-                body: JSON.stringify({ emails: selected })
-            }).then(r=>{
-                if(!r.ok) throw new Error('HTTP ' + r.status);
-                return r.blob().then(b=>({ blob: b, filename: (r.headers.get('X-Filename')||'export_selected.csv') }));
-            }).then(data=>{
-                const url = URL.createObjectURL(data.blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = data.filename;
-                document.body.appendChild(a);
-                a.click();
-                a.remove();
-                URL.revokeObjectURL(url);
-            }).catch(err=>{ console.error('Erro export:', err); alert('Erro ao exportar: '+err.message); });
-        });
-
-        // initial load
-        fetchAndRender();
+        updateState();
     })();
     </script>
     '''
     
     return html
 
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Gerenciamento - Licenciamento Microsoft</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Cairo:wght@400;500;600;700&display=swap');
-        
-        :root {
-            /* Nova Paleta de Cores */
-            --primary: #609369;
-            --card-bg: #026B69;
-            --page-bg: #013938;
-            --title-color: #EEEEEE;
-            --body-color: #FFFFFF;
-            --accent-light: #7FB88A;
-            --accent-dark: #014847;
-        }
-        
-        body {
-            background-color: var(--page-bg);
-            font-family: 'Cairo', 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            color: var(--body-color);
-            line-height: 1.6;
-        }
-        
-        .dashboard-header {
-            background: linear-gradient(135deg, var(--card-bg) 0%, var(--primary) 100%);
-            color: var(--body-color);
-            padding: 50px;
-            border-radius: 0;
-            margin-bottom: 40px;
-            box-shadow: 0 4px 16px rgba(0, 0, 0, 0.3);
-            position: relative;
-        }
-        
-        .dashboard-logo {
-            position: absolute;
-            top: 15px;
-            left: 40px;
-            height: 120px;
-            width: auto;
-            filter: brightness(0) invert(1);
-            opacity: 0.95;
-            transition: all 0.3s ease;
-        }
-        
-        .dashboard-logo:hover {
-            opacity: 1;
-            transform: scale(1.05);
-        }
-        
-        .dashboard-header h1 {
-            font-family: 'Cairo', sans-serif;
-            font-weight: 700;
-            margin-bottom: 12px;
-            font-size: 2.5rem;
-            letter-spacing: -0.5px;
-            margin-left: 150px;
-            color: var(--title-color);
-        }
-        
-        .dashboard-header p {
-            font-family: 'Cairo', sans-serif;
-            font-size: 1.2rem;
-            opacity: 0.95;
-            font-weight: 500;
-            margin-left: 150px;
-            color: var(--body-color);
-        }
-        
-        .dashboard-header small {
-            opacity: 0.85;
-            font-size: 0.9rem;
-            margin-left: 150px;
-            color: var(--body-color);
-        }
-        
-        .kpi-card {
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);
-            transition: all 0.2s cubic-bezier(0.4, 0, 0.2, 1);
-            margin-bottom: 24px;
-            border: none;
-            overflow: hidden;
-            background: #FFFFFF;
-        }
-        
-        .kpi-card:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 16px rgba(0, 0, 0, 0.4);
-        }
-        
-        .kpi-card.bg-success {
-            background: linear-gradient(135deg, var(--primary) 0%, #7FB88A 100%) !important;
-            color: #FFFFFF;
-        }
-        
-        .kpi-card.bg-primary {
-            background: linear-gradient(135deg, var(--card-bg) 0%, #038280 100%) !important;
-            color: #FFFFFF;
-        }
-        
-        .kpi-card.bg-info {
-            background: linear-gradient(135deg, #014847 0%, var(--card-bg) 100%) !important;
-            color: #FFFFFF;
-        }
-        
-        .kpi-card.bg-warning {
-            background: linear-gradient(135deg, var(--primary) 0%, #7FB88A 100%) !important;
-            color: #FFFFFF !important;
-        }
-        
-        .kpi-card .card-body h6 {
-            font-family: 'Cairo', sans-serif;
-            font-weight: 700;
-            font-size: 0.85rem;
-            text-transform: uppercase;
-            letter-spacing: 1.2px;
-            opacity: 0.9;
-            color: #FFFFFF;
-        }
-        
-        .kpi-card .card-body h2 {
-            font-family: 'Cairo', sans-serif;
-            font-weight: 700;
-            font-size: 2.8rem;
-            margin: 18px 0;
-            letter-spacing: -1px;
-            color: #FFFFFF;
-        }
-        
-        .kpi-card .card-body small {
-            opacity: 0.85;
-            font-size: 0.85rem;
-            color: #FFFFFF;
-        }
-        
-        .card-custom {
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.15);
-            margin-bottom: 28px;
-            border: none;
-            background: #FFFFFF;
-            transition: all 0.2s cubic-bezier(0.4, 0, 0.2, 1);
-        }
-        
-        .card-custom:hover {
-            box-shadow: 0 6px 16px rgba(0, 0, 0, 0.2);
-            transform: translateY(-2px);
-        }
-        
-        .card-custom .card-body {
-            padding: 28px;
-        }
-        
-        .card-custom h5 {
-            font-family: 'Cairo', sans-serif;
-            color: var(--primary);
-            font-weight: 700;
-            margin-bottom: 24px;
-            font-size: 1.3rem;
-        }
-        
-        .filter-section {
-            background: #FFFFFF;
-            padding: 28px;
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.15);
-            margin-bottom: 30px;
-            border-top: 3px solid var(--primary);
-        }
-        
-        .filter-section h5 {
-            font-family: 'Cairo', sans-serif;
-            color: var(--primary);
-            font-weight: 700;
-            margin-bottom: 24px;
-            font-size: 1.2rem;
-        }
-        
-        .filter-label {
-            font-family: 'Cairo', sans-serif;
-            font-weight: 600;
-            color: #333333;
-            margin-bottom: 8px;
-            font-size: 0.9rem;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }
-        
-        .form-select {
-            border: 1px solid #DDDDDD;
-            border-radius: 6px;
-            padding: 10px 14px;
-            transition: all 0.3s;
-            background-color: #FAFAFA;
-            color: #333333;
-        }
-        
-        .form-select:focus {
-            border-color: var(--primary);
-            box-shadow: 0 0 0 0.25rem rgba(96, 147, 105, 0.2);
-            outline: none;
-        }
-        
-        .btn-filter {
-            font-family: 'Cairo', sans-serif;
-            background: linear-gradient(135deg, var(--primary) 0%, #7FB88A 100%);
-            border: none;
-            padding: 12px 32px;
-            font-weight: 700;
-            border-radius: 6px;
-            transition: all 0.2s;
-            color: var(--body-color);
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-            font-size: 0.9rem;
-        }
-        
-        .btn-filter:hover {
-            background: linear-gradient(135deg, #7FB88A 0%, var(--primary) 100%);
-            transform: translateY(-1px);
-            box-shadow: 0 4px 12px rgba(96, 147, 105, 0.4);
-        }
-        
-        .btn-clear {
-            font-family: 'Cairo', sans-serif;
-            background: var(--accent-dark);
-            border: 1px solid var(--primary);
-            padding: 12px 32px;
-            font-weight: 700;
-            border-radius: 6px;
-            transition: all 0.2s;
-            color: var(--body-color);
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-            font-size: 0.9rem;
-        }
-        
-        .btn-clear:hover {
-            background: var(--card-bg);
-            border-color: var(--primary);
-            transform: translateY(-1px);
-            box-shadow: 0 4px 12px rgba(96, 147, 105, 0.3);
-        }
-        
-        .user-card {
-            background: #FAFAFA;
-            border-left: 5px solid var(--primary);
-            padding: 20px;
-            margin-bottom: 14px;
-            border-radius: 10px;
-            transition: all 0.3s;
-        }
-        
-        .user-card:hover {
-            background: #FFFFFF;
-            border-left-color: #7FB88A;
-            box-shadow: 0 4px 12px rgba(96, 147, 105, 0.3);
-            transform: translateX(8px);
-        }
-        
-        .badge-licenca {
-            font-family: 'Cairo', sans-serif;
-            cursor: pointer;
-            transition: all 0.3s;
-            background: var(--primary) !important;
-            padding: 10px 18px;
-            font-size: 0.95rem;
-            border-radius: 8px;
-            font-weight: 600;
-        }
-        
-        .badge-licenca:hover {
-            transform: scale(1.1);
-            box-shadow: 0 4px 12px rgba(0, 151, 167, 0.5);
-            background: var(--accent1) !important;
-        }
-        
-        .table-danger {
-            background-color: #ffebee !important;
-            font-weight: 600;
-            border-left: 5px solid #f44336;
-            color: #333333;
-        }
-        
-        .table-warning {
-            background-color: #fff9e6 !important;
-            font-weight: 600;
-            border-left: 5px solid var(--primary);
-            color: #333333;
-        }
-        
-        .table-info {
-            background-color: #e1f5fe !important;
-            border-left: 5px solid var(--card-bg);
-            color: #333333;
-        }
-        
-        .table-danger:hover, .table-warning:hover, .table-info:hover {
-            opacity: 0.88;
-        }
-        
-        .table-dark {
-            background: linear-gradient(135deg, var(--card-bg) 0%, var(--primary) 100%) !important;
-            color: var(--body-color);
-        }
-        
-        .table-dark th {
-            font-family: 'Cairo', sans-serif;
-            border: none !important;
-            padding: 16px !important;
-            font-weight: 700;
-            text-transform: uppercase;
-            font-size: 0.85rem;
-            letter-spacing: 0.8px;
-        }
-        
-        .modal-header {
-            background: linear-gradient(135deg, var(--card-bg) 0%, var(--primary) 100%);
-            color: var(--body-color);
-            border-radius: 8px 8px 0 0;
-        }
-        
-        .modal-header .btn-close {
-            filter: brightness(0) invert(1);
-        }
-        
-        .modal-content {
-            border-radius: 8px;
-            border: none;
-            box-shadow: 0 8px 24px rgba(0, 0, 0, 0.5);
-            background-color: #FFFFFF;
-            color: #333333;
-        }
-        
-        .badge.bg-danger {
-            background: #f44336 !important;
-            font-family: 'Cairo', sans-serif;
-        }
-        
-        .badge.bg-warning {
-            background: var(--primary) !important;
-            color: var(--body-color) !important;
-            font-family: 'Cairo', sans-serif;
-            font-weight: 700;
-        }
-        
-        .badge.bg-info {
-            background: var(--card-bg) !important;
-            font-family: 'Cairo', sans-serif;
-        }
-        
-        .badge.bg-success {
-            background: #4CAF50 !important;
-            font-family: 'Cairo', sans-serif;
-        }
-        
-        /* Animações */
-        @keyframes slideIn {
-            from {
-                opacity: 0;
-                transform: translateY(20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-        
-        .card-custom, .kpi-card {
-            animation: slideIn 0.5s ease-out;
-        }
-        
-        /* Scrollbar personalizada */
-        ::-webkit-scrollbar {
-            width: 10px;
-        }
-        
-        ::-webkit-scrollbar-track {
-            background: #F5F5F5;
-        }
-        
-        ::-webkit-scrollbar-thumb {
-            background: var(--primary);
-            border-radius: 5px;
-        }
-        
-        ::-webkit-scrollbar-thumb:hover {
-            background: #7FB88A;
-        }
-        
-        /* Estilo personalizado para checkboxes - Paleta de cores do dashboard */
-        .contrato-checkbox.form-check-input,
-        #checkAllContratos.form-check-input {
-            width: 20px;
-            height: 20px;
-            cursor: pointer;
-            border: 2px solid var(--primary);
-            border-radius: 4px;
-            transition: all 0.2s ease;
-            background-color: #FFFFFF;
-            --bs-form-check-bg-image: url("data:image/svg+xml,%3csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 20 20'%3e%3cpath fill='none' stroke='%23FFFFFF' stroke-linecap='round' stroke-linejoin='round' stroke-width='3' d='m6 10 3 3 6-6'/%3e%3c/svg%3e");
-        }
-        
-        .contrato-checkbox.form-check-input:hover,
-        #checkAllContratos.form-check-input:hover {
-            border-color: var(--accent-light);
-            box-shadow: 0 0 8px rgba(96, 147, 105, 0.3);
-        }
-        
-        .contrato-checkbox.form-check-input:checked,
-        #checkAllContratos.form-check-input:checked {
-            background-color: #609369 !important;
-            border-color: #609369 !important;
-            background-image: url("data:image/svg+xml,%3csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 20 20'%3e%3cpath fill='none' stroke='%23FFFFFF' stroke-linecap='round' stroke-linejoin='round' stroke-width='3' d='m6 10 3 3 6-6'/%3e%3c/svg%3e") !important;
-        }
-        
-        .contrato-checkbox.form-check-input:checked:hover,
-        #checkAllContratos.form-check-input:checked:hover {
-            background-color: #7FB88A !important;
-            border-color: #7FB88A !important;
-        }
-        
-        .contrato-checkbox.form-check-input:focus,
-        #checkAllContratos.form-check-input:focus {
-            border-color: #609369 !important;
-            box-shadow: 0 0 0 0.25rem rgba(96, 147, 105, 0.25) !important;
-            outline: none !important;
-        }
-        
-        .contrato-checkbox.form-check-input:active,
-        #checkAllContratos.form-check-input:active {
-            border-color: #609369 !important;
-            background-color: #7FB88A !important;
-        }
-        
-        .contrato-checkbox.form-check-input:checked:focus,
-        #checkAllContratos.form-check-input:checked:focus {
-            background-color: #609369 !important;
-            border-color: #609369 !important;
-            box-shadow: 0 0 0 0.25rem rgba(96, 147, 105, 0.25) !important;
-        }
-        
-        .contrato-checkbox.form-check-input:checked:active,
-        #checkAllContratos.form-check-input:checked:active {
-            background-color: #7FB88A !important;
-            border-color: #7FB88A !important;
-        }
-        
-        .table {
-            color: #333333;
-            background-color: #FFFFFF;
-        }
-        
-        .table-hover tbody tr:hover {
-            background-color: rgba(96, 147, 105, 0.1) !important;
-        }
-
-        /* Chips (Filtros rápidos) usando a paleta */
-        #chips-empresa .btn,
-        #chips-setor .btn,
-        #chips-estado .btn {
-            border-radius: 999px;
-            padding: 4px 10px;
-            font-weight: 600;
-        }
-
-        /* Estado inativo (outline) no escopo dos chips */
-        #chips-empresa .btn-outline-primary,
-        #chips-setor .btn-outline-primary,
-        #chips-estado .btn-outline-primary {
-            color: var(--primary) !important;
-            border-color: var(--primary) !important;
-            background-color: #FFFFFF !important;
-        }
-        #chips-empresa .btn-outline-primary:hover,
-        #chips-setor .btn-outline-primary:hover,
-        #chips-estado .btn-outline-primary:hover {
-            color: #FFFFFF !important;
-            background-color: var(--primary) !important;
-            border-color: var(--primary) !important;
-        }
-
-        /* Ativo (filled) no escopo dos chips */
-        #chips-empresa .btn-primary,
-        #chips-setor .btn-primary,
-        #chips-estado .btn-primary {
-            color: #FFFFFF !important;
-            background-color: var(--primary) !important;
-            border-color: var(--primary) !important;
-            box-shadow: 0 2px 6px rgba(96, 147, 105, 0.3);
-        }
-        #chips-empresa .btn-primary:hover,
-        #chips-setor .btn-primary:hover,
-        #chips-estado .btn-primary:hover {
-            filter: brightness(0.95);
-        }
-    </style>
-</head>
-<body>
-    <div class="container-fluid py-4">
-        <!-- Header -->
-        <div class="dashboard-header text-center">
-            <img src="/static/logo.png" alt="Logo" class="dashboard-logo">
-            <h1 class="mb-2">📊 Dashboard de Licenciamento Microsoft</h1>
-            <p class="mb-0">Análise Completa de Licenças e Custos</p>
-            <small>Última atualização: {{ update_time }}</small>
-        </div>
-        
-        <!-- Filtros -->
-        <div class="filter-section">
-            <h5 class="mb-4"><i class="bi bi-funnel"></i> 🔍 Filtros</h5>
-            <form method="GET" action="/">
-                <div class="row">
-                    <div class="col-md-2">
-                        <label class="filter-label">Empresa</label>
-                        <select name="empresa" class="form-select form-select-sm">
-                            <option value="Todas" {% if current_filters.empresa == 'Todas' %}selected{% endif %}>Todas</option>
-                            {% for empresa in filter_options.empresas %}
-                            <option value="{{ empresa }}" {% if current_filters.empresa == empresa %}selected{% endif %}>{{ empresa }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    
-                    <div class="col-md-2">
-                        <label class="filter-label">Estado</label>
-                        <select name="estado" class="form-select form-select-sm">
-                            <option value="Todos" {% if current_filters.estado == 'Todos' %}selected{% endif %}>Todos</option>
-                            {% for estado in filter_options.estados %}
-                            <option value="{{ estado }}" {% if current_filters.estado == estado %}selected{% endif %}>{{ estado }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    
-                    <div class="col-md-2">
-                        <label class="filter-label">Setor</label>
-                        <select name="setor" class="form-select form-select-sm">
-                            <option value="Todos" {% if current_filters.setor == 'Todos' %}selected{% endif %}>Todos</option>
-                            {% for setor in filter_options.setores %}
-                            <option value="{{ setor }}" {% if current_filters.setor == setor %}selected{% endif %}>{{ setor }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    
-                    <div class="col-md-2">
-                        <label class="filter-label">Centro de Custo</label>
-                        <select name="centro_custo" class="form-select form-select-sm">
-                            <option value="Todos" {% if current_filters.centro_custo == 'Todos' %}selected{% endif %}>Todos</option>
-                            {% for cc in filter_options.centros_custo %}
-                            <option value="{{ cc }}" {% if current_filters.centro_custo == cc %}selected{% endif %}>{{ cc }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    
-                    <div class="col-md-2">
-                        <label class="filter-label">Licença</label>
-                        <select name="licenca" class="form-select form-select-sm">
-                            <option value="Todas" {% if current_filters.licenca == 'Todas' %}selected{% endif %}>Todas</option>
-                            {% for licenca in filter_options.licencas %}
-                            <option value="{{ licenca }}" {% if current_filters.licenca == licenca %}selected{% endif %}>{{ licenca }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    
-                    <div class="col-md-2">
-                        <label class="filter-label">Modalidade</label>
-                        <select name="modalidade" class="form-select form-select-sm">
-                            <option value="Todas" {% if current_filters.modalidade == 'Todas' %}selected{% endif %}>Todas</option>
-                            {% for mod in filter_options.modalidades %}
-                            <option value="{{ mod }}" {% if current_filters.modalidade == mod %}selected{% endif %}>{{ mod }}</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                </div>
-                
-                <div class="row mt-3">
-                    <div class="col-md-12 text-end">
-                        <button type="submit" class="btn btn-primary btn-filter">🔍 Aplicar Filtros</button>
-                        <a href="/" class="btn btn-secondary btn-clear">🔄 Limpar Filtros</a>
-                    </div>
-                </div>
-            </form>
-        </div>
-        
-        <!-- KPI Cards -->
-        <div class="row mb-4">
-            <div class="col-md-3">
-                <div class="card kpi-card bg-success text-white">
-                    <div class="card-body text-center">
-                        <h6>💰 Gasto Total</h6>
-                        <h2>{{ kpis.total_gasto }}</h2>
-                        <small>Total investido em licenças</small>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="card kpi-card bg-primary text-white">
-                    <div class="card-body text-center">
-                        <h6>👥 Total de Usuários</h6>
-                        <h2 id="kpi-total-usuarios">{{ kpis.total_usuarios }}</h2>
-                        <small>Usuários com licenças</small>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="card kpi-card bg-info text-white">
-                    <div class="card-body text-center">
-                        <h6>🏢 Empresas</h6>
-                        <h2>{{ kpis.total_empresas }}</h2>
-                        <small>Empresas cadastradas</small>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="card kpi-card bg-warning text-white">
-                    <div class="card-body text-center">
-                        <h6>📋 Licenças</h6>
-                        <h2>{{ kpis.total_licencas }}</h2>
-                        <small>Total de licenças ativas</small>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Card: Todos os Usuários (inline) -->
-        <div class="row mb-4">
-            <div class="col-md-12">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        <h5 class="card-title">👥 Todos os Usuários (Lista)</h5>
-                        <p class="text-muted">Lista inline com pesquisa e rolagem, ordenada por Data de Criação (mais recente primeiro).</p>
-                        <div class="row mb-3">
-                            <div class="col-md-6">
-                                <input id="allusers-search" type="text" class="form-control form-control-sm" placeholder="Pesquisar usuário, email, empresa, centro de custo...">
-                            </div>
-                            <div class="col-md-6 text-end">
-                                <div class="d-inline-flex align-items-center">
-                                    <input id="allusers-select-all" type="checkbox" class="form-check-input me-2" title="Selecionar todos">
-                                    <button id="allusers-refresh" class="btn btn-sm btn-outline-primary me-2">Atualizar</button>
-                                    <button id="allusers-export" class="btn btn-sm btn-success" disabled>📥 Exportar CSV</button>
-                                </div>
-                            </div>
-                        </div>
-
-                        <div id="allusers-container" style="max-height:600px; overflow-y:auto;">
-                            <div class="text-center py-4" id="allusers-loading">
-                                <div class="spinner-border text-primary" role="status"><span class="visually-hidden">Carregando...</span></div>
-                            </div>
-                            <div id="allusers-list" style="display:none;"></div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Gráficos -->
-        <div class="row">
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.empresas | safe }}
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.estados | safe }}
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="row">
-            <div class="col-md-12 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.centro_custo | safe }}
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="row">
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        <h5 class="mb-3">📊 Top 10 Licenças Mais Usadas 
-                            <small class="text-muted">(Clique em uma licença para ver usuários)</small>
-                        </h5>
-                        {{ graphs.licencas | safe }}
-                        <div id="licencasList" class="mt-3"></div>
-                        <script>
-                        (function() {
-                            const listEl = document.getElementById('licencasList');
-                            function renderFallbackList(gd) {
-                                try {
-                                    const labels = (gd && gd.data && gd.data[0] && gd.data[0].y) || [];
-                                    if (!labels || labels.length === 0 || !listEl) return;
-                                    let html = '<div class="d-flex flex-wrap gap-2">';
-                                    labels.forEach(lbl => {
-                                        const text = String(lbl);
-                                        html += `<button type="button" class="btn btn-sm" style="border:1px solid #026B69;color:#026B69" onclick="window.mostrarUsuarios('${text.replace(/'/g, "&#39;")}')">${text}</button>`;
-                                    });
-                                    html += '</div>';
-                                    listEl.innerHTML = html;
-                                } catch (e) { console.warn('Falha ao montar lista fallback de licenças', e); }
-                            }
-
-                            function bindClick() {
-                                const gd = document.getElementById('graph4');
-                                if (!gd) return false;
-                                if (typeof gd.on === 'function') {
-                                    try {
-                                        renderFallbackList(gd);
-                                        gd.on('plotly_click', function(evt) {
-                                            try {
-                                                const pt = evt.points && evt.points[0];
-                                                const licenca = String((pt && (pt.y ?? pt.label ?? pt.text)) || '');
-                                                console.log('[licencas] clique no gráfico:', licenca, pt);
-                                                if (licenca) { window.mostrarUsuarios(licenca); }
-                                            } catch (e) {
-                                                console.error('Erro ao capturar clique na licença:', e);
-                                            }
-                                        });
-                                        gd.style.cursor = 'pointer';
-                                    } catch (e) { console.warn('Falha ao vincular click no gráfico', e); }
-                                    return true;
-                                }
-                                return false;
-                            }
-                            if (!bindClick()) {
-                                let attempts = 0;
-                                const iv = setInterval(() => {
-                                    attempts++;
-                                    if (bindClick() || attempts > 25) clearInterval(iv);
-                                }, 200);
-                            }
-                        })();
-                        </script>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.modalidade | safe }}
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="row">
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.setor | safe }}
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-6 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        {{ graphs.faturador | safe }}
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Contratos -->
-        <div class="row">
-            <div class="col-md-12 mb-4">
-                <div class="card card-custom">
-                    <div class="card-body">
-                        <h5 class="card-title">📋 Controle de Contratos por Empresa</h5>
-                        <p class="text-muted">Acompanhamento de vencimentos e renovações</p>
-                        <div class="mb-3">
-                            <input type="text" id="pesquisa-contratos" class="form-control" placeholder="Pesquisar na tabela...">
-                        </div>
-                        {{ graphs.contratos | safe }}
-                        <script>
-                        (function() {
-                            const input = document.getElementById('pesquisa-contratos');
-                            if (input) {
-                                input.addEventListener('keyup', function() {
-                                    const termo = input.value.toLowerCase();
-                                    document.querySelectorAll('#graph_contratos tbody tr').forEach(function(row) {
-                                        const texto = row.textContent.toLowerCase();
-                                        row.style.display = texto.includes(termo) ? '' : 'none';
-                                    });
-                                });
-                            }
-                        })();
-                        </script>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-    
-    <!-- Modal para mostrar usuários -->
-    <div class="modal fade" id="modalUsuarios" tabindex="-1">
-        <div class="modal-dialog modal-lg">
-            <div class="modal-content">
-                <div class="modal-header bg-primary text-white">
-                    <h5 class="modal-title" id="modalTitle">👥 Usuários da Licença</h5>
-                    <button type="button" class="btn-close btn-close-white" data-bs-dismiss="modal"></button>
-                </div>
-                <div class="modal-body" id="modalBody" style="max-height: 600px; overflow-y: auto;">
-                    <div class="text-center">
-                        <div class="spinner-border text-primary" role="status">
-                            <span class="visually-hidden">Carregando...</span>
-                        </div>
-                    </div>
-                </div>
-                <div class="modal-footer">
-                    <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Fechar</button>
-                </div>
-            </div>
-        </div>
-    </div>
-
-        <script>
-    window.mostrarUsuarios = function(licenca) {
-        console.log('=== INICIO mostrarUsuarios ===');
-        console.log('Licença recebida:', licenca);
-        console.log('Tipo:', typeof licenca);
-        
-        const modalEl = document.getElementById('modalUsuarios');
-        const modalBody = document.getElementById('modalBody');
-        const modalTitle = document.getElementById('modalTitle');
-        
-        console.log('Elementos encontrados:', {
-            modalEl: !!modalEl,
-            modalBody: !!modalBody,
-            modalTitle: !!modalTitle
-        });
-        
-        if (!modalEl || !modalBody || !modalTitle) {
-            console.error('ERRO: Elementos do modal não encontrados!');
-            alert('Erro ao abrir modal. Por favor, recarregue a página.');
-            return;
-        }
-        
-        // Atualizar título
-        modalTitle.textContent = `👥 Usuários da Licença: ${licenca}`;
-        console.log('Título atualizado');
-        
-        // Mostrar loading
-        modalBody.innerHTML = `
-            <div class="text-center p-4">
-                <div class="spinner-border text-primary" role="status">
-                    <span class="visually-hidden">Carregando...</span>
-                </div>
-                <p class="mt-3">Carregando usuários...</p>
-            </div>
-        `;
-        console.log('Loading exibido');
-        
-        // Abrir modal
-        try {
-            const modal = new bootstrap.Modal(modalEl);
-            modal.show();
-            console.log('Modal aberto');
-        } catch(e) {
-            console.error('Erro ao abrir modal:', e);
-        }
-        
-        // Buscar dados
-        const url = `/api/usuarios/${encodeURIComponent(licenca)}`;
-        console.log('URL da API:', url);
-        
-        fetch(url)
-            .then(response => {
-                console.log('=== RESPONSE ===');
-                console.log('Status:', response.status);
-                console.log('OK:', response.ok);
-                console.log('StatusText:', response.statusText);
-                
-                if (!response.ok) {
-                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-                }
-                return response.json();
-            })
-            .then(data => {
-                console.log('=== DADOS RECEBIDOS ===');
-                console.log('Data completo:', data);
-                console.log('Tipo de data:', typeof data);
-                console.log('Data.usuarios existe:', 'usuarios' in data);
-                console.log('Data.usuarios é array:', Array.isArray(data.usuarios));
-                console.log('Quantidade de usuários:', data.usuarios ? data.usuarios.length : 0);
-                
-                if (!data || typeof data !== 'object') {
-                    throw new Error('Resposta inválida da API');
-                }
-                
-                const hasUsers = Array.isArray(data.usuarios) && data.usuarios.length > 0;
-                const usuariosData = hasUsers ? data.usuarios : [];
-                
-                console.log('hasUsers:', hasUsers);
-                console.log('usuariosData length:', usuariosData.length);
-                
-                if (!hasUsers) {
-                    modalBody.innerHTML = `
-                        <div class="alert alert-info">
-                            <strong>Total de usuários: 0</strong><br>
-                            Nenhum usuário encontrado para esta licença.
-                        </div>
-                    `;
-                    return;
-                }
-                
-                // Derivar chips (Empresa, Setor, Estado)
-                const uniq = (arr) => Array.from(new Set(arr.filter(v => v != null && v !== ''))).sort();
-                const empresas = uniq(usuariosData.map(u => u['Empresa']));
-                const setores = uniq(usuariosData.map(u => u['Setor']));
-                const estados = uniq(usuariosData.map(u => u['Estado']));
-                
-                // Estado do filtro e paginação
-                let filtroTexto = '';
-                let filtroEmpresa = null;
-                let filtroSetor = null;
-                let filtroEstado = null;
-                let pagina = 1;
-                const porPagina = 10;
-
-                // Construir HTML
-                let html = `
-                    <div class="d-flex align-items-center justify-content-between mb-3">
-                        <div class="alert alert-info mb-0">
-                            <strong>Total de usuários com esta licença: ${data.total_usuarios}</strong>
-                        </div>
-                        <div class="input-group" style="max-width: 360px;">
-                            <input type="text" id="usuarios-search" class="form-control form-control-sm" placeholder="Pesquisar usuário, email, empresa...">
-                            <button class="btn btn-outline-secondary btn-sm" id="usuarios-clear" type="button">Limpar</button>
-                        </div>
-                    </div>
-                    
-                    <div class="mb-3">
-                        <div class="d-flex flex-wrap gap-2 align-items-center">
-                            <span class="text-muted small me-2">Filtros rápidos:</span>
-                            <div id="chips-empresa" class="d-flex flex-wrap gap-2"></div>
-                            <div id="chips-setor" class="d-flex flex-wrap gap-2"></div>
-                            <div id="chips-estado" class="d-flex flex-wrap gap-2"></div>
-                            <button class="btn btn-sm btn-outline-secondary" id="chips-clear">Limpar filtros</button>
-                        </div>
-                    </div>
-                    <div id="usuariosList"></div>
-                    <div id="usuariosPagination" class="d-flex justify-content-between align-items-center mt-3"></div>
-                `;
-
-                console.log('=== CONSTRUINDO HTML ===');
-                console.log('HTML length:', html.length);
-                
-                modalBody.innerHTML = html;
-                console.log('HTML inserido no modalBody');
-
-                // Filtro + chips + paginação
-                const input = document.getElementById('usuarios-search');
-                const clearBtn = document.getElementById('usuarios-clear');
-                const chipsEmpresa = document.getElementById('chips-empresa');
-                const chipsSetor = document.getElementById('chips-setor');
-                const chipsEstado = document.getElementById('chips-estado');
-                const chipsClear = document.getElementById('chips-clear');
-                const listEl = document.getElementById('usuariosList');
-                const pagerEl = document.getElementById('usuariosPagination');
-
-                const renderChips = (items, container, kind) => {
-                    if (!container) return;
-                    container.innerHTML = items.map(val => `
-                        <button type="button" class="btn btn-sm ${kind}-chip ${kind}-chip-item btn-outline-primary" data-value="${String(val)}">
-                            ${String(val)}
-                        </button>
-                    `).join('');
-                    container.querySelectorAll(`.${kind}-chip-item`).forEach(btn => {
-                        btn.addEventListener('click', () => {
-                            const value = btn.getAttribute('data-value');
-                            if (kind === 'empresa') filtroEmpresa = (filtroEmpresa === value ? null : value);
-                            if (kind === 'setor') filtroSetor = (filtroSetor === value ? null : value);
-                            if (kind === 'estado') filtroEstado = (filtroEstado === value ? null : value);
-                            pagina = 1;
-                            update();
-                        });
-                    });
-                };
-
-                const filtrar = () => {
-                    const termo = (filtroTexto || '').toLowerCase();
-                    return usuariosData.filter(u => {
-                        const texto = [u['Colaborador'], u['Email'], u['Empresa'], u['Setor'], u['Estado'], u['Centro de Custo']]
-                            .map(x => (x || '').toString().toLowerCase()).join(' ');
-                        if (termo && !texto.includes(termo)) return false;
-                        if (filtroEmpresa && u['Empresa'] !== filtroEmpresa) return false;
-                        if (filtroSetor && u['Setor'] !== filtroSetor) return false;
-                        if (filtroEstado && u['Estado'] !== filtroEstado) return false;
-                        return true;
-                    });
-                };
-
-                const renderList = (arr) => {
-                    listEl.innerHTML = arr.map(usuario => {
-                        const fmtNumber = (n)=> Number(n||0).toLocaleString('pt-BR', {minimumFractionDigits:2, maximumFractionDigits:2});
-                        const valorUnitario = usuario['Valor Unitário'] ?? usuario['Valor UnitÃ¡rio'] ?? usuario['ValorUnitario'] ?? 0;
-                        const totalNum = usuario['Total'] ?? usuario['total'] ?? 0;
-                        const valorTotalStr = usuario['Valor Total'] || usuario['ValorTotal'] || (`R$ ${fmtNumber(totalNum)}`);
-                        return `
-                        <div class="user-card">
-                            <div class="row">
-                                <div class="col-md-8">
-                                    <h6 class="mb-1"><strong>${usuario['Colaborador'] || ''}</strong></h6>
-                                    <p class="mb-1 text-muted small">
-                                        📧 ${usuario['Email'] || 'Sem email'}<br>
-                                        🏢 ${usuario['Empresa'] || ''}<br>
-                                        🏭 Setor: ${usuario['Setor'] || ''}<br>
-                                        🗺️ Estado: ${usuario['Estado'] || ''}<br>
-                                        🏦 Centro de Custo: ${usuario['Centro de Custo'] || ''}
-                                    </p>
-                                </div>
-                                <div class="col-md-4 text-end">
-                                    <p class="mb-1"><strong>Criação:</strong> ${usuario['Data de Criação'] || ''}</p>
-                                    <p class="mb-1"><strong>Qtd:</strong> ${usuario['Quantidade'] ?? ''}</p>
-                                    <p class="mb-1"><strong>Valor Unit:</strong> ${usuario['Valor Unitário']? 'R$ ' + Number(valorUnitario).toLocaleString('pt-BR', {minimumFractionDigits:2}): ''}</p>
-                                    <p class="mb-0"><strong>Valor Total:</strong> ${valorTotalStr}</p>
-                                </div>
-                            </div>
-                        </div>`;
-                    }).join('');
-                };
-
-                const renderPager = (total, page, perPage) => {
-                    const totalPages = Math.max(1, Math.ceil(total / perPage));
-                    const prevDisabled = page <= 1 ? 'disabled' : '';
-                    const nextDisabled = page >= totalPages ? 'disabled' : '';
-                    pagerEl.innerHTML = `
-                        <div class="small text-muted">Exibindo página ${page} de ${totalPages} (total ${total} usuários)</div>
-                        <div>
-                            <button class="btn btn-sm btn-outline-secondary me-2" id="usuarios-prev" ${prevDisabled}>Anterior</button>
-                            <button class="btn btn-sm btn-outline-secondary" id="usuarios-next" ${nextDisabled}>Próxima</button>
-                        </div>
-                    `;
-                    const prev = document.getElementById('usuarios-prev');
-                    const next = document.getElementById('usuarios-next');
-                    if (prev) prev.onclick = () => { if (pagina > 1) { pagina--; update(); } };
-                    if (next) next.onclick = () => { pagina++; update(); };
-                };
-
-                const update = () => {
-                    filtroTexto = (input.value || '');
-                    const filtrados = filtrar();
-                    const total = filtrados.length;
-                    const totalPages = Math.max(1, Math.ceil(total / porPagina));
-                    if (pagina > totalPages) pagina = totalPages;
-                    const inicio = (pagina - 1) * porPagina;
-                    const pageArr = filtrados.slice(inicio, inicio + porPagina);
-                    renderList(pageArr);
-                    renderPager(total, pagina, porPagina);
-
-                    // Marcar chips ativos
-                    const toggleActive = (container, kind, current) => {
-                        if (!container) return;
-                                container.querySelectorAll(`.${kind}-chip-item`).forEach(btn => {
-                                    const value = btn.getAttribute('data-value');
-                                    btn.classList.toggle('btn-primary', current === value);
-                                    btn.classList.toggle('btn-outline-primary', current !== value);
-                                });
-                            };
-                            toggleActive(chipsEmpresa, 'empresa', filtroEmpresa);
-                            toggleActive(chipsSetor, 'setor', filtroSetor);
-                            toggleActive(chipsEstado, 'estado', filtroEstado);
-                        };
-
-                        input.addEventListener('input', () => { pagina = 1; update(); });
-                        clearBtn.addEventListener('click', () => { input.value = ''; pagina = 1; update(); input.focus(); });
-                        if (chipsClear) chipsClear.addEventListener('click', () => {
-                            filtroEmpresa = null; filtroSetor = null; filtroEstado = null; pagina = 1; update();
-                        });
-
-                        renderChips(empresas, chipsEmpresa, 'empresa');
-                        renderChips(setores, chipsSetor, 'setor');
-                        renderChips(estados, chipsEstado, 'estado');
-                        console.log('Chips renderizados');
-                        
-                update();
-                console.log('=== FIM mostrarUsuarios (SUCESSO) ===');
-            })
-            .catch(error => {
-                console.error('=== ERRO AO CARREGAR USUÁRIOS ===');
-                console.error('Tipo do erro:', error.constructor.name);
-                console.error('Mensagem:', error.message);
-                console.error('Stack:', error.stack);
-                modalBody.innerHTML = `
-                    <div class="alert alert-danger">
-                        <strong>Erro ao carregar usuários:</strong><br>
-                        ${error.message || 'Por favor, tente novamente.'}
-                    </div>
-                `;
-            });
-    }
-    </script>
-    <script>
-    // Fallback/global handler para abrir a modal de TODOS os usuários ao clicar no KPI
-    (function(){
-        function buildAndRenderTable(usuarios, container, page=1, pageSize=25){
-            if(!Array.isArray(usuarios)) usuarios = [];
-            const keys = Object.keys(usuarios[0] || {});
-            // Ensure 'Valor Total' column exists (prefer server formatted string)
-            if(!keys.includes('Valor Total')) keys.push('Valor Total');
-            const start = (page-1)*pageSize;
-            const pageItems = usuarios.slice(start, start+pageSize);
-
-            let html = '<div class="table-responsive"><table class="table table-sm table-striped"><thead><tr>';
-            for(const k of keys) html += `<th>${k}</th>`;
-            html += '</tr></thead><tbody>';
-            for(const row of pageItems){
-                html += '<tr>';
-                for(const k of keys){ 
-                    let val = row[k]===null||row[k]===undefined? '': row[k];
-                    // prefer formatted server string for Valor Total
-                    if(k === 'Valor Total'){
-                        val = row['Valor Total'] || row['ValorTotal'] || (row['Total'] ? ('R$ ' + Number(row['Total']).toLocaleString('pt-BR', {minimumFractionDigits:2})) : 'R$ 0,00');
-                    }
-                    html += `<td>${val}</td>`;
-                }
-                html += '</tr>';
-            }
-            html += `</tbody></table></div>`;
-
-            const totalPages = Math.max(1, Math.ceil(usuarios.length / pageSize));
-            html += '<nav><ul class="pagination pagination-sm">';
-            for(let p=1;p<=totalPages;p++){
-                html += `<li class="page-item ${p===page?'active':''}"><a href="#" class="page-link" data-page="${p}">${p}</a></li>`;
-            }
-            html += '</ul></nav>';
-
-            container.innerHTML = html;
-            container.querySelectorAll('.page-link').forEach(a=>{
-                a.addEventListener('click', function(e){
-                    e.preventDefault();
-                    const p = parseInt(this.getAttribute('data-page'))||1;
-                    buildAndRenderTable(usuarios, container, p, pageSize);
-                })
-            })
-        }
+# CSS e JS da página ficam em static/ e são servidos com ?v=<hash do conteúdo>:
+# o navegador guarda por um ano e só baixa de novo quando o arquivo muda.
+# Plotly e Bootstrap ficam em static/vendor com o hash no nome do arquivo
+# (python -m engine.assets); sem esse build, a página usa as mesmas versões na CDN.
+# O template (templates/dashboard.html) é compilado uma vez e fica no cache do Jinja.
+STATIC_MAX_AGE = 365 * 24 * 3600
+_static_versions = {}
+
+def static_version(filename):
+    """Hash curto do conteúdo do arquivo estático (recalculado se o arquivo mudar)"""
+    path = os.path.join(app.static_folder, filename)
+    mtime = os.path.getmtime(path)
+    cached = _static_versions.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as fh:
+            cached = (mtime, hashlib.md5(fh.read()).hexdigest()[:12])
+        _static_versions[filename] = cached
+    return cached[1]
+
+def asset_url(name):
+    """URL de uma biblioteca de terceiros (assets.VENDOR_ASSETS): local se houver build, senão a CDN"""
+    entry = assets.load_manifest(app.static_folder).get(name)
+    if entry is None:
+        return assets.VENDOR_ASSETS[name]
+    return url_for('static', filename=entry['arquivo'])
+
+def versioned_vendor_file(filename):
+    # Arquivos do manifest têm o hash do conteúdo no nome
+    return any(entry['arquivo'] == filename for entry in assets.load_manifest(app.static_folder).values())
+
+@app.context_processor
+def static_helpers():
+    return {'static_url': lambda filename: url_for('static', filename=filename, v=static_version(filename)),
+            'asset_url': asset_url}
+
+def send_static(filename):
+    """Arquivos de static/, usando a versão pré-comprimida (.br/.gz) quando o navegador aceita"""
+    found = assets.precompressed(app.static_folder, filename, request.accept_encodings)
+    if found is None:
+        response = app.send_static_file(filename)
+    else:
+        response = send_from_directory(app.static_folder, found[0],
+                                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['Content-Encoding'] = found[1]
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = send_static
+
+@app.after_request
+def cache_static(response):
+    if request.endpoint != 'static' or response.status_code not in (200, 304):
+        return response
+    if request.args.get('v') or versioned_vendor_file(request.view_args.get('filename', '')):
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+# Pontos do template em que o HTML acumulado é enviado ao navegador ({{ flush() }});
+# entre eles os pedaços gerados pelo Jinja são agrupados numa única escrita
+STREAM_FLUSH = Markup('<!-- flush -->')
+
+def stream_page(template_name, **context):
+    """Renderiza o template aos poucos (Jinja generate), enviando o HTML a cada {{ flush() }}"""
+    template = app.jinja_env.get_template(template_name)
+    context['flush'] = lambda: STREAM_FLUSH
+    app.update_template_context(context)
+
+    def generate():
+        buffer = []
+        for chunk in template.generate(context):
+            if chunk == STREAM_FLUSH:
+                yield ''.join(buffer)
+                buffer = []
+            else:
+                buffer.append(chunk)
+        yield ''.join(buffer)
 
-        function openAllUsersModal(){
-            const modalEl = document.getElementById('modalUsuarios');
-            const modalBody = document.getElementById('modalBody');
-            const modalTitle = document.getElementById('modalTitle');
-            if(!modalEl || !modalBody || !modalTitle) return;
-            modalTitle.textContent = '👥 Todos os Usuários';
-            modalBody.innerHTML = '<p>Carregando usuários...</p>';
-            const bs = new bootstrap.Modal(modalEl);
-            bs.show();
-
-            fetch('/api/usuarios').then(r=>{
-                if(!r.ok) throw new Error('HTTP ' + r.status);
-                return r.json();
-            }).then(data=>{
-                const usuarios = (data && data.usuarios) ? data.usuarios : [];
-                if(usuarios.length === 0){
-                    modalBody.innerHTML = '<div class="alert alert-info">Nenhum usuário encontrado.</div>';
-                    return;
-                }
-                buildAndRenderTable(usuarios, modalBody, 1, 25);
-            }).catch(err=>{
-                console.error('Falha ao carregar todos os usuários (global):', err);
-                modalBody.innerHTML = `<div class="alert alert-danger">Erro ao carregar usuários: ${err.message}</div>`;
-            });
-        }
+    # Com perfil de requisição, a página inteira é gerada antes do relatório
+    if g.get('profiler'):
+        return Response(''.join(generate()), mimetype='text/html')
+    return Response(stream_with_context(generate()), mimetype='text/html')
 
-        document.addEventListener('DOMContentLoaded', function(){
-            const kpi = document.getElementById('kpi-total-usuarios');
-            if(kpi){
-                kpi.style.cursor = 'pointer';
-                kpi.addEventListener('click', function(e){
-                    try{ openAllUsersModal(); }catch(ex){ console.error(ex); }
-                });
-            }
-        });
-    })();
-    </script>
-</body>
-</html>
-'''
+def streamed_sections(filters, tenant):
+    """(nome, HTML) de cada seção na ordem da página, montada só quando o template chega nela"""
+    for name in GRAPH_SECTIONS:
+        try:
+            html, _ = create_section(name, filters, tenant)
+        except Exception:
+            # A seção fica com o placeholder e a página a busca em /api/graph/<nome>
+            app.logger.exception('Erro ao montar a seção %s', name)
+            continue
+        yield name, html
 
-@app.route('/')
-def dashboard():
+@tenant_route('/')
+def dashboard(tenant=None):
     # Obter filtros da URL
-    filters = {
-        'empresa': request.args.get('empresa', 'Todas'),
-        'estado': request.args.get('estado', 'Todos'),
-        'setor': request.args.get('setor', 'Todos'),
-        'centro_custo': request.args.get('centro_custo', 'Todos'),
-        'licenca': request.args.get('licenca', 'Todas'),
-        'modalidade': request.args.get('modalidade', 'Todas')
-    }
+    filters = {key: request.args.get(key, todos) for key, todos in DEFAULT_FILTERS.items()}
     
-    # Carregar dados originais para opções de filtro
-    df_original = load_data()
+    # Opções para os filtros (calculadas uma vez por snapshot)
+    snapshot = get_snapshot(tenant)
+    filter_options = snapshot.filter_options()
     
-    # Opções para os filtros
-    filter_options = {
-        'empresas': sorted(df_original['empresa'].dropna().unique()),
-        'estados': sorted(df_original['estado'].dropna().unique()),
-        'setores': sorted(df_original['setor'].dropna().unique()),
-        'centros_custo': sorted(df_original['Centro de Custo'].dropna().unique()),
-        'licencas': sorted(df_original['licenca'].dropna().unique()),
-        'modalidades': sorted(df_original['modalidadeLicenca'].dropna().unique())
-    }
+    source = registry.get(tenant)
+    record_filters(source.slug, filters)
+    tenants = [(s.slug, s.label) for s in registry.sources.values()]
     
-    # Criar gráficos e KPIs
-    kpis, graphs = create_graphs(filters)
-    
-    # Renderizar template
-    return render_template_string(HTML_TEMPLATE, kpis=kpis, graphs=graphs,
-                                  filter_options=filter_options, current_filters=filters,
-                                  update_time=datetime.now().strftime('%d/%m/%Y %H:%M:%S'))
-
-@app.route('/api/usuarios/<licenca>', methods=['GET'])
-def api_usuarios(licenca):
-    """API para retornar usuários de uma licença específica"""
-    df = load_data()
-    licenca_norm = (licenca or '').strip().lower()
-    app.logger.info(f"/api/usuarios chamada para licença: '{licenca}' (norm='{licenca_norm}')")
-    
-    # Filtrar dados pela licença (case-insensitive, ignorando espaços)
-    dados_licenca = df[df['licenca'].astype(str).str.strip().str.lower() == licenca_norm]
-    
-    # Obter lista de usuários
-    usuarios = dados_licenca[['nomeColaborador', 'email', 'empresa', 'setor', 'estado', 'Centro de Custo',
-                               'qtdLicenca', 'valorUnitarioMensal', 'valorTotalLicenca', 'DataCriacaoFormatada']]
+    # Página em streaming: cabeçalho e CSS saem antes dos KPIs serem calculados; depois
+    # do layout, cada gráfico segue assim que fica pronto e a tabela de contratos por último
+    with span('render'):
+        return stream_page('dashboard.html',
+                           kpis=lambda: create_section('kpis', filters, tenant),
+                           secoes=streamed_sections(filters, tenant),
+                           filter_options=filter_options, current_filters=filters,
+                           base_path=base_path(tenant), tenant=source.slug,
+                           tenant_label=source.label, tenants=tenants,
+                           dataset_version=snapshot.version,
+                           update_time=datetime.now().strftime('%d/%m/%Y %H:%M:%S'))
+
+
+@tenant_route('/api/graph/<name>', methods=['GET'])
+def api_graph(name, tenant=None):
+    """Fragmento HTML de uma seção da página (gráfico ou tabela de contratos) para os filtros da URL"""
+    if name not in GRAPH_SECTIONS:
+        abort(404)
+    filters = {key: request.args.get(key, todos) for key, todos in DEFAULT_FILTERS.items()}
+    snapshot = get_snapshot(tenant)
+    html, _ = create_section(name, filters, tenant)
+    response = Response(html, mimetype='text/html')
+    # Revalidação barata: o conteúdo só muda com a versão do dataset, os filtros ou o dia
+    response.set_etag(hashlib.md5(repr((snapshot.version,) + section_key(name, filters)).encode()).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@tenant_route('/api/dashboard', methods=['GET'])
+def api_dashboard(tenant=None):
+    """KPIs e JSON das figuras para os filtros da URL (atualização da página sem recarregar)"""
+    filters = {key: request.args.get(key, todos) for key, todos in DEFAULT_FILTERS.items()}
+    snapshot = get_snapshot(tenant)
+    kpis, _, figures = create_graphs(filters, tenant)
+    # O JSON das figuras já está pronto: entra como texto, sem nova serialização
+    body = '{%s}' % ','.join([
+        f'"versao":{json.dumps(snapshot.version)}',
+        f'"atualizado":{json.dumps(datetime.now().strftime("%d/%m/%Y %H:%M:%S"))}',
+        f'"kpis":{json.dumps(kpis, ensure_ascii=False, default=int)}',
+        '"figuras":{%s}' % ','.join(f'{json.dumps(name)}:{fig}' for name, fig in figures.items())
+    ])
+    return Response(body, mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+
+
+# Server-sent events: avisa as páginas abertas quando a planilha muda (nova versão do dataset)
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = float(os.environ.get('SSE_MAX_SECONDS', 300))
+dataset_feed = VersionFeed()
+
+@registry.add_listener
+def publish_version(slug, snapshot):
+    dataset_feed.publish(slug, snapshot.version)
+
+def sse_message(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+def dataset_event(slug, version):
+    return sse_message('dataset', {'tenant': slug, 'versao': version}, version)
+
+@tenant_route('/api/events', methods=['GET'])
+def api_events(tenant=None):
+    """Fluxo SSE com a versão do dataset; a conexão é encerrada após SSE_MAX_SECONDS (o navegador reconecta)"""
+    source = registry.get(tenant)
+    if source is None:
+        abort(404)
+    slug = source.slug
+    known = request.args.get('versao') or request.headers.get('Last-Event-ID') or dataset_feed.version(slug)
+
+    def stream():
+        version = known
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield 'retry: 5000\n\n'
+        current = dataset_feed.version(slug)
+        while time.monotonic() < deadline:
+            if current is not None and current != version:
+                version = current
+                yield dataset_event(slug, version)
+            else:
+                yield ': ping\n\n'
+            current = dataset_feed.wait(slug, version, min(SSE_HEARTBEAT_SECONDS, deadline - time.monotonic()))
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Colunas retornadas pelas APIs de usuários e seus rótulos na resposta
+USUARIOS_COLUMNS = {
+    'nomeColaborador': 'Colaborador',
+    'email': 'Email',
+    'empresa': 'Empresa',
+    'setor': 'Setor',
+    'estado': 'Estado',
+    'Centro de Custo': 'Centro de Custo',
+    'qtdLicenca': 'Quantidade',
+    'valorUnitarioMensal': 'Valor Unitário',
+    'custoTotal': 'Total',
+    'DataCriacaoFormatada': 'Data de Criação'
+}
+
+def format_brl(v):
+    return f"R$ {v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+def usuarios_records(df, date_format):
+    """Registros de usuários (colunas de exibição) a partir de dados já validados na carga"""
+    with span('aggregate', 'usuarios'):
+        usuarios = df[list(USUARIOS_COLUMNS)].rename(columns=USUARIOS_COLUMNS)
+        
+        # Data formatada (None quando ausente)
+        datas = usuarios['Data de Criação']
+        usuarios['Data de Criação'] = datas.dt.strftime(date_format).where(datas.notna(), None)
+        
+        # Coluna formatada para exibição: Valor Total (string em R$)
+        usuarios['Valor Total'] = usuarios['Total'].map(format_brl)
     
-    # Renomear colunas para o formato desejado na resposta
-    usuarios = usuarios.rename(columns={
-        'nomeColaborador': 'Colaborador',
-        'email': 'Email',
-        'empresa': 'Empresa',
-        'setor': 'Setor',
-        'estado': 'Estado',
-        'Centro de Custo': 'Centro de Custo',
-        'qtdLicenca': 'Quantidade',
-        'valorUnitarioMensal': 'Valor Unitário',
-        'valorTotalLicenca': 'Total',
-        'DataCriacaoFormatada': 'Data de Criação'
-    })
+    with span('serialize', 'usuarios'):
+        return usuarios.to_dict(orient='records')
 
-    # Formatar a data para dd/mm/aaaa para JSON
-    if 'Data de Criação' in usuarios.columns:
-        try:
-            usuarios['Data de Criação'] = usuarios['Data de Criação'].apply(
-                lambda x: x.strftime('%d/%m/%Y') if pd.notna(x) and hasattr(x, 'strftime') else (str(x) if pd.notna(x) else None)
-            )
-        except Exception as _:
-            usuarios['Data de Criação'] = usuarios['Data de Criação'].astype(str)
+def usuarios_json(df, date_format):
+    """Monta o JSON de usuários a partir de dados já validados na carga"""
+    usuarios_list = usuarios_records(df, date_format)
+    response_data = {'total_usuarios': len(usuarios_list), 'usuarios': usuarios_list}
+    return json.dumps(response_data, ensure_ascii=False, allow_nan=False)
+
+def licenca_usuarios_json(snapshot, licenca):
+    """JSON dos usuários de uma licença (case-insensitive), em cache por snapshot"""
+    key = ('usuarios', str(licenca or '').strip().lower())
+    def build():
+        with span('filter'):
+            positions = snapshot.positions('licenca', licenca or '', casefold=True)
+        return usuarios_json(snapshot.df.iloc[positions], '%d/%m/%Y')
+    return snapshot.cached_payload(key, build)
+
+def todos_usuarios_json(snapshot):
+    return snapshot.cached_payload(('usuarios',), lambda: usuarios_json(snapshot.df, '%Y-%m-%dT%H:%M:%S'))
+
+# Paginação no servidor das listas de usuários (?limit=&offset=): o navegador
+# pede só os blocos visíveis; busca e filtros rodam sobre índices do snapshot
+USUARIOS_MAX_LIMIT = 500
+USUARIOS_BUSCA = ['nomeColaborador', 'email', 'empresa', 'setor', 'estado', 'Centro de Custo']
+USUARIOS_FACETAS = {'empresa': ('empresa', 'empresas'), 'setor': ('setor', 'setores'), 'estado': ('estado', 'estados')}
+
+def search_text(snapshot):
+    """Texto de busca (minúsculo) de cada linha, montado uma vez por snapshot"""
+    def build():
+        df = snapshot.df
+        texto = df[USUARIOS_BUSCA[0]].fillna('').astype(str)
+        for column in USUARIOS_BUSCA[1:]:
+            texto = texto + ' ' + df[column].fillna('').astype(str)
+        return texto.str.lower().to_numpy()
+    return snapshot.cached_payload(('busca',), build)
+
+def search_mask(snapshot, termo):
+    """Máscara das linhas que contêm `termo`
+
+    Enquanto o usuário digita, cada termo estende o anterior: a busca parte da
+    máscara do maior prefixo já em cache e só examina as linhas que ele encontrou.
+    """
+    texto = search_text(snapshot)
+
+    def build():
+        candidatas = None
+        for size in range(len(termo) - 1, 0, -1):
+            anterior = snapshot.peek_payload(('busca', termo[:size]))
+            if anterior is not None:
+                candidatas = np.flatnonzero(np.unpackbits(anterior, count=len(texto)))
+                break
+        if candidatas is None:
+            candidatas = np.arange(len(texto))
+        mask = np.zeros(len(texto), dtype=bool)
+        mask[candidatas] = np.fromiter((termo in t for t in texto[candidatas]), bool, len(candidatas))
+        # Guardada compactada (1 bit por linha) no cache de respostas
+        return np.packbits(mask)
+    packed = snapshot.cached_payload(('busca', termo), build)
+    return np.unpackbits(packed, count=len(texto)).view(bool)
+
+def usuarios_positions(snapshot, licenca=None, ordem=None):
+    """Posições dos usuários (de uma licença ou todos); 'recentes' ordena pela data de criação"""
+    def build():
+        if licenca is None:
+            positions = np.arange(len(snapshot.df))
+        else:
+            positions = snapshot.positions('licenca', licenca, casefold=True)
+        if ordem == 'recentes':
+            # Mais recentes primeiro; sem data por último
+            datas = snapshot.df['DataCriacaoFormatada'].to_numpy()[positions]
+            chave = np.where(np.isnat(datas), np.iinfo(np.int64).max, -datas.astype(np.int64))
+            positions = positions[np.argsort(chave, kind='stable')]
+        return positions
+    key = ('usuarios-posicoes', None if licenca is None else str(licenca).strip().lower(), ordem)
+    return snapshot.cached_payload(key, build)
+
+def usuarios_page_json(snapshot, licenca, args):
+    """Página de usuários filtrada (q, empresa, setor, estado), com o total encontrado
+
+    Com campos=email devolve só os e-mails de todos os encontrados (seleção em massa);
+    com facetas=1 inclui os valores de empresa/setor/estado para os filtros rápidos.
+    """
+    base = usuarios_positions(snapshot, licenca, args.get('ordem'))
+    positions = base
+    with span('filter'):
+        for param, (column, _) in USUARIOS_FACETAS.items():
+            if args.get(param):
+                positions = positions[np.isin(positions, snapshot.positions(column, args[param]))]
+        termo = (args.get('q') or '').strip().lower()
+        if termo and len(positions):
+            positions = positions[search_mask(snapshot, termo)[positions]]
+
+    if args.get('campos') == 'email':
+        emails = snapshot.df['email'].to_numpy()[positions]
+        return json.dumps({'total': len(positions), 'emails': [e for e in emails if isinstance(e, str)]},
+                          ensure_ascii=False)
 
-    # Garantir que Total não tenha NaN: usar fallback Valor Unitário * Quantidade quando Total faltar
     try:
-        if 'Total' in usuarios.columns:
-            usuarios['Valor Unitário'] = pd.to_numeric(usuarios['Valor Unitário'], errors='coerce').fillna(0)
-            usuarios['Quantidade'] = pd.to_numeric(usuarios['Quantidade'], errors='coerce').fillna(0)
-            usuarios['Total'] = pd.to_numeric(usuarios['Total'], errors='coerce')
-            # Calcular Total quando estiver NaN
-            mask_nan = pd.isna(usuarios['Total'])
-            usuarios.loc[mask_nan, 'Total'] = usuarios.loc[mask_nan, 'Valor Unitário'] * usuarios.loc[mask_nan, 'Quantidade']
-            # Garantir que Total seja 0 se ainda for NaN
-            usuarios['Total'] = usuarios['Total'].fillna(0)
-    except Exception as e:
-        app.logger.error(f"Erro ao processar Total: {e}")
+        offset = max(0, int(args.get('offset', 0)))
+        limit = min(USUARIOS_MAX_LIMIT, max(0, int(args.get('limit', 50))))
+    except ValueError:
+        offset, limit = 0, 50
+    date_format = '%d/%m/%Y' if licenca is not None else '%Y-%m-%dT%H:%M:%S'
+    pagina = snapshot.df.iloc[positions[offset:offset + limit]]
+    response_data = {
+        'total_usuarios': len(base),
+        'total': len(positions),
+        'offset': offset,
+        'usuarios': usuarios_records(pagina, date_format) if limit else []
+    }
+    if args.get('facetas'):
+        df = snapshot.df
+        response_data['facetas'] = {
+            name: sorted(v for v in pd.unique(df[column].to_numpy()[base]) if isinstance(v, str) and v)
+            for column, name in USUARIOS_FACETAS.values()
+        }
+    return json.dumps(response_data, ensure_ascii=False, allow_nan=False)
 
-    # Substituir TODOS os NaN por 0 em colunas numéricas
-    numeric_cols = ['Valor Unitário', 'Quantidade', 'Total']
-    for col in numeric_cols:
-        if col in usuarios.columns:
-            usuarios[col] = usuarios[col].fillna(0)
-    
-    # Substituir NaN por None em outras colunas
-    usuarios = usuarios.replace({pd.NA: None, np.nan: None})
-    
-    # Converter para dicionário
-    usuarios_dict = usuarios.to_dict(orient='records')
+def paged(args):
+    return 'limit' in args or 'campos' in args
 
-    # Adicionar coluna formatada para exibição: Valor Total (string em R$)
-    try:
-        usuarios['Valor Total'] = usuarios['Total'].apply(lambda v: f"R$ {v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') if v is not None else None)
-    except Exception:
-        # se algo falhar, garantir coluna presente
-        usuarios['Valor Total'] = usuarios['Total'].apply(lambda v: str(v) if v is not None else None)
-
-    # Re-converter dicionário para incluir a nova coluna ordenada no final
-    usuarios_dict = usuarios.to_dict(orient='records')
-    
-    # Limpar qualquer NaN que ainda possa existir (fallback final)
-    usuarios_list = []
-    for user in usuarios_dict:
-        cleaned_user = {}
-        for k, v in user.items():
-            # Usar pd.isna() que é mais robusto
-            if pd.isna(v):
-                cleaned_user[k] = 0 if k in numeric_cols else None
-            else:
-                cleaned_user[k] = v
-        usuarios_list.append(cleaned_user)
-    
-    # DEBUG: Verificar quantos NaNs ainda existem
-    nan_count = sum(1 for user in usuarios_list for v in user.values() if pd.isna(v))
-    app.logger.info(f"DEBUG: {nan_count} valores NaN encontrados após limpeza")
-    
-    # Log para debug
-    app.logger.info(f"Retornando {len(usuarios_list)} usuários para licença '{licenca}'")
+@tenant_route('/api/usuarios/<licenca>', methods=['GET'])
+def api_usuarios(licenca, tenant=None):
+    """API para retornar usuários de uma licença específica"""
+    snapshot = get_snapshot(tenant)
+    if paged(request.args):
+        return Response(usuarios_page_json(snapshot, licenca, request.args), mimetype='application/json')
     
-    # Contar total de usuários
-    total_usuarios = len(usuarios_list)
-
-    # Retornar usando Response com JSON manual para evitar NaN
-    response_data = {'total_usuarios': total_usuarios, 'usuarios': usuarios_list}
-    return Response(
-        json.dumps(response_data, ensure_ascii=False, allow_nan=False),
-        mimetype='application/json'
-    )
+    # Filtrar dados pela licença (case-insensitive, ignorando espaços) via índice
+    return Response(licenca_usuarios_json(snapshot, licenca), mimetype='application/json')
 
 
-@app.route('/api/usuarios', methods=['GET'])
-def api_usuarios_all():
+@tenant_route('/api/usuarios', methods=['GET'])
+def api_usuarios_all(tenant=None):
     """Retorna todos os usuários (sem filtro de licença)"""
-    df = load_data()
-    # Selecionar colunas relevantes (mesmas usadas no endpoint por licença)
-    usuarios = df[['nomeColaborador', 'email', 'empresa', 'setor', 'estado', 'Centro de Custo',
-                   'qtdLicenca', 'valorUnitarioMensal', 'valorTotalLicenca', 'DataCriacaoFormatada']].copy()
-
-    usuarios = usuarios.rename(columns={
-        'nomeColaborador': 'Colaborador',
-        'email': 'Email',
-        'empresa': 'Empresa',
-        'setor': 'Setor',
-        'estado': 'Estado',
-        'Centro de Custo': 'Centro de Custo',
-        'qtdLicenca': 'Quantidade',
-        'valorUnitarioMensal': 'Valor Unitário',
-        'valorTotalLicenca': 'Total',
-        'DataCriacaoFormatada': 'Data de Criação'
+    snapshot = get_snapshot(tenant)
+    if paged(request.args):
+        return Response(usuarios_page_json(snapshot, None, request.args), mimetype='application/json')
+    return Response(todos_usuarios_json(snapshot), mimetype='application/json')
+
+
+@tenant_route('/api/dataset/quality', methods=['GET'])
+def api_dataset_quality(tenant=None):
+    """Relatório de qualidade da validação feita na carga (linhas rejeitadas e avisos)"""
+    snapshot = get_snapshot(tenant)
+    return jsonify({
+        'versao': snapshot.version,
+        'carregado_em': datetime.fromtimestamp(snapshot.loaded_at).strftime('%d/%m/%Y %H:%M:%S'),
+        **(snapshot.quality or {})
     })
 
-    # Normalizar e limpar
-    try:
-        usuarios['Valor Unitário'] = pd.to_numeric(usuarios['Valor Unitário'], errors='coerce').fillna(0)
-        usuarios['Quantidade'] = pd.to_numeric(usuarios['Quantidade'], errors='coerce').fillna(0)
-        usuarios['Total'] = pd.to_numeric(usuarios['Total'], errors='coerce')
-        mask_nan = pd.isna(usuarios['Total'])
-        usuarios.loc[mask_nan, 'Total'] = usuarios.loc[mask_nan, 'Valor Unitário'] * usuarios.loc[mask_nan, 'Quantidade']
-        usuarios['Total'] = usuarios['Total'].fillna(0)
-    except Exception as e:
-        app.logger.error(f"Erro ao processar Totais (all): {e}")
-
-    # Substituir NaN por None e preparar para JSON
-    usuarios = usuarios.replace({pd.NA: None, np.nan: None})
-
-    # Converter objetos datetime/timestamp para strings ISO para garantir serialização JSON
-    if 'Data de Criação' in usuarios.columns:
-        try:
-            usuarios['Data de Criação'] = usuarios['Data de Criação'].apply(
-                lambda x: x.isoformat() if hasattr(x, 'isoformat') else (str(x) if x is not None else None)
-            )
-        except Exception:
-            # Fallback mais simples
-            usuarios['Data de Criação'] = usuarios['Data de Criação'].astype(str).replace('NaT', None)
-
-    usuarios_dict = usuarios.to_dict(orient='records')
-
-    # Limpeza final
-    usuarios_list = []
-    for user in usuarios_dict:
-        cleaned = {}
-        for k, v in user.items():
-            if v != v:
-                cleaned[k] = 0 if k in ['Quantidade', 'Total', 'Valor Unitário'] else None
-            else:
-                cleaned[k] = v
-        usuarios_list.append(cleaned)
-
-    # Adicionar campo formatado 'Valor Total' (string) em cada usuário para exibição
-    for u in usuarios_list:
-        try:
-            tot = u.get('Total')
-            if tot is None:
-                u['Valor Total'] = None
-            else:
-                u['Valor Total'] = f"R$ {float(tot):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        except Exception:
-            u['Valor Total'] = str(u.get('Total')) if u.get('Total') is not None else None
-
-    response_data = {'total_usuarios': len(usuarios_list), 'usuarios': usuarios_list}
-    return Response(json.dumps(response_data, ensure_ascii=False, allow_nan=False), mimetype='application/json')
-
 
-@app.route('/api/rateio_contrato', methods=['GET'])
-def api_rateio_contrato():
-    """Gera o rateio por contrato (empresa + licença + modalidade) por Centro de Custo e exporta CSV."""
-    empresa = request.args.get('empresa')
-    licenca = request.args.get('licenca')
-    modalidade = request.args.get('modalidade')
-    if not empresa or not licenca:
-        return jsonify({'error': 'Parâmetros obrigatórios ausentes: empresa e licenca'}), 400
-
-    df = load_data()
-    # Filtro por contrato (empresa + licenca [+ modalidade quando fornecida])
-    mask = (
-        (df['empresa'].astype(str) == str(empresa)) &
-        (df['licenca'].astype(str) == str(licenca))
-    )
+# Dataset em formato binário colunar (engine.columnar) para os dashboards HTML
+# standalone: o navegador carrega direto em typed arrays, sem baixar nem ler o .xlsx.
+# A URL leva a versão do snapshot e fica em cache por um ano; /api/dataset redireciona
+# para a versão atual. As páginas abertas do disco (file://) buscam de outra origem.
+# O dataset não tem autenticação: por padrão só a mesma origem lê. DATASET_ALLOW_ORIGIN
+# lista as origens liberadas (separadas por vírgula); 'null' libera as páginas abertas
+# do disco (file://) e '*' qualquer site.
+DATASET_ALLOW_ORIGIN = [origin.strip() for origin in os.environ.get('DATASET_ALLOW_ORIGIN', '').split(',')
+                        if origin.strip()]
+# Nome e e-mail ficam de fora: são dados pessoais e, com um valor por linha, o
+# dicionário só os levaria para o cabeçalho
+DATASET_COLUMNS = {
+    'empresa': ('empresa', 'texto'),
+    'setor': ('setor', 'texto'),
+    'centroCusto': ('Centro de Custo', 'texto'),
+    'estado': ('estado', 'texto'),
+    'licenca': ('licenca', 'texto'),
+    'modalidade': ('modalidadeLicenca', 'texto'),
+    'faturador': ('faturador', 'texto'),
+    'quantidade': ('qtdLicenca', 'numero'),
+    'total': ('custoTotal', 'numero')
+}
+
+def dataset_bundle(snapshot):
+    """Pacote binário do snapshot e sua versão gzip (montados uma vez por versão)"""
+    def build():
+        with span('serialize', 'dataset'):
+            raw = columnar.encode(snapshot.df, DATASET_COLUMNS, {'versao': snapshot.version})
+            return raw, gzip.compress(raw, 6)
+    return snapshot.cached_payload(('dataset-bin',), build)
+
+def dataset_cors(response):
+    response.vary.add('Origin')
+    if '*' in DATASET_ALLOW_ORIGIN:
+        response.headers['Access-Control-Allow-Origin'] = '*'
+    elif request.headers.get('Origin') in DATASET_ALLOW_ORIGIN:
+        response.headers['Access-Control-Allow-Origin'] = request.headers['Origin']
+    return response
+
+@tenant_route('/api/dataset', methods=['GET'])
+def api_dataset(tenant=None):
+    """Redireciona para o pacote binário da versão atual do dataset"""
+    snapshot = get_snapshot(tenant)
+    response = redirect(f"{base_path(tenant)}/api/dataset/{snapshot.version}.bin")
+    response.cache_control.no_cache = True
+    return dataset_cors(response)
+
+@tenant_route('/api/dataset/<versao>.bin', methods=['GET'])
+def api_dataset_bin(versao, tenant=None):
+    """Pacote binário colunar de uma versão do dataset (imutável; versões antigas redirecionam)"""
+    snapshot = get_snapshot(tenant)
+    if versao != snapshot.version:
+        return api_dataset(tenant)
+    raw, compressed = dataset_bundle(snapshot)
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = Response(compressed if use_gzip else raw, mimetype='application/octet-stream')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Access-Control-Expose-Headers'] = 'Content-Length'
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_MAX_AGE
+    response.cache_control.immutable = True
+    response.set_etag(versao + ('-gz' if use_gzip else ''))
+    return dataset_cors(response.make_conditional(request))
+
+
+# Colunas do CSV de rateio
+RATEIO_COLUMNS = ['empresa', 'licenca', 'qtd (por centro de custo)', 'centro_custo',
+                  'valor por centro de custo', '% por centro de custo']
+
+def contract_positions(snapshot, empresa, licenca, modalidade=None):
+    """Posições das linhas de um contrato (empresa + licença [+ modalidade]) via índices"""
+    positions = np.intersect1d(snapshot.positions('empresa', empresa), snapshot.positions('licenca', licenca),
+                               assume_unique=True)
     if modalidade:
-        mask &= (df['modalidadeLicenca'].astype(str) == str(modalidade))
+        positions = np.intersect1d(positions, snapshot.positions('modalidadeLicenca', modalidade),
+                                   assume_unique=True)
+    return positions
 
-    dados = df[mask].copy()
-    if dados.empty:
-        return jsonify({'error': 'Nenhum dado encontrado para o contrato informado.'}), 404
+def rateio_table(dados, empresa_label, licenca_label):
+    """Rateio por Centro de Custo (valores numéricos), ordenado pelo valor
 
-    # Cálculos por Centro de Custo
-    # - Quantidade por Centro de Custo: soma de qtdLicenca
-    # - Valor por Centro de Custo: soma de valorTotalLicenca
-    # - % por Centro de Custo: (valor_cc / valor_total_contrato) * 100
-    dados['qtdLicenca'] = pd.to_numeric(dados['qtdLicenca'], errors='coerce')
-    dados['valorTotalLicenca'] = pd.to_numeric(dados['valorTotalLicenca'], errors='coerce')
+    - Quantidade por Centro de Custo: soma de qtdLicenca
+    - Valor por Centro de Custo: soma de custoTotal
+    - % por Centro de Custo: (valor_cc / valor_total) * 100
+    """
     grp = dados.groupby('Centro de Custo', dropna=False).agg({
         'qtdLicenca': 'sum',
-        'valorTotalLicenca': 'sum'
+        'custoTotal': 'sum'
     }).reset_index().rename(columns={
         'Centro de Custo': 'centro_custo',
-        'qtdLicenca': 'qtd_cc',
-        'valorTotalLicenca': 'valor_cc'
+        'qtdLicenca': 'qtd (por centro de custo)',
+        'custoTotal': 'valor por centro de custo'
     })
 
-    valor_total = grp['valor_cc'].sum()
+    valor_total = grp['valor por centro de custo'].sum()
     # Evitar divisão por zero
-    grp['perc_cc'] = grp['valor_cc'].apply(lambda v: (float(v) / float(valor_total) * 100) if pd.notna(v) and valor_total not in [0, None] else 0.0)
-
-    # Montar DataFrame final com colunas solicitadas
-    out = grp.copy()
-    out.insert(0, 'licenca', str(licenca))
-    out.insert(0, 'empresa', str(empresa))
-    # Renomear para os rótulos finais em PT-BR
-    out = out.rename(columns={
-        'qtd_cc': 'qtd (por centro de custo)',
-        'valor_cc': 'valor por centro de custo',
-        'perc_cc': '% por centro de custo'
-    })
-
-    # Ordenar por valor decrescente
-    out = out.sort_values('valor por centro de custo', ascending=False)
-
-    # Formatação: números com separador decimal "," e separador de milhar "." na exportação CSV
-    def fmt_val(v):
-        try:
-            return (f"{float(v):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-        except Exception:
-            return ''
-
-    out_fmt = out.copy()
-    out_fmt['valor por centro de custo'] = out_fmt['valor por centro de custo'].apply(fmt_val)
-    out_fmt['% por centro de custo'] = out_fmt['% por centro de custo'].apply(lambda x: f"{float(x):.2f}".replace('.', ',') if pd.notna(x) else '')
-
-    # Gerar CSV com separador ;
-    csv_lines = []
-    columns = ['empresa', 'licenca', 'qtd (por centro de custo)', 'centro_custo', 'valor por centro de custo', '% por centro de custo']
-    csv_lines.append(';'.join(columns))
-    for _, row in out_fmt.iterrows():
-        vals = [
-            str(row.get('empresa', '')),
-            str(row.get('licenca', '')),
-            str(int(row.get('qtd (por centro de custo)', 0))) if pd.notna(row.get('qtd (por centro de custo)')) else '0',
-            str(row.get('centro_custo', '')),
-            str(row.get('valor por centro de custo', '')),
-            str(row.get('% por centro de custo', ''))
-        ]
-        csv_lines.append(';'.join(vals))
-
-    csv_data = '\n'.join(csv_lines)
-    # Nome de arquivo amigável
-    file_name = f"rateio_{re.sub(r'[^a-zA-Z0-9_-]+', '_', str(empresa))}_{re.sub(r'[^a-zA-Z0-9_-]+', '_', str(licenca))}"
+    grp['% por centro de custo'] = grp['valor por centro de custo'] / valor_total * 100 if valor_total else 0.0
+    grp.insert(0, 'licenca', licenca_label)
+    grp.insert(0, 'empresa', empresa_label)
+    return grp.sort_values('valor por centro de custo', ascending=False)[RATEIO_COLUMNS]
+
+def rateio_csv(out):
+    """CSV com separador ';' e números no formato brasileiro"""
+    csv_lines = [';'.join(RATEIO_COLUMNS)]
+    for empresa, licenca, qtd, centro, valor, perc in out.itertuples(index=False, name=None):
+        csv_lines.append(';'.join([
+            str(empresa),
+            str(licenca),
+            str(int(qtd)) if pd.notna(qtd) else '0',
+            str(centro),
+            f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') if pd.notna(valor) else '',
+            f"{perc:.2f}".replace('.', ',') if pd.notna(perc) else ''
+        ]))
+    return '\n'.join(csv_lines)
+
+def safe_name(text):
+    return re.sub(r'[^a-zA-Z0-9_-]+', '_', str(text))
+
+def rateio_file_name(empresa, licenca, modalidade=None):
+    file_name = f"rateio_{safe_name(empresa)}_{safe_name(licenca)}"
     if modalidade:
-        file_name += f"_{re.sub(r'[^a-zA-Z0-9_-]+', '_', str(modalidade))}"
-    file_name += '.csv'
-
+        file_name += f"_{safe_name(modalidade)}"
+    return file_name
+
+def contract_rateio(snapshot, empresa, licenca, modalidade=None):
+    """(CSV, nome do arquivo) do rateio de um contrato, em cache por snapshot; None se vazio"""
+    def build():
+        positions = contract_positions(snapshot, empresa, licenca, modalidade)
+        if len(positions) == 0:
+            return None
+        out = rateio_table(snapshot.df.iloc[positions], str(empresa), str(licenca))
+        return rateio_csv(out), rateio_file_name(empresa, licenca, modalidade) + '.csv'
+    return snapshot.cached_payload(('rateio', empresa, licenca, modalidade or ''), build)
+
+def csv_response(csv_data, file_name):
     headers = {
         'Content-Disposition': f'attachment; filename="{file_name}"',
         'Content-Type': 'text/csv; charset=utf-8'
@@ -2235,103 +1323,312 @@ def api_rateio_contrato():
     return Response(csv_data, headers=headers)
 
 
-@app.route('/api/rateio_contratos', methods=['POST'])
-def api_rateio_contratos():
-    """Gera rateio consolidado para múltiplos contratos selecionados e exporta CSV."""
+# Exportação XLSX: números de verdade (com formato) em vez de texto formatado
+RATEIO_FORMATS = {
+    'qtd (por centro de custo)': xlsx.INTEGER,
+    'valor por centro de custo': xlsx.BRL,
+    '% por centro de custo': xlsx.PERCENT
+}
+
+# Linhas de cada contrato na aba de detalhe
+DETALHE_COLUMNS = {
+    'empresa': 'Empresa',
+    'licenca': 'Licença',
+    'modalidadeLicenca': 'Modalidade',
+    'nomeColaborador': 'Colaborador',
+    'email': 'Email',
+    'Centro de Custo': 'Centro de Custo',
+    'qtdLicenca': 'Quantidade',
+    'custoMensal': 'Custo Mensal',
+    'custoTotal': 'Valor',
+    'finalContrato': 'Final do Contrato'
+}
+DETALHE_FORMATS = {'Quantidade': xlsx.INTEGER, 'Custo Mensal': xlsx.BRL, 'Valor': xlsx.BRL,
+                   'Final do Contrato': xlsx.DATE}
+
+def export_format(payload=None):
+    """Formato pedido (?format= ou "format" no JSON): 'csv' (padrão), 'xlsx' ou None se inválido"""
+    fmt = request.args.get('format')
+    if fmt is None and isinstance(payload, dict):
+        fmt = payload.get('format')
+    fmt = str(fmt or 'csv').lower()
+    return fmt if fmt in ('csv', 'xlsx') else None
+
+def rateio_sheet(title, out):
+    return title, RATEIO_COLUMNS, out.itertuples(index=False, name=None), RATEIO_FORMATS
+
+def detail_sheet(title, dados):
+    rows = dados[list(DETALHE_COLUMNS)].itertuples(index=False, name=None)
+    return title, list(DETALHE_COLUMNS.values()), rows, DETALHE_FORMATS
+
+def xlsx_response(build, file_name):
+    """Gera o XLSX num arquivo temporário (não na memória) e o envia em blocos"""
+    tmp = tempfile.TemporaryFile()
+    try:
+        build(tmp)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return send_file(tmp, mimetype=xlsx.MIMETYPE, as_attachment=True, download_name=file_name, max_age=0)
+
+
+@tenant_route('/api/rateio_contrato', methods=['GET'])
+def api_rateio_contrato(tenant=None):
+    """Gera o rateio por contrato (empresa + licença + modalidade) por Centro de Custo e exporta CSV ou XLSX."""
+    empresa = request.args.get('empresa')
+    licenca = request.args.get('licenca')
+    modalidade = request.args.get('modalidade')
+    fmt = export_format()
+    if not empresa or not licenca:
+        return jsonify({'error': 'Parâmetros obrigatórios ausentes: empresa e licenca'}), 400
+    if fmt is None:
+        return jsonify({'error': 'Formato inválido (use csv ou xlsx)'}), 400
+
+    snapshot = get_snapshot(tenant)
+    if fmt == 'xlsx':
+        positions = contract_positions(snapshot, empresa, licenca, modalidade)
+        if len(positions) == 0:
+            return jsonify({'error': 'Nenhum dado encontrado para o contrato informado.'}), 404
+        dados = snapshot.df.iloc[positions]
+
+        def build(fh):
+            xlsx.write_workbook(fh, [
+                rateio_sheet('Rateio', rateio_table(dados, str(empresa), str(licenca))),
+                detail_sheet('Detalhe', dados)
+            ])
+        return xlsx_response(build, rateio_file_name(empresa, licenca, modalidade) + '.xlsx')
+
+    result = contract_rateio(snapshot, empresa, licenca, modalidade)
+    if result is None:
+        return jsonify({'error': 'Nenhum dado encontrado para o contrato informado.'}), 404
+    return csv_response(*result)
+
+
+@tenant_route('/api/rateio_contratos', methods=['POST'])
+def api_rateio_contratos(tenant=None):
+    """Gera rateio consolidado para múltiplos contratos selecionados e exporta CSV ou XLSX."""
     data = request.get_json(silent=True)
     if not data or 'contracts' not in data or not isinstance(data['contracts'], list) or len(data['contracts']) == 0:
         return jsonify({'error': 'Nenhum contrato informado'}), 400
+    fmt = export_format(data)
+    if fmt is None:
+        return jsonify({'error': 'Formato inválido (use csv ou xlsx)'}), 400
 
     contratos = data['contracts']
-    df = load_data()
+    snapshot = get_snapshot(tenant)
 
-    # Construir máscara que combine qualquer um dos contratos fornecidos
-    masks = []
+    # Linhas de cada contrato fornecido (sem repetir contratos) e a união de todas
+    per_contract = {}
     for c in contratos:
-        emp = str(c.get('empresa', '')).strip()
-        lic = str(c.get('licenca', '')).strip()
-        mod = str(c.get('modalidade', '')).strip()
-        m = (df['empresa'].astype(str) == emp) & (df['licenca'].astype(str) == lic)
-        if mod:
-            m &= (df['modalidadeLicenca'].astype(str) == mod)
-        masks.append(m)
-
-    if len(masks) == 0:
-        return jsonify({'error': 'Nenhum contrato válido fornecido.'}), 400
-
-    # Combinar máscaras usando OR
-    import functools, operator
-    mask_total = functools.reduce(operator.or_, masks)
-    dados = df[mask_total].copy()
-
-    if dados.empty:
+        key = tuple(str(c.get(k, '')).strip() for k in ('empresa', 'licenca', 'modalidade'))
+        if key not in per_contract:
+            per_contract[key] = contract_positions(snapshot, *key)
+    positions = np.unique(np.concatenate(list(per_contract.values())))
+    if len(positions) == 0:
         return jsonify({'error': 'Nenhum dado encontrado para os contratos selecionados.'}), 404
 
-    # Agrupar por Centro de Custo
-    dados['qtdLicenca'] = pd.to_numeric(dados['qtdLicenca'], errors='coerce').fillna(0)
-    dados['valorTotalLicenca'] = pd.to_numeric(dados['valorTotalLicenca'], errors='coerce').fillna(0)
-    grp = dados.groupby('Centro de Custo', dropna=False).agg({
-        'qtdLicenca': 'sum',
-        'valorTotalLicenca': 'sum'
-    }).reset_index().rename(columns={
-        'Centro de Custo': 'centro_custo',
-        'qtdLicenca': 'qtd_cc',
-        'valorTotalLicenca': 'valor_cc'
-    })
-
-    valor_total = grp['valor_cc'].sum()
-    grp['perc_cc'] = grp['valor_cc'].apply(lambda v: (float(v) / float(valor_total) * 100) if valor_total not in [0, None] else 0.0)
-
-    # Montar saída
-    out = grp.copy()
-    empresas_sel = sorted(list(set([c.get('empresa','') for c in contratos])))
-    licencas_sel = sorted(list(set([c.get('licenca','') for c in contratos])))
-    empresas_label = '|'.join(empresas_sel)
-    licencas_label = '|'.join(licencas_sel)
-    out.insert(0, 'licenca', licencas_label)
-    out.insert(0, 'empresa', empresas_label)
-
-    out = out.rename(columns={
-        'qtd_cc': 'qtd (por centro de custo)',
-        'valor_cc': 'valor por centro de custo',
-        'perc_cc': '% por centro de custo'
-    })
-
-    out = out.sort_values('valor por centro de custo', ascending=False)
-
-    # Formatação
-    def fmt_val(v):
-        try:
-            return (f"{float(v):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-        except Exception:
-            return ''
-
-    out_fmt = out.copy()
-    out_fmt['valor por centro de custo'] = out_fmt['valor por centro de custo'].apply(fmt_val)
-    out_fmt['% por centro de custo'] = out_fmt['% por centro de custo'].apply(lambda x: f"{float(x):.2f}".replace('.', ',') if pd.notna(x) else '')
-
-    columns = ['empresa', 'licenca', 'qtd (por centro de custo)', 'centro_custo', 'valor por centro de custo', '% por centro de custo']
-    csv_lines = [';'.join(columns)]
-    for _, row in out_fmt.iterrows():
-        vals = [
-            str(row.get('empresa', '')),
-            str(row.get('licenca', '')),
-            str(int(row.get('qtd (por centro de custo)', 0))) if pd.notna(row.get('qtd (por centro de custo)')) else '0',
-            str(row.get('centro_custo', '')),
-            str(row.get('valor por centro de custo', '')),
-            str(row.get('% por centro de custo', ''))
-        ]
-        csv_lines.append(';'.join(vals))
-
-    csv_data = '\n'.join(csv_lines)
-    file_name = 'rateio_consolidado.csv'
-
-    headers = {
-        'Content-Disposition': f'attachment; filename="{file_name}"',
-        'Content-Type': 'text/csv; charset=utf-8'
-    }
-    return Response(csv_data, headers=headers)
+    empresas_label = '|'.join(sorted(set(c.get('empresa', '') for c in contratos)))
+    licencas_label = '|'.join(sorted(set(c.get('licenca', '') for c in contratos)))
+
+    def build_csv():
+        return rateio_csv(rateio_table(snapshot.df.iloc[positions], empresas_label, licencas_label))
+
+    def build_xlsx(fh):
+        # Consolidado, uma aba de rateio por contrato e o detalhe das linhas
+        dados = snapshot.df.iloc[positions]
+        sheets = [rateio_sheet('Consolidado', rateio_table(dados, empresas_label, licencas_label))]
+        for (empresa, licenca, modalidade), pos in per_contract.items():
+            if len(pos):
+                title = ' - '.join(v for v in (empresa, licenca, modalidade) if v)
+                sheets.append(rateio_sheet(title, rateio_table(snapshot.df.iloc[pos], empresa, licenca)))
+        sheets.append(detail_sheet('Detalhe', dados))
+        xlsx.write_workbook(fh, sheets)
+
+    file_name = 'rateio_consolidado.' + fmt
+    # Seleções grandes (ou ?async=1) viram exportação em segundo plano
+    if wants_async(data, len(positions)):
+        if fmt == 'xlsx':
+            return submit_export(tenant, 'rateio_contratos', file_name, xlsx.MIMETYPE, build_xlsx)
+        return submit_export(tenant, 'rateio_contratos', file_name, 'text/csv; charset=utf-8',
+                             lambda fh: fh.write(build_csv().encode('utf-8')))
+    if fmt == 'xlsx':
+        return xlsx_response(build_xlsx, file_name)
+    return csv_response(build_csv(), file_name)
+
+
+# Exportações em segundo plano: o POST devolve 202 com a tarefa, o cliente
+# consulta /api/jobs/<id> e baixa o resultado em /api/jobs/<id>/download
+EXPORT_ASYNC_ROWS = int(os.environ.get('EXPORT_ASYNC_ROWS', 20000))
+jobs = JobQueue(
+    os.environ.get('EXPORT_RESULTS_DIR') or None,
+    max_workers=int(os.environ.get('EXPORT_WORKERS', 2)),
+    ttl=float(os.environ.get('EXPORT_TTL_SECONDS', 3600))
+)
+
+def wants_async(payload, rows):
+    """Exportação em segundo plano: pedida explicitamente (async) ou acima de EXPORT_ASYNC_ROWS linhas"""
+    mode = request.args.get('async')
+    if mode is None and isinstance(payload, dict):
+        mode = payload.get('async')
+    if mode is not None:
+        return str(mode).lower() in ('1', 'true', 'sim')
+    return rows >= EXPORT_ASYNC_ROWS
+
+def job_json(job, prefix=''):
+    """Situação da tarefa com as URLs de acompanhamento e download (prefix: raiz do app + /t/<tenant>)"""
+    info = job.to_dict()
+    info['status_url'] = f'{prefix}/api/jobs/{job.id}'
+    if job.status == 'concluido':
+        info['download_url'] = f'{prefix}/api/jobs/{job.id}/download'
+    return info
+
+def submit_export(tenant, kind, file_name, mimetype, build):
+    """Enfileira a exportação e responde 202 com a URL de acompanhamento"""
+    try:
+        job = jobs.submit(kind, registry.get(tenant).slug, file_name, mimetype, build)
+    except QueueFull:
+        return jsonify({'error': 'Muitas exportações em andamento, tente novamente em instantes.'}), 503
+    info = job_json(job, request.script_root + base_path(tenant))
+    return jsonify(info), 202, {'Location': info['status_url']}
+
+def find_job(job_id, tenant=None):
+    job = jobs.get(job_id)
+    source = registry.get(tenant)
+    if job is None or source is None or job.slug != source.slug:
+        abort(404)
+    return job
+
+@tenant_route('/api/jobs/<job_id>', methods=['GET'])
+def api_job(job_id, tenant=None):
+    """Situação de uma exportação em segundo plano"""
+    return jsonify(job_json(find_job(job_id, tenant), request.script_root + base_path(tenant)))
+
+@tenant_route('/api/jobs/<job_id>/download', methods=['GET'])
+def api_job_download(job_id, tenant=None):
+    """Baixa o resultado de uma exportação concluída"""
+    job = find_job(job_id, tenant)
+    if job.status != 'concluido':
+        return jsonify({'error': 'Exportação ainda não concluída.', 'status': job.status}), 409
+    response = send_file(job.path, mimetype=job.mimetype, as_attachment=True,
+                         download_name=job.file_name, max_age=0)
+    response.headers['X-Filename'] = job.file_name
+    return response
+
+
+# Pré-cálculo em segundo plano a cada nova versão do dataset: página inicial,
+# combinações de filtros mais pedidas, usuários por licença e rateio por contrato
+WARMUP_TOP_N = int(os.environ.get('WARMUP_TOP_N', 20))
+# Rateios pré-calculados: os contratos de maior valor
+WARMUP_RATEIO_TOP_N = int(os.environ.get('WARMUP_RATEIO_TOP_N', 50))
+WARMUP_POLL_SECONDS = float(os.environ.get('WARMUP_POLL_SECONDS', 30))
+warmup = WarmupScheduler(int(os.environ.get('WARMUP_WORKERS', 2)), context=app.app_context)
+
+# Combinações de filtros pedidas por tenant (as mais populares são pré-calculadas)
+popular_filters = {}
+POPULAR_FILTERS_MAX = 1000
+
+def record_filters(slug, filters):
+    combo = tuple(sorted((k, v) for k, v in filters.items() if v != DEFAULT_FILTERS[k]))
+    if not combo:
+        return
+    counter = popular_filters.setdefault(slug, Counter())
+    counter[combo] += 1
+    if len(counter) > POPULAR_FILTERS_MAX:
+        popular_filters[slug] = Counter(dict(counter.most_common(POPULAR_FILTERS_MAX // 2)))
+
+def warmup_jobs(slug, snapshot):
+    """Tarefas (prioridade, tipo, nome, função) de pré-cálculo de um snapshot"""
+    df = snapshot.df
+    tarefas = [(0, 'dashboard', 'inicial', lambda: cached_graphs(snapshot, DEFAULT_FILTERS))]
+
+    # Combinações mais pedidas; sem histórico, as maiores empresas e licenças
+    combos = [dict(c) for c, _ in popular_filters.get(slug, Counter()).most_common(WARMUP_TOP_N)]
+    prioridade = 1
+    if not combos:
+        prioridade = 4
+        for key in ('empresa', 'licenca'):
+            column = FILTER_COLUMNS[key][0]
+            combos += [{key: v} for v in df[column].value_counts().index[:WARMUP_TOP_N // 2]]
+    for combo in combos:
+        filters = dict(DEFAULT_FILTERS, **combo)
+        tarefas.append((prioridade, 'dashboard', json.dumps(combo, ensure_ascii=False),
+                     lambda filters=filters: cached_graphs(snapshot, filters)))
+
+    for licenca in snapshot.filter_options()['licencas']:
+        tarefas.append((2, 'usuarios', licenca, lambda licenca=licenca: licenca_usuarios_json(snapshot, licenca)))
+    tarefas.append((2, 'usuarios', 'todos', lambda: todos_usuarios_json(snapshot)))
+    tarefas.append((3, 'dataset', 'binario', lambda: dataset_bundle(snapshot)))
+    # Texto de busca e ordem por data das listas paginadas
+    tarefas.append((2, 'usuarios', 'busca', lambda: (search_text(snapshot), usuarios_positions(snapshot, None, 'recentes'))))
+
+    tarefas.append((2, 'dash', 'visao', lambda: view(snapshot, DASH_VIEW)))
+
+    contratos = (df.dropna(subset=['empresa', 'licenca', 'modalidadeLicenca'])
+                 .groupby(['empresa', 'licenca', 'modalidadeLicenca'], sort=False)['custoTotal'].sum()
+                 .nlargest(WARMUP_RATEIO_TOP_N))
+    for empresa, licenca, modalidade in contratos.index:
+        tarefas.append((3, 'rateio', f'{empresa} / {licenca} / {modalidade}',
+                     lambda e=empresa, l=licenca, m=modalidade: contract_rateio(snapshot, e, l, m)))
+    return tarefas
+
+def pinned(snapshot, fn):
+    # O que a tarefa monta fica fixo no snapshot (fora dos LRUs), até a próxima versão
+    def run():
+        with snapshot.pinning():
+            return fn()
+    return run
+
+@registry.add_listener
+def schedule_warmup(slug, snapshot):
+    tarefas = [(prioridade, kind, name, pinned(snapshot, fn)) for prioridade, kind, name, fn in warmup_jobs(slug, snapshot)]
+    warmup.schedule(slug, snapshot.version, tarefas)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_jobs():
+    """Inicia o pool de pré-cálculo e o monitor de mudanças nas planilhas (que alimenta o SSE),
+    uma vez por processo"""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if os.environ.get('WARMUP_ENABLED', '1') != '0':
+        warmup.start()
+        for source in registry.sources.values():
+            if source.snapshot is not None:
+                schedule_warmup(source.slug, source.snapshot)
+    SourceWatcher(registry, WARMUP_POLL_SECONDS, initial=[registry.default_slug]).start()
+
+@app.before_request
+def ensure_background_jobs():
+    # Servidores WSGI (gunicorn, waitress, flask run) não passam pelo __main__ nem pelo
+    # startup do asgi.py: as tarefas de fundo começam na primeira requisição
+    if not _background_started:
+        start_background_jobs()
+
+@tenant_route('/api/warmup', methods=['GET'])
+def api_warmup(tenant=None):
+    """Progresso do pré-cálculo da versão atual do dataset"""
+    source = registry.get(tenant)
+    if source is None:
+        abort(404)
+    return jsonify(warmup.progress(source.slug))
+
+
+def preload_sources():
+    """Com vários tenants, carrega todas as planilhas em paralelo antes de servir"""
+    if len(registry.sources) > 1:
+        for info in dataset.preload():
+            app.logger.warning(f"Planilha {info['arquivo']}: {info['linhas']} linhas em {info['segundos']:.2f}s")
 
 
 if __name__ == '__main__':
+    preload_sources()
+    # Com o reloader do modo debug, só o processo filho (o que atende) roda as tarefas de
+    # fundo; sem reloader, elas começam na primeira requisição (ensure_background_jobs)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs()
     app.run(host='0.0.0.0', debug=True, port=5000)
@@ -0,0 +1,4 @@
+"""Motor de dados do dashboard de licenciamento"""
+from engine.sources import DataSource, Snapshot, SourceRegistry, sources_from_env
+
+__all__ = ['DataSource', 'Snapshot', 'SourceRegistry', 'sources_from_env']
@@ -0,0 +1,174 @@
+"""Bibliotecas de terceiros (Plotly, Bootstrap) servidas pela própria aplicação
+
+`python -m engine.assets` baixa as versões fixadas abaixo (ou as lê de um
+diretório local, para builds sem internet) e grava em static/vendor arquivos
+com o hash do conteúdo no nome, as versões pré-comprimidas (.gz e, com o
+pacote `brotli` instalado, .br) e o manifest.json usado pelo template. Sem o
+manifest (ambiente de desenvolvimento), a página usa as mesmas versões na CDN.
+
+Uso:
+    python -m engine.assets                      # baixa das CDNs
+    python -m engine.assets --source /mnt/vendor # copia de um diretório local
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import urllib.request
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import plotly.offline
+
+
+# Versão do plotly.js que acompanha o plotly instalado (a mesma usada pelas figuras)
+PLOTLYJS_VERSION = plotly.offline.get_plotlyjs_version()
+BOOTSTRAP_VERSION = '5.3.0'
+
+# Nome lógico -> URL fixada. Os gráficos usam só barras e pizza, então basta o pacote
+# parcial "basic" do plotly.js (scatter, bar e pie), bem menor que o completo
+VENDOR_ASSETS = {
+    'plotly.js': f'https://cdn.plot.ly/plotly-basic-{PLOTLYJS_VERSION}.min.js',
+    'bootstrap.css': f'https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSION}/dist/css/bootstrap.min.css',
+    'bootstrap.js': f'https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSION}/dist/js/bootstrap.bundle.min.js'
+}
+
+# Alternativa local quando a URL não está acessível: o pacote completo do plotly instalado
+LOCAL_FALLBACK = {
+    'plotly.js': os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+}
+
+VENDOR_DIR = 'vendor'
+MANIFEST = 'manifest.json'
+
+# Codificações pré-comprimidas, na ordem de preferência: (Content-Encoding, extensão)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+# Extensões comprimidas pelo build (imagens já são comprimidas)
+COMPRESSIBLE = ('.js', '.css', '.json', '.svg', '.html', '.map')
+
+
+def precompress(path):
+    """Grava `path`.gz (e `path`.br, se houver brotli) ao lado do arquivo"""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    with open(path + '.gz', 'wb') as fh:
+        fh.write(gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as fh:
+            fh.write(brotli.compress(data, quality=11))
+
+
+def fetch(name, url, source=None, timeout=30):
+    """Conteúdo do asset: do diretório `source` (ou da URL) ou, na falta, da alternativa local"""
+    try:
+        if source:
+            path = os.path.join(source, os.path.basename(url))
+            with open(path, 'rb') as fh:
+                return fh.read(), path
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read(), url
+    except OSError as exc:
+        fallback = LOCAL_FALLBACK.get(name)
+        if fallback is None:
+            raise RuntimeError(f'Não foi possível obter {os.path.basename(url)}: {exc}') from exc
+        print(f'Aviso: {os.path.basename(url)} indisponível ({exc}); usando {fallback}', file=sys.stderr)
+        with open(fallback, 'rb') as fh:
+            return fh.read(), fallback
+
+
+def build(static_folder, source=None):
+    """Grava os assets com hash no nome em static/vendor, pré-comprime os arquivos
+    estáticos e devolve o manifest {nome lógico: {'arquivo', 'origem'}}"""
+    vendor = os.path.join(static_folder, VENDOR_DIR)
+    os.makedirs(vendor, exist_ok=True)
+    manifest = {}
+    for name, url in VENDOR_ASSETS.items():
+        data, origem = fetch(name, url, source)
+        stem, ext = os.path.basename(origem).rsplit('.min.', 1)
+        filename = f'{stem}.{hashlib.md5(data).hexdigest()[:12]}.min.{ext}'
+        with open(os.path.join(vendor, filename), 'wb') as fh:
+            fh.write(data)
+        manifest[name] = {'arquivo': f'{VENDOR_DIR}/{filename}', 'origem': origem}
+
+    # Remove as versões anteriores dos assets
+    atuais = {os.path.basename(entry['arquivo']) for entry in manifest.values()}
+    for filename in os.listdir(vendor):
+        base = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if base != MANIFEST and base not in atuais:
+            os.remove(os.path.join(vendor, filename))
+
+    with open(os.path.join(vendor, MANIFEST), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+
+    for root, _, files in os.walk(static_folder):
+        for filename in files:
+            if filename.endswith(COMPRESSIBLE):
+                precompress(os.path.join(root, filename))
+    return manifest
+
+
+_manifest = {}
+
+def load_manifest(static_folder):
+    """manifest.json de static/vendor ({} sem build), relido se o arquivo mudar"""
+    path = os.path.join(static_folder, VENDOR_DIR, MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as fh:
+            cached = (mtime, json.load(fh))
+        _manifest[path] = cached
+    return cached[1]
+
+
+def precompressed(static_folder, filename, accept_encodings):
+    """(nome do arquivo pré-comprimido, Content-Encoding) aceito pelo navegador, ou None
+
+    A versão comprimida só vale se não for mais antiga que o original (arquivo
+    editado depois do build).
+    """
+    path = safe_join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+    for encoding, ext in PRECOMPRESSED:
+        if not accept_encodings[encoding]:
+            continue
+        try:
+            if os.path.getmtime(path + ext) >= mtime:
+                return filename + ext, encoding
+        except OSError:
+            continue
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Baixa e pré-comprime os assets de terceiros em static/vendor')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'),
+                        help='pasta static da aplicação')
+    parser.add_argument('--source', help='diretório com os arquivos já baixados (build sem internet)')
+    args = parser.parse_args(argv)
+
+    manifest = build(args.static, args.source)
+    for name, entry in manifest.items():
+        size = os.path.getsize(os.path.join(args.static, entry['arquivo']))
+        print(f"{name:<15}{entry['arquivo']:<55}{size / 1024:>10.0f} KB  ({entry['origem']})")
+    if brotli is None:
+        print('Pacote brotli não instalado: só as versões .gz foram geradas', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
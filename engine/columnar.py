@@ -0,0 +1,51 @@
+"""Pacote binário colunar do dataset para os dashboards HTML standalone
+
+Formato (little-endian):
+    b'MSLC' | uint32 tamanho do cabeçalho | cabeçalho JSON (UTF-8) | colunas
+
+O cabeçalho traz {'linhas', 'colunas': [...]} e os metadados recebidos; cada
+coluna é {'nome', 'tipo', 'offset', 'bytes'} com offset relativo ao fim do
+cabeçalho. Números são 'f64'; textos vão como códigos 'u8'/'u16'/'u32' mais a
+lista 'valores' (na ordem em que aparecem). Cada coluna começa num endereço
+múltiplo de 8, então o navegador cria Float64Array/Uint32Array direto sobre o
+buffer, sem cópia nem parsing.
+"""
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b'MSLC'
+
+
+def _codes(series):
+    """Códigos (menor tipo inteiro que comporta o dicionário) e valores distintos"""
+    codes, valores = pd.factorize(series.fillna('').astype(str), sort=False)
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if len(valores) <= np.iinfo(dtype).max + 1:
+            return codes.astype(dtype), list(valores)
+
+
+def encode(df, columns, meta=None):
+    """Serializa `df` no formato acima; `columns` = {nome no pacote: (coluna, 'numero' | 'texto')}"""
+    descritores, partes, offset = [], [], 0
+    for nome, (column, kind) in columns.items():
+        if kind == 'numero':
+            data = pd.to_numeric(df[column], errors='coerce').fillna(0.0).to_numpy(dtype='<f8')
+            descritor = {'tipo': 'f64'}
+        else:
+            data, valores = _codes(df[column])
+            descritor = {'tipo': 'u%d' % (data.dtype.itemsize * 8), 'valores': valores}
+        raw = data.astype(data.dtype.newbyteorder('<'), copy=False).tobytes()
+        descritor.update(nome=nome, offset=offset, bytes=len(raw))
+        descritores.append(descritor)
+        partes.append(raw + b'\0' * (-len(raw) % 8))
+        offset += len(partes[-1])
+
+    header = json.dumps(dict(meta or {}, linhas=len(df), colunas=descritores),
+                        ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # Espaços no fim do JSON alinham o início das colunas em 8 bytes
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+    return MAGIC + struct.pack('<I', len(header)) + header + b''.join(partes)
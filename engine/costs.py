@@ -0,0 +1,56 @@
+"""Modelo de custos: colunas derivadas calculadas uma vez por snapshot"""
+import numpy as np
+import pandas as pd
+
+
+# Dias médios por mês, para converter prazos em meses
+DIAS_POR_MES = 365.25 / 12
+
+
+def contract_months(df, months='mesesContrato'):
+    """Duração do contrato em meses (12 quando não informada)"""
+    return df[months].where(df[months] > 0, 12.0)
+
+
+def monthly_cost(df, unit='valorUnitarioMensal', qty='qtdLicenca', annual='valorAnual'):
+    """Custo mensal efetivo: unitário mensal x quantidade (ou valor anual / 12)"""
+    unitario = df[unit].where(df[unit] > 0, df[annual] / 12)
+    return unitario * df[qty]
+
+
+def billed_months(df, pro_rata='proRata', months='mesesContrato'):
+    """Meses cobrados: pro-rata limitado à duração do contrato"""
+    meses = contract_months(df, months)
+    return np.minimum(df[pro_rata].clip(lower=0).fillna(meses), meses)
+
+
+def pro_rata_cost(df):
+    """Custo ajustado pelo pro-rata (regra usada para derivar o valor total)"""
+    return monthly_cost(df) * billed_months(df)
+
+
+def add_cost_columns(df, total='valorTotalLicenca'):
+    """Acrescenta as colunas canônicas de custo (vetorizadas)
+
+    - custoMensal: custo mensal efetivo
+    - custoTotal: o valor total da planilha, sem recalcular (já vem pelo
+      pro-rata e é o valor faturado; quando vazio, a validação o deriva com
+      pro_rata_cost). É só outro nome para a coluna: os consumidores leem
+      custoTotal e não dependem do cabeçalho da planilha.
+    """
+    df['custoMensal'] = monthly_cost(df).fillna(0.0)
+    df['custoTotal'] = df[total]
+    return df
+
+
+def remaining_value(df, hoje=None, end='finalContrato', months='mesesContrato'):
+    """Valor a vencer até o final do contrato na data `hoje` (padrão: hoje)
+
+    Depende do dia, então é calculado na requisição (não fica no snapshot).
+    """
+    hoje = pd.Timestamp(hoje or pd.Timestamp.now()).normalize()
+    fim = df[end]
+    if getattr(fim.dt, 'tz', None) is not None:
+        fim = fim.dt.tz_localize(None)
+    meses_restantes = ((fim - hoje).dt.days / DIAS_POR_MES).clip(lower=0)
+    return np.minimum(meses_restantes, contract_months(df, months)).fillna(0.0) * df['custoMensal']
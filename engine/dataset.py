@@ -0,0 +1,60 @@
+"""Motor de dados compartilhado pelos dashboards Flask e Dash
+
+Leitura (só as colunas usadas, com os nomes alternativos do esquema),
+validação e modelo de custos, e o registro de fontes com os snapshots em
+cache. Os dois front-ends importam o mesmo `registry`: rodando no mesmo
+processo, cada planilha é lida, validada e indexada uma única vez.
+"""
+import os
+
+from engine.costs import add_cost_columns, pro_rata_cost
+from engine.ingest import read_projected
+from engine.metrics import span
+from engine.quality import validate
+from engine.schema import ALIASES, PLANILHA_COLUMNS
+from engine.sources import SourceRegistry, sources_from_env
+
+
+# Caminho do arquivo Excel utilizado pelos dashboards (fonte padrão)
+EXCEL_FILE = os.environ.get('EXCEL_FILE', 'LICENCIAMENTO MICROSOFT (1).xlsx')
+
+
+def read_planilha(path, sheet='Planilha1'):
+    """Lê, valida e normaliza os dados de uma planilha (streaming, só as colunas usadas)"""
+    with span('load', 'read'):
+        df = read_projected(path, sheet, PLANILHA_COLUMNS, ALIASES)
+    return prepare_planilha(df)
+
+
+def prepare_planilha(df):
+    """Validação única na carga (tipos, textos, totais derivados, linhas rejeitadas)
+    seguida do modelo de custos
+
+    Retorna (df, relatório de qualidade); as rotas só recebem dados limpos.
+    """
+    with span('load', 'validate'):
+        df, report = validate(
+            df, PLANILHA_COLUMNS,
+            key_columns=('empresa', 'email', 'licenca'),
+            case={'email': 'lower', 'estado': 'upper'},
+            total=('valorTotalLicenca', pro_rata_cost),
+            zero_fill=('valorUnitarioMensal', 'qtdLicenca'),
+            unique=('email', 'licenca'),
+            periodo=('inicioContrato', 'finalContrato')
+        )
+    with span('load', 'costs'):
+        df = add_cost_columns(df)
+    return df, report
+
+
+def preload(max_workers=None):
+    """Carrega em paralelo as fontes ainda não carregadas (ver SourceRegistry.preload)"""
+    return registry.preload(prepare_planilha, max_workers, PLANILHA_COLUMNS, ALIASES)
+
+
+# Fontes de dados (uma por grupo/tenant), cada uma com seu snapshot em cache
+registry = SourceRegistry(
+    sources_from_env(EXCEL_FILE),
+    read_planilha,
+    memory_budget_mb=float(os.environ.get('DATA_MEMORY_BUDGET_MB', 512))
+)
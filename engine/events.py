@@ -0,0 +1,43 @@
+"""Aviso de nova versão do dataset para clientes conectados (server-sent events)"""
+import threading
+
+
+class VersionFeed:
+    """Última versão do dataset de cada tenant
+
+    Threads esperam uma versão nova com wait(); código assíncrono (entrada
+    ASGI) assina com subscribe() e recebe a chamada na thread que publicou.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._cond = threading.Condition()
+        self._subscribers = []
+
+    def publish(self, slug, version):
+        with self._cond:
+            if self._versions.get(slug) == version:
+                return
+            self._versions[slug] = version
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        for fn in subscribers:
+            fn(slug, version)
+
+    def version(self, slug):
+        return self._versions.get(slug)
+
+    def wait(self, slug, known, timeout):
+        """Espera até `timeout` segundos por uma versão diferente de `known` e devolve a atual"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._versions.get(slug, known) != known, timeout)
+            return self._versions.get(slug, known)
+
+    def subscribe(self, fn):
+        with self._cond:
+            self._subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        with self._cond:
+            if fn in self._subscribers:
+                self._subscribers.remove(fn)
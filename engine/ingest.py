@@ -0,0 +1,218 @@
+"""Leitura paralela de várias abas/planilhas com openpyxl em modo read-only"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from engine.quality import parse_dates, parse_number
+
+
+# Limite da alocação inicial dos arrays: a dimensão gravada na planilha pode ser
+# falsa (ex.: 1.048.576 linhas); acima disso os arrays crescem sob demanda
+MAX_INITIAL_ROWS = 65536
+
+
+def default_workers():
+    return int(os.environ.get('INGEST_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def sheet_to_frame(ws):
+    """Converte uma aba (streaming, linha a linha) em DataFrame"""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    columns = [c if c is not None else f'Unnamed: {i}' for i, c in enumerate(header)]
+    width = len(columns)
+    data = []
+    last = 0
+    for row in rows:
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        data.append(row)
+        if any(v is not None for v in row):
+            last = len(data)
+    # Como o pd.read_excel: descarta linhas vazias no final e colunas sem cabeçalho nem dados
+    df = pd.DataFrame(data[:last], columns=columns)
+    empty = [c for i, c in enumerate(columns) if header[i] is None and df[c].isna().all()]
+    df = df.drop(columns=empty)
+    obj = df.select_dtypes('object').columns
+    df[obj] = df[obj].where(df[obj].notna(), np.nan)
+    return df
+
+
+def _alloc(kind, size):
+    if kind == 'float':
+        return np.full(size, np.nan, dtype=np.float64)
+    return np.full(size, np.nan, dtype=object)
+
+
+def _grow(arr):
+    out = np.full(len(arr) * 2, np.nan, dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+def project_sheet(ws, columns, aliases=None):
+    """Lê só as colunas pedidas de uma aba (streaming), montando arrays tipados
+
+    `columns` é {nome: tipo} com tipo 'float', 'datetime' ou 'str'. Colunas
+    ausentes na planilha voltam vazias (NaN/NaT) em vez de gerar erro.
+    `aliases` ({cabeçalho: nome}) aceita outros cabeçalhos para as colunas; o
+    nome exato tem preferência.
+
+    Números e datas já são convertidos na leitura. As posições das células
+    preenchidas que não puderam ser convertidas ficam em
+    `df.attrs['invalidos']` ({coluna: posições}), para o relatório de qualidade.
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    pos = {}
+    for i, name in enumerate(header):
+        if name in columns and name not in pos:
+            pos[name] = i
+    for i, name in enumerate(header):
+        name = (aliases or {}).get(name)
+        if name in columns and name not in pos:
+            pos[name] = i
+    wanted = [(name, pos[name], columns[name]) for name in columns if name in pos]
+
+    capacity = max(16, min(ws.max_row or 0, MAX_INITIAL_ROWS))
+    arrays = {name: _alloc(kind, capacity) for name, _, kind in wanted}
+    strings = {}
+    invalid = {name: [] for name, _, kind in wanted if kind == 'float'}
+    n = last = 0
+    for row in rows:
+        if n == capacity:
+            arrays = {name: _grow(arr) for name, arr in arrays.items()}
+            capacity *= 2
+        width = len(row)
+        filled = False
+        for name, i, kind in wanted:
+            v = row[i] if i < width else None
+            if v is None:
+                continue
+            filled = True
+            if kind == 'float':
+                if type(v) in (int, float):
+                    arrays[name][n] = v
+                else:
+                    number = parse_number(v)
+                    arrays[name][n] = number
+                    if number != number:
+                        invalid[name].append(n)
+            elif kind == 'str' and isinstance(v, str):
+                # valores repetidos (empresa, licença...) compartilham o mesmo objeto
+                arrays[name][n] = strings.setdefault(v, v)
+            else:
+                arrays[name][n] = v
+        n += 1
+        if filled:
+            last = n
+
+    data = {}
+    for name, kind in columns.items():
+        arr = arrays[name][:last] if name in arrays else _alloc(kind, last)
+        if kind == 'datetime':
+            data[name] = parse_dates(arr)
+            invalid[name] = np.flatnonzero(pd.notna(arr) & data[name].isna())
+        else:
+            data[name] = arr
+    df = pd.DataFrame(data)
+    df.attrs['invalidos'] = {name: np.asarray(pos, dtype=np.intp) for name, pos in invalid.items() if len(pos)}
+    return df
+
+
+def read_projected(path, sheet, columns, aliases=None):
+    """Abre a planilha em modo read-only e lê apenas as colunas informadas"""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        return project_sheet(wb[sheet], columns, aliases)
+    finally:
+        wb.close()
+
+
+def read_sheets(path, sheets=None, columns=None, aliases=None):
+    """Lê as abas de um arquivo reaproveitando um único handle aberto
+
+    Com `columns` ({nome: tipo}) lê só essas colunas, já tipadas (e
+    `aliases` com os cabeçalhos alternativos).
+    Retorna (path, {aba: DataFrame}, {aba: segundos}, segundos_total).
+    """
+    start = time.perf_counter()
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        frames, timings = {}, {}
+        for name in sheets or wb.sheetnames:
+            t0 = time.perf_counter()
+            ws = wb[name]
+            frames[name] = project_sheet(ws, columns, aliases) if columns else sheet_to_frame(ws)
+            timings[name] = time.perf_counter() - t0
+    finally:
+        wb.close()
+    return path, frames, timings, time.perf_counter() - start
+
+
+def sheet_names(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def _plan(paths, sheets, workers):
+    """Divide o trabalho em tarefas (arquivo, abas) para ocupar todos os workers"""
+    tasks = []
+    per_file = max(1, workers // max(1, len(paths)))
+    for path in paths:
+        names = (sheets.get(path) if isinstance(sheets, dict) else sheets) or sheet_names(path)
+        chunks = min(per_file, len(names)) or 1
+        for i in range(chunks):
+            tasks.append((path, names[i::chunks]))
+    return tasks
+
+
+def ingest_files(paths, sheets=None, max_workers=None, columns=None, aliases=None):
+    """Lê várias planilhas/abas em paralelo num ProcessPoolExecutor
+
+    `sheets` pode ser uma lista (mesmas abas em todos os arquivos) ou um
+    dict {arquivo: [abas]}; sem abas informadas, lê todas. `columns` ativa a
+    leitura projetada e tipada, com `aliases` (ver `project_sheet`).
+
+    Retorna ({arquivo: {aba: DataFrame}}, relatório) onde o relatório tem uma
+    linha por arquivo com abas, linhas e tempo de leitura.
+    """
+    paths = list(paths)
+    workers = max_workers or default_workers()
+    tasks = _plan(paths, sheets, workers)
+
+    results = {path: {} for path in paths}
+    timings = {path: {} for path in paths}
+    elapsed = {path: 0.0 for path in paths}
+
+    if workers <= 1 or len(tasks) <= 1:
+        outputs = [read_sheets(path, names, columns, aliases) for path, names in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(read_sheets, path, names, columns, aliases) for path, names in tasks]
+            outputs = [f.result() for f in futures]
+
+    for path, frames, sheet_times, seconds in outputs:
+        results[path].update(frames)
+        timings[path].update(sheet_times)
+        elapsed[path] = max(elapsed[path], seconds)
+
+    report = [
+        {
+            'arquivo': path,
+            'abas': {name: {'linhas': len(df), 'segundos': round(timings[path][name], 4)}
+                     for name, df in results[path].items()},
+            'linhas': sum(len(df) for df in results[path].values()),
+            'segundos': round(elapsed[path], 4)
+        }
+        for path in paths
+    ]
+    return results, report
@@ -0,0 +1,175 @@
+"""Fila de exportações em segundo plano, com resultados em disco e expiração (TTL)"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.metrics import REGISTRY
+
+
+# Threads que geram as exportações
+DEFAULT_WORKERS = 2
+
+# Tempo (s) que um resultado fica disponível para download
+DEFAULT_TTL = 3600
+
+# Exportações aguardando ou em execução ao mesmo tempo
+MAX_PENDING = 50
+
+# Intervalo mínimo (s) entre varreduras da pasta de resultados
+PURGE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOBS = REGISTRY.counter(
+    'dashboard_export_jobs_total', 'Exportações em segundo plano por resultado', ('kind', 'result')
+)
+EXPORT_SECONDS = REGISTRY.histogram(
+    'dashboard_export_job_seconds', 'Duração das exportações em segundo plano', ('kind',)
+)
+
+
+class QueueFull(Exception):
+    """Limite de exportações pendentes atingido"""
+
+
+class Job:
+    """Uma exportação: situação, tempos e arquivo de resultado"""
+
+    def __init__(self, kind, slug, file_name, mimetype):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.slug = slug
+        self.file_name = file_name
+        self.mimetype = mimetype
+        self.status = 'pendente'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.size = None
+        self.error = None
+        self.path = None
+
+    @property
+    def done(self):
+        return self.status in ('concluido', 'erro')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.kind,
+            'status': self.status,
+            'arquivo': self.file_name,
+            'criado_em': self.created,
+            'iniciado_em': self.started,
+            'concluido_em': self.finished,
+            'bytes': self.size,
+            'erro': self.error
+        }
+
+
+class JobQueue:
+    """Executa exportações num pool limitado de threads e guarda o resultado em disco
+
+    `build(fh)` escreve o resultado no arquivo binário `fh`. Resultados (e
+    tarefas) com mais de `ttl` segundos desde a conclusão são apagados; a pasta
+    também é limpa de arquivos antigos deixados por execuções anteriores.
+    """
+
+    def __init__(self, results_dir=None, max_workers=DEFAULT_WORKERS, ttl=DEFAULT_TTL, max_pending=MAX_PENDING):
+        self.results_dir = results_dir or os.path.join(tempfile.gettempdir(), 'ms-license-exports')
+        self.max_workers = max(1, int(max_workers))
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._last_purge = 0.0
+
+    def submit(self, kind, slug, file_name, mimetype, build):
+        """Enfileira a exportação e devolve o Job (QueueFull se a fila estiver cheia)"""
+        self.purge()
+        job = Job(kind, slug, file_name, mimetype)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.done)
+            if pending >= self.max_pending:
+                raise QueueFull()
+            if self._executor is None:
+                os.makedirs(self.results_dir, exist_ok=True)
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='export')
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, build)
+        return job
+
+    def get(self, job_id):
+        self.purge()
+        return self._jobs.get(job_id)
+
+    def _run(self, job, build):
+        job.status = 'executando'
+        job.started = time.time()
+        ext = os.path.splitext(job.file_name)[1]
+        path = os.path.join(self.results_dir, job.id + ext)
+        partial = path + '.part'
+        try:
+            with open(partial, 'wb') as fh:
+                build(fh)
+            os.replace(partial, path)
+            job.path = path
+            job.size = os.path.getsize(path)
+            job.status = 'concluido'
+        except Exception as e:
+            logger.exception('Erro na exportação %s (%s)', job.kind, job.id)
+            job.error = str(e)
+            job.status = 'erro'
+            if os.path.exists(partial):
+                os.remove(partial)
+        job.finished = time.time()
+        EXPORT_JOBS.inc(kind=job.kind, result='ok' if job.status == 'concluido' else 'erro')
+        EXPORT_SECONDS.observe(job.finished - job.started, kind=job.kind)
+
+    def purge(self, force=False):
+        """Remove tarefas e arquivos expirados (no máximo a cada PURGE_INTERVAL segundos)"""
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.done and now - j.finished > self.ttl]
+            for job in expired:
+                del self._jobs[job.id]
+            active = {j.path for j in self._jobs.values() if j.path}
+        for job in expired:
+            self._remove(job.path)
+
+        # Sobras de execuções anteriores (ou de tarefas interrompidas)
+        if not os.path.isdir(self.results_dir):
+            return
+        for entry in os.scandir(self.results_dir):
+            if entry.path in active or not entry.is_file():
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    self._remove(entry.path)
+            except OSError:
+                pass
+
+    def _remove(self, path):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.exception('Erro removendo %s', path)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        out = {}
+        for job in jobs:
+            out[job.status] = out.get(job.status, 0) + 1
+        return out
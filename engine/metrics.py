@@ -0,0 +1,203 @@
+"""Métricas no formato texto do Prometheus e spans de tempo por etapa (sem dependências)"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Limites (s) dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base das métricas: nome, ajuda, rótulos e valores por combinação de rótulos"""
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, k), v) for k, v in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{name}{labels} {_number(value)}' for name, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limit in enumerate(self.buckets):
+                if value <= limit:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for limit, n in zip(self.buckets, counts):
+                    le = [('le', _number(float(limit)))]
+                    out.append((f'{self.name}_bucket', _labels(self.labelnames, key, le), n))
+                out.append((f'{self.name}_sum', _labels(self.labelnames, key), total))
+                out.append((f'{self.name}_count', _labels(self.labelnames, key), count))
+        return out
+
+
+class MetricsRegistry:
+    """Conjunto de métricas e coletores (funções chamadas a cada leitura de /metrics)"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        """Registra uma função que atualiza gauges antes de cada exposição"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self._collectors:
+            fn()
+        return '\n'.join(m.render() for m in self._metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'dashboard_stage_seconds', 'Duração de cada etapa (carga, filtro, agregação, figura, serialização, render)',
+    ('stage', 'step')
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'dashboard_cache_requests_total', 'Consultas aos caches (snapshot, índices, figuras) por resultado',
+    ('cache', 'result')
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'dashboard_cache_hit_ratio', 'Taxa de acerto acumulada de cada cache', ('cache',)
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Spans da requisição atual: lista de (etapa, passo, segundos)
+_trace = contextvars.ContextVar('dashboard_trace', default=None)
+
+
+def start_trace():
+    """Inicia a coleta de spans da requisição atual e devolve a lista"""
+    spans = []
+    _trace.set(spans)
+    return spans
+
+
+def end_trace():
+    _trace.set(None)
+
+
+@contextmanager
+def span(stage, step=''):
+    """Mede uma etapa: alimenta o histograma por etapa e os spans da requisição"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage, step=step)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append((stage, step, seconds))
+
+
+def cache_event(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+@REGISTRY.collector
+def _cache_ratios():
+    caches = {c for c, _ in CACHE_REQUESTS._values}
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache=cache, result='hit')
+        total = hits + CACHE_REQUESTS.value(cache=cache, result='miss')
+        if total:
+            CACHE_HIT_RATIO.set(hits / total, cache=cache)
+
+
+def server_timing(spans, total=None):
+    """Valor do cabeçalho Server-Timing (um item por span, em ms)"""
+    items = [f"{stage}{'.' + step if step else ''};dur={seconds * 1000:.1f}" for stage, step, seconds in spans]
+    if total is not None:
+        items.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(items)
@@ -0,0 +1,151 @@
+"""Perfil de uma requisição sob demanda: cProfile (pstats), amostragem (pilhas colapsadas) e tracemalloc"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+# Só um perfil por vez: cProfile e tracemalloc são globais ao processo
+PROFILE_LOCK = threading.Lock()
+
+# Intervalo padrão entre amostras da pilha (s)
+DEFAULT_INTERVAL = 0.005
+
+# Linhas do relatório de pstats e de alocações
+DEFAULT_LIMIT = 40
+ALLOC_LIMIT = 15
+
+MODES = ('pstats', 'collapsed')
+
+
+def _short(filename):
+    # Caminho curto: a partir de site-packages (bibliotecas) ou relativo ao projeto
+    norm = filename.replace('\\', '/')
+    if 'site-packages/' in norm:
+        return norm.split('site-packages/', 1)[1]
+    try:
+        return os.path.relpath(filename).replace('\\', '/')
+    except ValueError:
+        return norm
+
+
+class SamplingProfiler:
+    """Amostra a pilha de uma thread em intervalos fixos (pilhas colapsadas para flamegraphs)"""
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f'{_short(code.co_filename)}:{code.co_name}'
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        """Formato 'pilha;de;chamadas contagem' (flamegraph.pl, speedscope, inferno)"""
+        return '\n'.join(f'{stack} {n}' for stack, n in sorted(self.counts.items())) + '\n'
+
+
+class RequestProfiler:
+    """Perfila o trecho entre start() e stop() na thread atual"""
+
+    def __init__(self, mode='pstats', interval=DEFAULT_INTERVAL, limit=DEFAULT_LIMIT, alloc=True):
+        self.mode = mode if mode in MODES else 'pstats'
+        self.interval = interval
+        self.limit = limit
+        self.alloc = alloc
+        self._profiler = None
+        self._sampler = None
+        self._own_tracemalloc = False
+        self._started = None
+        self.seconds = None
+        self.alloc_peak = None
+
+    def start(self):
+        """Inicia o perfil; retorna False se outro perfil já estiver em andamento"""
+        if not PROFILE_LOCK.acquire(blocking=False):
+            return False
+        if self.alloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracemalloc = True
+            tracemalloc.reset_peak()
+        if self.mode == 'collapsed':
+            self._sampler = SamplingProfiler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        return True
+
+    def stop(self, title=''):
+        """Encerra o perfil e devolve o relatório em texto"""
+        try:
+            self.seconds = time.perf_counter() - self._started
+            if self._profiler is not None:
+                self._profiler.disable()
+            if self._sampler is not None:
+                self._sampler.stop()
+            allocations = self._allocations() if self.alloc else ''
+        finally:
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            PROFILE_LOCK.release()
+
+        if self.mode == 'collapsed':
+            return self._sampler.collapsed()
+
+        out = io.StringIO()
+        out.write(f'Perfil: {title} ({self.seconds * 1000:.1f} ms)\n\n')
+        out.write(f'== cProfile: {self.limit} funções com maior tempo acumulado ==\n')
+        stats = pstats.Stats(self._profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(self.limit)
+        if allocations:
+            out.write('\n' + allocations)
+        return out.getvalue()
+
+    def _allocations(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        self.alloc_peak = peak
+        lines = [
+            '== Alocações (tracemalloc) ==',
+            f'pico: {peak / 1024 / 1024:.2f} MB, em uso ao final: {current / 1024 / 1024:.2f} MB',
+            f'{ALLOC_LIMIT} linhas com mais memória alocada ainda em uso:'
+        ]
+        for stat in snapshot.statistics('lineno')[:ALLOC_LIMIT]:
+            frame = stat.traceback[0]
+            lines.append(f'  {stat.size / 1024:10.1f} KB  {stat.count:7d} blocos  '
+                         f'{_short(frame.filename)}:{frame.lineno}')
+        return '\n'.join(lines) + '\n'
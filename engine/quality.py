@@ -0,0 +1,211 @@
+"""Validação e normalização do dataset na carga (relatório de qualidade)"""
+import numpy as np
+import pandas as pd
+
+
+# Quantidade máxima de linhas listadas por tipo de aviso no relatório
+MAX_LINHAS_RELATORIO = 50
+
+# Linha do Excel correspondente à posição 0 do DataFrame (linha 1 = cabeçalho)
+PRIMEIRA_LINHA_EXCEL = 2
+
+# Colunas object só com números (ex.: total com células vazias) não passam pelo parse_number
+NUMERIC_INFERRED = ('floating', 'integer', 'mixed-integer-float', 'empty')
+
+
+def parse_number(v):
+    """Converte número ou texto numérico (inclusive pt-BR: 'R$ 1.234,56') em float"""
+    if v is None or isinstance(v, bool):
+        return np.nan
+    if isinstance(v, (int, float)):
+        return float(v)
+    text = str(v).replace('R$', '').replace(' ', '').strip()
+    if not text:
+        return np.nan
+    if ',' in text and '.' in text:
+        # O último separador é o decimal
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_dates(values):
+    """Converte datas (objetos ou texto) em datetime64; inválidas viram NaT
+
+    Textos em UTC com o sufixo 'Z' ('2024-12-17 16:11:48Z') são convertidos sem
+    o sufixo e recebem o fuso depois: o pandas trata fusos no texto por um
+    caminho bem mais lento.
+    """
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values, dtype=object)
+    primeiro = next((v for v in values.to_numpy() if not pd.isna(v)), None)
+    if isinstance(primeiro, str) and primeiro.endswith('Z') and \
+            pd.api.types.infer_dtype(values, skipna=True) == 'string' and values.str.endswith('Z', na=True).all():
+        return pd.to_datetime(values.str[:-1], errors='coerce').dt.tz_localize('UTC')
+    return pd.to_datetime(values, errors='coerce')
+
+
+def _as_text(v):
+    """Valor não textual numa coluna de texto (ex.: centro de custo digitado como
+    número) como texto; números inteiros sem o '.0' (1010.0 -> '1010')"""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _clean_text(v, case=None):
+    if not isinstance(v, str):
+        v = _as_text(v)
+    text = ' '.join(v.split())
+    if not text:
+        return None
+    if case == 'lower':
+        return text.lower()
+    if case == 'upper':
+        return text.upper()
+    return text
+
+
+def clean_text_column(series, case=None):
+    """Limpa uma coluna de texto; retorna (coluna limpa, máscara das células não textuais)
+
+    Cada valor distinto é limpo uma única vez (pd.factorize) e os códigos
+    remontam a coluna; ausentes viram None.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = np.asarray(uniques, dtype=object)
+    # O último item (None) atende os códigos -1 dos ausentes
+    cleaned = np.empty(len(uniques) + 1, dtype=object)
+    cleaned[:-1] = [_clean_text(v, case) for v in uniques]
+    cleaned[-1] = None
+    if pd.api.types.infer_dtype(uniques, skipna=True) in ('string', 'empty'):
+        nao_texto = np.zeros(len(series), dtype=bool)
+    else:
+        distintos = np.fromiter((not isinstance(v, str) for v in uniques), dtype=bool, count=len(uniques))
+        nao_texto = (codes >= 0) & distintos[codes]
+    return pd.Series(cleaned[codes], index=series.index, dtype=object), nao_texto
+
+
+def _vazia(series):
+    """Coluna sem nenhum valor; em colunas object para no primeiro preenchido"""
+    if series.dtype != object:
+        return bool(series.isna().all())
+    return all(pd.isna(v) for v in series.to_numpy())
+
+
+def _excel_rows(index):
+    return [int(i) + PRIMEIRA_LINHA_EXCEL for i in index[:MAX_LINHAS_RELATORIO]]
+
+
+def validate(df, schema, key_columns, case=None, total=None, zero_fill=(), unique=None, periodo=None):
+    """Valida, tipa e normaliza o dataset uma única vez na carga
+
+    - `schema`: {coluna: 'str' | 'float' | 'datetime'}
+    - `key_columns`: linhas sem nenhuma dessas colunas preenchida são rejeitadas
+    - `case`: {coluna: 'lower' | 'upper'} para normalizar caixa
+    - `total`: (coluna_total, derivar) onde `derivar(df)` estima o total das
+      linhas em que ele está vazio
+    - `zero_fill`: colunas de valor/quantidade em que vazio vira 0
+    - `unique`: colunas que identificam uma linha (duplicadas geram aviso)
+    - `periodo`: (coluna_inicio, coluna_fim) do contrato
+
+    Retorna (df, relatório). No df resultante textos ausentes são None e as
+    colunas de valor/quantidade não têm NaN.
+    """
+    case = case or {}
+    # Células que a leitura projetada (engine.ingest.project_sheet) não conseguiu converter
+    invalidos = df.attrs.get('invalidos', {})
+    # Cópia rasa: as colunas são substituídas (df[coluna] = ...), nunca alteradas no lugar
+    df = df.copy(deep=False)
+    df.attrs.pop('invalidos', None)
+    avisos = {}
+
+    def aviso(tipo, mask):
+        n = int(mask.sum())
+        if n:
+            avisos[tipo] = {'quantidade': n, 'linhas': _excel_rows(df.index[mask])}
+
+    # Esquema: colunas esperadas ausentes ou completamente vazias
+    for column in schema:
+        if column not in df.columns:
+            df[column] = np.nan
+    vazias = [c for c in schema if c not in invalidos and _vazia(df[c])]
+
+    # Tipos
+    for column, kind in schema.items():
+        if column in invalidos:
+            mask = np.zeros(len(df), dtype=bool)
+            mask[invalidos[column]] = True
+            aviso(f'{column}_invalido', mask)
+        if kind == 'str':
+            df[column], nao_texto = clean_text_column(df[column], case.get(column))
+            aviso(f'{column}_convertido_texto', nao_texto)
+        elif kind == 'float':
+            if df[column].dtype == object and \
+                    pd.api.types.infer_dtype(df[column], skipna=True) not in NUMERIC_INFERRED:
+                raw = df[column]
+                df[column] = raw.map(parse_number).astype('float64')
+                aviso(f'{column}_invalido', raw.notna() & df[column].isna())
+            else:
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif kind == 'datetime' and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            raw = df[column]
+            df[column] = parse_dates(raw)
+            aviso(f'{column}_invalido', raw.notna() & df[column].isna())
+
+    # Linhas sem identificação (empresa/e-mail/licença) são rejeitadas
+    keys = [c for c in key_columns if c in df.columns]
+    sem_chave = df[keys].isna().all(axis=1)
+    rejeitadas = []
+    for idx, row in df[sem_chave].iterrows():
+        valores = {k: str(v) for k, v in row.items() if v is not None and not pd.isna(v)}
+        rejeitadas.append({
+            'linha': int(idx) + PRIMEIRA_LINHA_EXCEL,
+            'motivo': f"linha sem {', '.join(keys)}",
+            'valores': valores
+        })
+    if sem_chave.any():
+        df = df[~sem_chave].copy()
+
+    # Totais: derivar quando vazio
+    if total:
+        col_total, derivar = total
+        estimado = derivar(df)
+        derivavel = df[col_total].isna() & estimado.notna()
+        aviso('total_derivado', derivavel)
+        df[col_total] = df[col_total].where(~derivavel, estimado)
+        aviso('sem_valor_total', df[col_total].isna())
+        aviso(f'{col_total}_negativo', df[col_total] < 0)
+        df[col_total] = df[col_total].fillna(0.0)
+
+    for column in zero_fill:
+        aviso(f'sem_{column}', df[column].isna())
+        aviso(f'{column}_negativo', df[column] < 0)
+        df[column] = df[column].fillna(0.0)
+
+    if unique:
+        aviso('duplicados', df.duplicated(subset=list(unique), keep=False) & df[list(unique)].notna().all(axis=1))
+    if periodo:
+        inicio, fim = periodo
+        aviso('sem_final_contrato', df[fim].isna())
+        aviso('periodo_invertido', df[inicio] > df[fim])
+
+    # df já é cópia própria: renumera sem copiar de novo
+    df.index = pd.RangeIndex(len(df))
+
+    report = {
+        'linhas_lidas': int(len(sem_chave)),
+        'linhas_validas': int(len(df)),
+        'linhas_rejeitadas': len(rejeitadas),
+        'colunas_vazias': vazias,
+        'rejeitadas': rejeitadas,
+        'avisos': avisos
+    }
+    return df, report
@@ -0,0 +1,62 @@
+"""Esquema da Planilha1: colunas canônicas, nomes alternativos e visões por front-end
+
+O motor trabalha sempre com os nomes canônicos (os da planilha atual). Planilhas
+no layout antigo (o usado pelo dashboard Dash) são lidas pelos nomes
+alternativos e convertidas na leitura; cada front-end pode pedir uma visão do
+mesmo DataFrame com os nomes que usa.
+"""
+
+
+# Colunas canônicas da Planilha1 usadas pelos dashboards e seus tipos;
+# as demais colunas não são lidas
+PLANILHA_COLUMNS = {
+    'empresa': 'str',
+    'nomeColaborador': 'str',
+    'email': 'str',
+    'DataCriacaoEmail': 'datetime',
+    'DataCriacaoFormatada': 'datetime',
+    'setor': 'str',
+    'Centro de Custo': 'str',
+    'estado': 'str',
+    'licenca': 'str',
+    'modalidadeLicenca': 'str',
+    'inicioContrato': 'datetime',
+    'finalContrato': 'datetime',
+    'mesesContrato': 'float',
+    'proRata': 'float',
+    'valorAnual': 'float',
+    'valorUnitarioMensal': 'float',
+    'qtdLicenca': 'float',
+    'valorTotalLicenca': 'float',
+    'faturador': 'str'
+}
+
+# Coluna canônica -> nome usado pelo dashboard Dash (dashboard.py) e pela planilha antiga
+DASH_COLUMNS = {
+    'empresa': 'Empresa',
+    'nomeColaborador': 'Nome do colaborador',
+    'email': 'e-mail',
+    'DataCriacaoFormatada': 'data criação do e-mail',
+    'modalidadeLicenca': 'Modalidade da licença',
+    'inicioContrato': 'inicio contrato',
+    'finalContrato': 'final contrato',
+    'valorAnual': 'valor unitario',
+    'qtdLicenca': 'quantidade de licenças',
+    'valorTotalLicenca': 'total'
+}
+
+# Cabeçalhos alternativos aceitos na leitura: {nome na planilha: coluna canônica}
+ALIASES = {alias: canonical for canonical, alias in DASH_COLUMNS.items()}
+
+# Visão usada pelo dashboard Dash: os mesmos nomes, com o total vindo da coluna de custo
+DASH_VIEW = {**{c: n for c, n in DASH_COLUMNS.items() if c != 'valorTotalLicenca'}, 'custoTotal': 'total'}
+
+
+def view(snapshot, names):
+    """DataFrame do snapshot com as colunas renomeadas (`names` = {canônica: nome})
+
+    A visão compartilha os dados do DataFrame canônico (sem cópia) e é montada
+    uma vez por snapshot.
+    """
+    key = ('visao',) + tuple(sorted(names.items()))
+    return snapshot.cached_payload(key, lambda: snapshot.df.rename(columns=names, copy=False))
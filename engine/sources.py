@@ -0,0 +1,352 @@
+"""Fontes de dados (planilhas/tenants) com cache de snapshot por fonte."""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from engine.metrics import REGISTRY, cache_event
+
+
+# Orçamento global de memória para os datasets carregados (MB)
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# Quantidade máxima de itens no cache de figuras: cada combinação de filtros
+# ocupa um item por seção da página (KPIs, 7 gráficos e a tabela de contratos)
+FIGURE_CACHE_SIZE = 640
+
+# Quantidade máxima de respostas prontas (usuários, rateios) guardadas por snapshot
+PAYLOAD_CACHE_SIZE = 512
+
+logger = logging.getLogger(__name__)
+
+EVICTIONS = REGISTRY.counter(
+    'dashboard_dataset_evictions_total', 'Datasets descarregados pelo orçamento de memória', ('tenant',)
+)
+
+
+def frame_nbytes(df):
+    """Memória ocupada pelo DataFrame
+
+    Textos repetidos compartilham o mesmo objeto (leitura e validação), então
+    cada objeto distinto de uma coluna é contado uma vez; o
+    memory_usage(deep=True) o contaria em toda célula.
+    """
+    total = int(df.memory_usage(deep=False).sum())
+    for column in df.columns:
+        if df[column].dtype == object:
+            total += sum(map(sys.getsizeof, pd.unique(df[column])))
+    return total
+
+
+class Snapshot:
+    """Versão imutável do dataset de uma fonte, com índices e cache de figuras"""
+
+    def __init__(self, df, version, mtime, quality=None):
+        self.df = df
+        self.version = version
+        self.mtime = mtime
+        self.quality = quality
+        self.loaded_at = time.time()
+        self.nbytes = frame_nbytes(df)
+        self._indexes = {}
+        self._filter_options = None
+        self._figures = OrderedDict()
+        self._payloads = OrderedDict()
+        # Entradas montadas pelo pré-cálculo: fora dos LRUs, não são descartadas
+        self._pinned = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def index(self, column, casefold=False):
+        """Retorna {valor: posições} para a coluna, construído uma única vez
+
+        Com `casefold`, as chaves são o texto em minúsculas (busca sem caixa).
+        """
+        idx = self._indexes.get((column, casefold))
+        cache_event('indices', idx is not None)
+        if idx is None:
+            idx = {}
+            if column in self.df.columns:
+                for k, v in self.df.groupby(column, sort=False).indices.items():
+                    key = str(k).lower() if casefold else k
+                    idx[key] = np.sort(np.concatenate([idx[key], v])) if key in idx else np.asarray(v)
+            self._indexes[(column, casefold)] = idx
+        return idx
+
+    def positions(self, column, value, casefold=False):
+        """Posições das linhas em que a coluna é igual ao valor"""
+        if casefold:
+            value = str(value).strip().lower()
+        return self.index(column, casefold).get(value, np.empty(0, dtype=np.intp))
+
+    def filter_options(self):
+        """Valores distintos (ordenados) usados nos selects de filtro"""
+        if self._filter_options is None:
+            df = self.df
+            self._filter_options = {
+                'empresas': sorted(df['empresa'].dropna().unique()),
+                'estados': sorted(df['estado'].dropna().unique()),
+                'setores': sorted(df['setor'].dropna().unique()),
+                'centros_custo': sorted(df['Centro de Custo'].dropna().unique()),
+                'licencas': sorted(df['licenca'].dropna().unique()),
+                'modalidades': sorted(df['modalidadeLicenca'].dropna().unique())
+            }
+        return self._filter_options
+
+    def cached_figures(self, key, builder):
+        """Cache LRU de figuras/KPIs por combinação de filtros"""
+        return self._cached(self._figures, 'figuras', FIGURE_CACHE_SIZE, key, builder)
+
+    def cached_payload(self, key, builder):
+        """Cache LRU de respostas prontas (JSON de usuários, CSV de rateio)"""
+        return self._cached(self._payloads, 'respostas', PAYLOAD_CACHE_SIZE, key, builder)
+
+    def peek_payload(self, key):
+        """Resposta em cache para `key`, ou None (sem montar nem contar no cache)"""
+        with self._lock:
+            pinned = self._pinned.get(('respostas', key))
+            return pinned if pinned is not None else self._payloads.get(key)
+
+    @contextmanager
+    def pinning(self):
+        """Entradas de cache montadas (ou lidas) dentro do bloco, nesta thread, ficam
+        fixas: o pré-cálculo não é descartado pelo tráfego antes de ser usado"""
+        self._local.pin = True
+        try:
+            yield
+        finally:
+            self._local.pin = False
+
+    def _cached(self, store, name, size, key, builder):
+        pin = getattr(self._local, 'pin', False)
+        with self._lock:
+            if (name, key) in self._pinned:
+                cache_event(name, True)
+                return self._pinned[(name, key)]
+            if key in store:
+                cache_event(name, True)
+                if pin:
+                    self._pinned[(name, key)] = store.pop(key)
+                    return self._pinned[(name, key)]
+                store.move_to_end(key)
+                return store[key]
+        cache_event(name, False)
+        value = builder()
+        with self._lock:
+            if pin:
+                self._pinned[(name, key)] = value
+                return value
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > size:
+                store.popitem(last=False)
+        return value
+
+
+def _unpack(loaded):
+    # O loader pode devolver só o DataFrame ou (DataFrame, relatório de qualidade)
+    return loaded if isinstance(loaded, tuple) else (loaded, None)
+
+
+class DataSource:
+    """Uma planilha configurada (um tenant / grupo de negócio)"""
+
+    def __init__(self, slug, path, sheet='Planilha1', label=None):
+        self.slug = slug
+        self.path = path
+        self.sheet = sheet
+        self.label = label or slug
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    def file_version(self):
+        """Identificador da versão do arquivo (mtime + tamanho)"""
+        st = os.stat(self.path)
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}", st.st_mtime
+
+    def load(self, loader):
+        """Retorna (snapshot, recarregado), relendo a planilha só quando ela muda"""
+        version, mtime = self.file_version()
+        snap = self.snapshot
+        if snap is not None and snap.version == version:
+            cache_event('snapshot', True)
+            return snap, False
+        with self._lock:
+            snap = self.snapshot
+            if snap is not None and snap.version == version:
+                cache_event('snapshot', True)
+                return snap, False
+            cache_event('snapshot', False)
+            df, quality = _unpack(loader(self.path, self.sheet))
+            self.snapshot = Snapshot(df, version, mtime, quality)
+            return self.snapshot, True
+
+    def install(self, loaded, version, mtime):
+        """Instala um dataset já lido (ex.: pela ingestão paralela)"""
+        with self._lock:
+            df, quality = _unpack(loaded)
+            self.snapshot = Snapshot(df, version, mtime, quality)
+            return self.snapshot
+
+    def unload(self):
+        self.snapshot = None
+
+
+class SourceRegistry:
+    """Registro de fontes com orçamento global de memória (despejo LRU)"""
+
+    def __init__(self, sources, loader, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        if not sources:
+            raise ValueError('Nenhuma fonte de dados configurada')
+        self.sources = OrderedDict((s.slug, s) for s in sources)
+        self.default_slug = next(iter(self.sources))
+        self.loader = loader
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._lru = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def get(self, slug=None):
+        """Retorna a fonte pelo slug (None = fonte padrão) ou None se não existir"""
+        return self.sources.get(slug or self.default_slug)
+
+    def snapshot(self, slug=None):
+        """Snapshot atual da fonte, carregando-o e aplicando o orçamento se necessário"""
+        source = self.get(slug)
+        if source is None:
+            raise KeyError(slug)
+        snap, reloaded = source.load(self.loader)
+        with self._lock:
+            self._lru[source.slug] = snap.nbytes
+            self._lru.move_to_end(source.slug)
+            if reloaded:
+                self._evict(keep=source.slug)
+        if reloaded:
+            self._notify(source.slug, snap)
+        return snap
+
+    def add_listener(self, fn):
+        """Registra fn(slug, snapshot), chamada a cada nova versão carregada"""
+        self._listeners.append(fn)
+        return fn
+
+    def _notify(self, slug, snap):
+        for fn in self._listeners:
+            try:
+                fn(slug, snap)
+            except Exception:
+                logger.exception('Erro notificando nova versão de %s', slug)
+
+    def refresh(self, load=()):
+        """Recarrega as fontes já carregadas cujo arquivo mudou (e as fontes em `load`)
+
+        Fontes descarregadas pelo orçamento de memória só voltam sob demanda.
+        """
+        for s in list(self.sources.values()):
+            if s.snapshot is None and s.slug not in load:
+                continue
+            try:
+                self.snapshot(s.slug)
+            except OSError:
+                logger.exception('Erro relendo a planilha de %s', s.slug)
+
+    def preload(self, prepare, max_workers=None, columns=None, aliases=None):
+        """Carrega todas as fontes ainda não carregadas lendo as planilhas em paralelo
+
+        `prepare` recebe o DataFrame lido da aba e devolve o DataFrame tratado
+        (ou DataFrame e relatório de qualidade);
+        `columns` limita a leitura às colunas usadas (`aliases`: cabeçalhos
+        alternativos). Retorna o relatório de tempos da ingestão.
+        """
+        from engine.ingest import ingest_files
+
+        pending = [s for s in self.sources.values() if s.snapshot is None]
+        if not pending:
+            return []
+        versions = {s.slug: s.file_version() for s in pending}
+        paths = list(dict.fromkeys(s.path for s in pending))
+        sheets = {}
+        for s in pending:
+            sheets.setdefault(s.path, []).append(s.sheet)
+        results, report = ingest_files(paths, sheets, max_workers, columns, aliases)
+        for s in pending:
+            version, mtime = versions[s.slug]
+            snap = s.install(prepare(results[s.path][s.sheet]), version, mtime)
+            with self._lock:
+                self._lru[s.slug] = snap.nbytes
+                self._evict(keep=s.slug)
+            self._notify(s.slug, snap)
+        return report
+
+    def stats(self):
+        """Situação de cada fonte (carregada, linhas, memória, versão, linhas rejeitadas)"""
+        out = []
+        for s in self.sources.values():
+            snap = s.snapshot
+            out.append({
+                'slug': s.slug,
+                'carregado': snap is not None,
+                'linhas': len(snap.df) if snap else 0,
+                'bytes': snap.nbytes if snap else 0,
+                'versao': snap.version if snap else None,
+                'carregado_em': snap.loaded_at if snap else None,
+                'rejeitadas': (snap.quality or {}).get('linhas_rejeitadas', 0) if snap else 0,
+                'figuras_em_cache': len(snap._figures) if snap else 0,
+                'respostas_em_cache': len(snap._payloads) if snap else 0
+            })
+        return out
+
+    def memory_usage(self):
+        with self._lock:
+            return sum(self._lru.values())
+
+    def _evict(self, keep):
+        # Remove os datasets menos usados recentemente até caber no orçamento
+        for slug in list(self._lru):
+            if sum(self._lru.values()) <= self.memory_budget:
+                break
+            if slug == keep:
+                continue
+            del self._lru[slug]
+            self.sources[slug].unload()
+            EVICTIONS.inc(tenant=slug)
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9_-]+', '-', str(text).strip().lower()).strip('-') or 'default'
+
+
+def sources_from_env(default_file):
+    """Monta as fontes a partir de DATA_SOURCES_FILE (JSON) ou DATA_SOURCES (slug=caminho;...)
+
+    Sem configuração, usa uma única fonte 'default' apontando para EXCEL_FILE.
+    """
+    config_file = os.environ.get('DATA_SOURCES_FILE')
+    if config_file and os.path.exists(config_file):
+        with open(config_file, encoding='utf-8') as fh:
+            config = json.load(fh)
+        entries = config.get('tenants', config) if isinstance(config, dict) else config
+        return [
+            DataSource(slugify(e['slug']), e['path'], e.get('sheet', 'Planilha1'), e.get('label'))
+            for e in entries
+        ]
+
+    spec = os.environ.get('DATA_SOURCES', '').strip()
+    if spec:
+        sources = []
+        for item in spec.split(';'):
+            if not item.strip():
+                continue
+            slug, _, path = item.partition('=')
+            sources.append(DataSource(slugify(slug), path.strip()))
+        return sources
+
+    return [DataSource('default', os.environ.get('EXCEL_FILE', default_file))]
@@ -0,0 +1,178 @@
+"""Pré-cálculo em segundo plano dos caches a cada nova versão do dataset"""
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from engine.metrics import REGISTRY
+
+
+# Threads do pool de pré-cálculo
+DEFAULT_WORKERS = 2
+
+# Intervalo (s) entre verificações de mudança nas planilhas
+DEFAULT_POLL_SECONDS = 30
+
+# Erros guardados no progresso de cada tenant
+MAX_ERRORS = 20
+
+logger = logging.getLogger(__name__)
+
+WARMUP_JOBS = REGISTRY.counter(
+    'dashboard_warmup_jobs_total', 'Tarefas de pré-cálculo por resultado', ('tenant', 'kind', 'result')
+)
+
+
+class WarmupScheduler:
+    """Fila de pré-cálculo com prioridades, executada por um pool limitado de threads
+
+    Cada tarefa é (prioridade, tipo, nome, função); prioridades menores rodam
+    primeiro. Quando chega uma nova versão do dataset de um tenant, as tarefas
+    pendentes da versão anterior são descartadas.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, context=None):
+        self.max_workers = max(1, int(max_workers))
+        self.context = context
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._versions = {}
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            for i in range(self.max_workers):
+                t = threading.Thread(target=self._worker, name=f'warmup-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def schedule(self, slug, version, jobs):
+        """Agenda as tarefas da versão `version` do tenant (ignorado se o pool não foi iniciado)"""
+        if not self.running:
+            return 0
+        jobs = list(jobs)
+        with self._lock:
+            self._versions[slug] = version
+            self._progress[slug] = {
+                'versao': version,
+                'total': len(jobs),
+                'concluidas': 0,
+                'falhas': 0,
+                'em_execucao': [],
+                'por_tipo': {},
+                'inicio': time.time(),
+                'fim': None if jobs else time.time(),
+                'erros': []
+            }
+            por_tipo = self._progress[slug]['por_tipo']
+            for priority, kind, name, fn in jobs:
+                tipo = por_tipo.setdefault(kind, {'total': 0, 'concluidas': 0})
+                tipo['total'] += 1
+                self._queue.put((priority, next(self._seq), slug, version, kind, name, fn))
+        return len(jobs)
+
+    def progress(self, slug=None):
+        """Progresso do pré-cálculo (de um tenant ou de todos)"""
+        with self._lock:
+            items = {k: dict(v, em_execucao=list(v['em_execucao'])) for k, v in self._progress.items()}
+        for p in items.values():
+            finalizadas = p['concluidas'] + p['falhas']
+            p['percentual'] = round(100.0 * finalizadas / p['total'], 1) if p['total'] else 100.0
+            p['segundos'] = round((p['fim'] or time.time()) - p['inicio'], 2)
+        if slug is not None:
+            return items.get(slug, {'total': 0, 'concluidas': 0, 'percentual': 0.0, 'ativo': self.running})
+        return items
+
+    def join(self, timeout=None):
+        """Aguarda a fila esvaziar (útil em scripts e benchmarks)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _worker(self):
+        while True:
+            priority, _, slug, version, kind, name, fn = self._queue.get()
+            try:
+                with self._lock:
+                    # Tarefa de uma versão antiga: descartada
+                    if self._versions.get(slug) != version:
+                        continue
+                    progress = self._progress[slug]
+                    progress['em_execucao'].append(name)
+                ok = self._run(fn, slug, kind, name)
+                with self._lock:
+                    if self._versions.get(slug) != version:
+                        continue
+                    progress['em_execucao'].remove(name)
+                    if ok:
+                        progress['concluidas'] += 1
+                        progress['por_tipo'][kind]['concluidas'] += 1
+                    else:
+                        progress['falhas'] += 1
+                        if len(progress['erros']) < MAX_ERRORS:
+                            progress['erros'].append(f'{kind}: {name}')
+                    if progress['concluidas'] + progress['falhas'] >= progress['total']:
+                        progress['fim'] = time.time()
+            finally:
+                self._queue.task_done()
+
+    def _run(self, fn, slug, kind, name):
+        try:
+            if self.context is not None:
+                with self.context():
+                    fn()
+            else:
+                fn()
+            WARMUP_JOBS.inc(tenant=slug, kind=kind, result='ok')
+            return True
+        except Exception:
+            logger.exception('Erro no pré-cálculo %s/%s (%s)', kind, name, slug)
+            WARMUP_JOBS.inc(tenant=slug, kind=kind, result='erro')
+            return False
+
+
+class SourceWatcher:
+    """Verifica periodicamente se as planilhas mudaram e recarrega em segundo plano
+
+    Assim a releitura (e o pré-cálculo disparado por ela) não fica para o
+    primeiro usuário depois da atualização.
+    """
+
+    def __init__(self, registry, interval=DEFAULT_POLL_SECONDS, initial=()):
+        self.registry = registry
+        self.interval = interval
+        self.initial = tuple(initial)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='source-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        load = self.initial
+        while not self._stop.is_set():
+            try:
+                self.registry.refresh(load=load)
+            except Exception:
+                logger.exception('Erro verificando as planilhas')
+            load = ()
+            self._stop.wait(self.interval)
@@ -0,0 +1,83 @@
+"""Planilhas XLSX em modo write-only (memória constante), com células numéricas formatadas"""
+import re
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+
+MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Formatos numéricos (o Excel aplica os separadores da região do usuário)
+BRL = '"R$" #,##0.00'
+INTEGER = '#,##0'
+PERCENT = '0.00"%"'  # valores já multiplicados por 100
+DATE = 'DD/MM/YYYY'
+
+HEADER_FONT = Font(bold=True)
+
+# Título de aba: até 31 caracteres, sem []:*?/\
+_INVALID_TITLE = re.compile(r'[\[\]:*?/\\]')
+
+
+def sheet_title(text, used):
+    """Título válido e único para a aba"""
+    base = _INVALID_TITLE.sub('_', str(text)).strip("' ") or 'Planilha'
+    title = base[:31]
+    n = 2
+    while title.lower() in used:
+        suffix = f' ({n})'
+        title = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def _header(ws, name):
+    cell = WriteOnlyCell(ws, value=str(name))
+    cell.font = HEADER_FONT
+    return cell
+
+
+def _cell(ws, value, number_format=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+
+def write_workbook(fh, sheets):
+    """Grava as abas em `fh` (caminho ou arquivo binário)
+
+    `sheets` é um iterável de (título, colunas, linhas, formatos): `linhas` é um
+    iterável de tuplas na ordem de `colunas` (consumido linha a linha) e
+    `formatos` mapeia coluna -> formato numérico. Valores ausentes (None/NaN/NaT)
+    viram células vazias; textos iniciados por '=' não viram fórmulas.
+    """
+    wb = Workbook(write_only=True)
+    used = set()
+    for title, columns, rows, formats in sheets:
+        ws = wb.create_sheet(sheet_title(title, used))
+        ws.freeze_panes = 'A2'
+        for i, name in enumerate(columns, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = max(12, len(str(name)) + 4)
+        ws.append([_header(ws, name) for name in columns])
+
+        number_formats = [formats.get(name) for name in columns]
+        for row in rows:
+            out = []
+            for value, number_format in zip(row, number_formats):
+                if value is None or value != value:  # None, NaN e NaT
+                    out.append(None)
+                elif number_format:
+                    out.append(_cell(ws, value, number_format))
+                elif isinstance(value, str) and value.startswith('='):
+                    cell = _cell(ws, value)
+                    cell.data_type = 's'
+                    out.append(cell)
+                else:
+                    out.append(value)
+            ws.append(out)
+    wb.save(fh)
+
@@ -0,0 +1,622 @@
+// POST de exportação: respostas 202 são exportações em segundo plano, acompanhadas
+// por /api/jobs/<id> até o arquivo ficar pronto; devolve {blob, filename} ou {url}
+window.fetchExport = function(url, payload, fallbackName){
+    function waitJob(job){
+        return new Promise(function(resolve, reject){
+            (function poll(){
+                fetch(job.status_url).then(function(r){ return r.json(); }).then(function(info){
+                    if (info.status === 'concluido') resolve({ url: info.download_url, filename: info.arquivo });
+                    else if (info.status === 'erro' || !info.status) reject(new Error(info.erro || info.error || 'Falha na exportação'));
+                    else setTimeout(poll, 1000);
+                }).catch(reject);
+            })();
+        });
+    }
+    return fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+    }).then(function(res){
+        if (res.status === 202) return res.json().then(waitJob);
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        const disposition = res.headers.get('Content-Disposition') || '';
+        const match = /filename="(.+)"/.exec(disposition);
+        const filename = res.headers.get('X-Filename') || (match ? match[1] : fallbackName);
+        return res.blob().then(function(blob){ return { blob: blob, filename: filename }; });
+    });
+};
+window.saveExport = function(data){
+    const a = document.createElement('a');
+    a.href = data.blob ? URL.createObjectURL(data.blob) : data.url;
+    a.download = data.filename;
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+    if (data.blob) URL.revokeObjectURL(a.href);
+};
+
+// Seções da página: o servidor envia cada gráfico e a tabela de contratos no fim da
+// própria resposta (streaming), em <template id="secao-<nome>"> seguido de
+// preencherSecao(nome). As que não chegarem são buscadas em /api/graph/<nome>
+// (mesmos filtros da URL) quando ficam perto da área visível; depois das visíveis,
+// as demais são buscadas uma a uma com o navegador ocioso
+(function(){
+    const sections = Array.from(document.querySelectorAll('.lazy-section[data-section]'));
+    if (!sections.length) return;
+
+    function loaded(el, name){
+        el.dataset.estado = 'pronto';
+        document.dispatchEvent(new CustomEvent('secao-carregada', { detail: { nome: name } }));
+    }
+
+    function insertFragment(el, html){
+        el.innerHTML = html;
+        // Scripts inseridos via innerHTML não rodam: recria cada um
+        el.querySelectorAll('script').forEach(function(old){
+            const script = document.createElement('script');
+            script.text = old.textContent;
+            old.replaceWith(script);
+        });
+    }
+
+    function load(el){
+        if (el.dataset.estado) return Promise.resolve();
+        el.dataset.estado = 'carregando';
+        const name = el.getAttribute('data-section');
+        return fetch(window.API_BASE + '/api/graph/' + name + window.location.search).then(function(r){
+            if (!r.ok) throw new Error('HTTP ' + r.status);
+            return r.text();
+        }).then(function(html){
+            insertFragment(el, html);
+            loaded(el, name);
+        }).catch(function(err){
+            el.dataset.estado = 'pronto';
+            el.innerHTML = `<div class="alert alert-danger">Erro ao carregar a seção: ${err.message}</div>`;
+        });
+    }
+
+    // Chamada pelo <script> que segue cada seção enviada no streaming da página
+    window.preencherSecao = function(name){
+        const source = document.getElementById('secao-' + name);
+        const el = sections.find(function(s){ return s.getAttribute('data-section') === name; });
+        if (!source || !el || el.dataset.estado) return;
+        insertFragment(el, source.innerHTML);
+        source.remove();
+        loaded(el, name);
+    };
+
+    const idle = window.requestIdleCallback || function(fn){ return setTimeout(fn, 50); };
+    function loadRest(){
+        const next = sections.find(function(el){ return !el.dataset.estado; });
+        if (next) load(next).then(function(){ idle(loadRest); });
+    }
+
+    function loadMissing(){
+        const missing = sections.filter(function(el){ return !el.dataset.estado; });
+        if (!missing.length) return;
+        if (!('IntersectionObserver' in window)) {
+            missing.forEach(load);
+            return;
+        }
+        let first = true;
+        const observer = new IntersectionObserver(function(entries){
+            const visible = entries.filter(function(e){ return e.isIntersecting; }).map(function(e){
+                observer.unobserve(e.target);
+                return load(e.target);
+            });
+            if (first) {
+                first = false;
+                Promise.all(visible).then(function(){ idle(loadRest); });
+            }
+        }, { rootMargin: '200px' });
+        missing.forEach(function(el){ observer.observe(el); });
+    }
+
+    // Enquanto a resposta ainda está chegando, espera o fim do streaming antes de buscar
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', loadMissing);
+    } else {
+        loadMissing();
+    }
+})();
+
+(function() {
+    const listEl = document.getElementById('licencasList');
+    function renderFallbackList(gd) {
+        try {
+            const labels = (gd && gd.data && gd.data[0] && gd.data[0].y) || [];
+            if (!labels || labels.length === 0 || !listEl) return;
+            let html = '<div class="d-flex flex-wrap gap-2">';
+            labels.forEach(lbl => {
+                const text = String(lbl);
+                html += `<button type="button" class="btn btn-sm" style="border:1px solid #026B69;color:#026B69" onclick="window.mostrarUsuarios('${text.replace(/'/g, "&#39;")}')">${text}</button>`;
+            });
+            html += '</div>';
+            listEl.innerHTML = html;
+        } catch (e) { console.warn('Falha ao montar lista fallback de licenças', e); }
+    }
+
+    function bindClick() {
+        const gd = document.getElementById('graph4');
+        if (!gd) return false;
+        if (gd.dataset.cliqueLigado) return true;
+        if (typeof gd.on === 'function') {
+            gd.dataset.cliqueLigado = '1';
+            try {
+                renderFallbackList(gd);
+                gd.on('plotly_click', function(evt) {
+                    try {
+                        const pt = evt.points && evt.points[0];
+                        const licenca = String((pt && (pt.y ?? pt.label ?? pt.text)) || '');
+                        if (licenca) { window.mostrarUsuarios(licenca); }
+                    } catch (e) {
+                        console.error('Erro ao capturar clique na licença:', e);
+                    }
+                });
+                gd.style.cursor = 'pointer';
+            } catch (e) { console.warn('Falha ao vincular click no gráfico', e); }
+            return true;
+        }
+        return false;
+    }
+    function waitBind() {
+        if (bindClick()) return;
+        let attempts = 0;
+        const iv = setInterval(() => {
+            attempts++;
+            if (bindClick() || attempts > 25) clearInterval(iv);
+        }, 200);
+    }
+    // O gráfico de licenças chega depois, com a seção (ver acima)
+    document.addEventListener('secao-carregada', function(e) {
+        if (e.detail.nome === 'licencas') waitBind();
+    });
+    waitBind();
+})();
+
+(function() {
+    const input = document.getElementById('pesquisa-contratos');
+    if (input) {
+        input.addEventListener('keyup', function() {
+            const termo = input.value.toLowerCase();
+            document.querySelectorAll('#graph_contratos tbody tr').forEach(function(row) {
+                const texto = row.textContent.toLowerCase();
+                row.style.display = texto.includes(termo) ? '' : 'none';
+            });
+        });
+    }
+})();
+
+// Cartão de usuário (modal da licença); altura fixa para a lista virtualizada
+function userCard(usuario){
+    const valorUnitario = usuario['Valor Unitário'];
+    return `
+    <div class="user-card">
+        <div class="row">
+            <div class="col-md-8">
+                <h6 class="mb-1"><strong>${usuario['Colaborador'] || ''}</strong></h6>
+                <p class="mb-1 text-muted small">
+                    📧 ${usuario['Email'] || 'Sem email'}<br>
+                    🏢 ${usuario['Empresa'] || ''}<br>
+                    🏭 Setor: ${usuario['Setor'] || ''}<br>
+                    🗺️ Estado: ${usuario['Estado'] || ''}<br>
+                    🏦 Centro de Custo: ${usuario['Centro de Custo'] || ''}
+                </p>
+            </div>
+            <div class="col-md-4 text-end">
+                <p class="mb-1"><strong>Criação:</strong> ${usuario['Data de Criação'] || ''}</p>
+                <p class="mb-1"><strong>Qtd:</strong> ${usuario['Quantidade'] ?? ''}</p>
+                <p class="mb-1"><strong>Valor Unit:</strong> ${valorUnitario ? 'R$ ' + Number(valorUnitario).toLocaleString('pt-BR', {minimumFractionDigits:2}) : ''}</p>
+                <p class="mb-0"><strong>Valor Total:</strong> ${usuario['Valor Total'] || ''}</p>
+            </div>
+        </div>
+    </div>`;
+}
+
+// Lista do modal aberto (cancelada ao abrir outro)
+let usuariosModalList = null;
+
+window.mostrarUsuarios = function(licenca) {
+    const modalEl = document.getElementById('modalUsuarios');
+    const modalBody = document.getElementById('modalBody');
+    const modalTitle = document.getElementById('modalTitle');
+
+    if (!modalEl || !modalBody || !modalTitle) {
+        console.error('ERRO: Elementos do modal não encontrados!');
+        alert('Erro ao abrir modal. Por favor, recarregue a página.');
+        return;
+    }
+    if (usuariosModalList) { usuariosModalList.abort(); usuariosModalList = null; }
+
+    // Atualizar título
+    modalTitle.textContent = `👥 Usuários da Licença: ${licenca}`;
+
+    // Mostrar loading
+    modalBody.innerHTML = `
+        <div class="text-center p-4">
+            <div class="spinner-border text-primary" role="status">
+                <span class="visually-hidden">Carregando...</span>
+            </div>
+            <p class="mt-3">Carregando usuários...</p>
+        </div>
+    `;
+
+    // Abrir modal
+    try {
+        const modal = new bootstrap.Modal(modalEl);
+        modal.show();
+    } catch(e) {
+        console.error('Erro ao abrir modal:', e);
+    }
+
+    // Primeiro só o total e os filtros rápidos; as linhas vêm em blocos conforme a rolagem
+    const url = `${window.API_BASE}/api/usuarios/${encodeURIComponent(licenca)}`;
+
+    fetch(url + window.queryString({ limit: 0, facetas: 1 }))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data || typeof data !== 'object') {
+                throw new Error('Resposta inválida da API');
+            }
+
+            if (!data.total_usuarios) {
+                modalBody.innerHTML = `
+                    <div class="alert alert-info">
+                        <strong>Total de usuários: 0</strong><br>
+                        Nenhum usuário encontrado para esta licença.
+                    </div>
+                `;
+                return;
+            }
+
+            // Estado do filtro (aplicado no servidor)
+            const filtros = { q: '', empresa: null, setor: null, estado: null };
+
+            // Construir HTML
+            modalBody.innerHTML = `
+                <div class="d-flex align-items-center justify-content-between mb-3">
+                    <div class="alert alert-info mb-0">
+                        <strong>Total de usuários com esta licença: ${data.total_usuarios}</strong>
+                    </div>
+                    <div class="input-group" style="max-width: 360px;">
+                        <input type="text" id="usuarios-search" class="form-control form-control-sm" placeholder="Pesquisar usuário, email, empresa...">
+                        <button class="btn btn-outline-secondary btn-sm" id="usuarios-clear" type="button">Limpar</button>
+                    </div>
+                </div>
+
+                <div class="mb-3">
+                    <div class="d-flex flex-wrap gap-2 align-items-center">
+                        <span class="text-muted small me-2">Filtros rápidos:</span>
+                        <div id="chips-empresa" class="d-flex flex-wrap gap-2"></div>
+                        <div id="chips-setor" class="d-flex flex-wrap gap-2"></div>
+                        <div id="chips-estado" class="d-flex flex-wrap gap-2"></div>
+                        <button class="btn btn-sm btn-outline-secondary" id="chips-clear">Limpar filtros</button>
+                    </div>
+                </div>
+                <div id="usuariosList" class="vlist" style="height: 420px;"></div>
+                <div id="usuariosStatus" class="small text-muted mt-2"></div>
+            `;
+
+            const input = document.getElementById('usuarios-search');
+            const clearBtn = document.getElementById('usuarios-clear');
+            const chipsEmpresa = document.getElementById('chips-empresa');
+            const chipsSetor = document.getElementById('chips-setor');
+            const chipsEstado = document.getElementById('chips-estado');
+            const chipsClear = document.getElementById('chips-clear');
+            const statusEl = document.getElementById('usuariosStatus');
+
+            const list = usuariosModalList = new window.VirtualList({
+                container: document.getElementById('usuariosList'),
+                rowHeight: 190,
+                fetchBlock: (offset, limit, signal) => fetch(url + window.queryString(Object.assign({ offset: offset, limit: limit }, filtros)), { signal: signal })
+                    .then(r => { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); })
+                    .then(page => ({ total: page.total, rows: page.usuarios })),
+                renderRow: userCard,
+                onLoad: page => { statusEl.textContent = `${page.total} de ${page.total_usuarios} usuários`; },
+                onError: err => { statusEl.innerHTML = `<span class="text-danger">Erro ao carregar usuários: ${err.message}</span>`; }
+            });
+
+            // Marcar chips ativos
+            const toggleActive = (container, kind, current) => {
+                if (!container) return;
+                container.querySelectorAll(`.${kind}-chip-item`).forEach(btn => {
+                    const value = btn.getAttribute('data-value');
+                    btn.classList.toggle('btn-primary', current === value);
+                    btn.classList.toggle('btn-outline-primary', current !== value);
+                });
+            };
+            const update = () => {
+                list.reset();
+                toggleActive(chipsEmpresa, 'empresa', filtros.empresa);
+                toggleActive(chipsSetor, 'setor', filtros.setor);
+                toggleActive(chipsEstado, 'estado', filtros.estado);
+            };
+
+            const renderChips = (items, container, kind) => {
+                if (!container) return;
+                container.innerHTML = items.map(val => `
+                    <button type="button" class="btn btn-sm ${kind}-chip ${kind}-chip-item btn-outline-primary" data-value="${String(val)}">
+                        ${String(val)}
+                    </button>
+                `).join('');
+                container.querySelectorAll(`.${kind}-chip-item`).forEach(btn => {
+                    btn.addEventListener('click', () => {
+                        const value = btn.getAttribute('data-value');
+                        filtros[kind] = (filtros[kind] === value ? null : value);
+                        update();
+                    });
+                });
+            };
+
+            input.addEventListener('input', window.debounce(() => { filtros.q = input.value.trim(); update(); }, 150));
+            clearBtn.addEventListener('click', () => { input.value = ''; filtros.q = ''; update(); input.focus(); });
+            if (chipsClear) chipsClear.addEventListener('click', () => {
+                filtros.empresa = null; filtros.setor = null; filtros.estado = null; update();
+            });
+
+            const facetas = data.facetas || {};
+            renderChips(facetas.empresas || [], chipsEmpresa, 'empresa');
+            renderChips(facetas.setores || [], chipsSetor, 'setor');
+            renderChips(facetas.estados || [], chipsEstado, 'estado');
+        })
+        .catch(error => {
+            console.error('Erro ao carregar usuários:', error);
+            modalBody.innerHTML = `
+                <div class="alert alert-danger">
+                    <strong>Erro ao carregar usuários:</strong><br>
+                    ${error.message || 'Por favor, tente novamente.'}
+                </div>
+            `;
+        });
+}
+
+// Fallback/global handler para abrir a modal de TODOS os usuários ao clicar no KPI:
+// tabela paginada no servidor, com busca e paginador em janela
+(function(){
+    const PAGE_SIZE = 25;
+
+    function renderTable(usuarios){
+        const keys = Object.keys(usuarios[0] || {});
+        let html = '<div class="table-responsive"><table class="table table-sm table-striped"><thead><tr>';
+        for(const k of keys) html += `<th>${k}</th>`;
+        html += '</tr></thead><tbody>';
+        for(const row of usuarios){
+            html += '<tr>';
+            for(const k of keys){
+                html += `<td>${row[k]===null||row[k]===undefined? '': row[k]}</td>`;
+            }
+            html += '</tr>';
+        }
+        return html + '</tbody></table></div>';
+    }
+
+    function openAllUsersModal(){
+        const modalEl = document.getElementById('modalUsuarios');
+        const modalBody = document.getElementById('modalBody');
+        const modalTitle = document.getElementById('modalTitle');
+        if(!modalEl || !modalBody || !modalTitle) return;
+        if (usuariosModalList) { usuariosModalList.abort(); usuariosModalList = null; }
+        modalTitle.textContent = '👥 Todos os Usuários';
+        modalBody.innerHTML = `
+            <input type="text" id="todos-usuarios-search" class="form-control form-control-sm mb-3" placeholder="Pesquisar usuário, email, empresa...">
+            <div id="todos-usuarios-tabela"><p>Carregando usuários...</p></div>
+            <div class="d-flex justify-content-between align-items-center">
+                <div id="todos-usuarios-status" class="small text-muted"></div>
+                <div id="todos-usuarios-pager"></div>
+            </div>`;
+        const bs = new bootstrap.Modal(modalEl);
+        bs.show();
+
+        const input = document.getElementById('todos-usuarios-search');
+        const tableEl = document.getElementById('todos-usuarios-tabela');
+        const statusEl = document.getElementById('todos-usuarios-status');
+        const pagerEl = document.getElementById('todos-usuarios-pager');
+        let controller = null;
+
+        function load(page){
+            if (controller) controller.abort();
+            controller = window.AbortController ? new AbortController() : null;
+            const query = window.queryString({ q: input.value.trim(), offset: (page - 1) * PAGE_SIZE, limit: PAGE_SIZE });
+            fetch(window.API_BASE + '/api/usuarios' + query, { signal: controller && controller.signal }).then(r=>{
+                if(!r.ok) throw new Error('HTTP ' + r.status);
+                return r.json();
+            }).then(data=>{
+                const totalPages = Math.max(1, Math.ceil(data.total / PAGE_SIZE));
+                tableEl.innerHTML = data.usuarios.length ? renderTable(data.usuarios)
+                                                         : '<div class="alert alert-info">Nenhum usuário encontrado.</div>';
+                statusEl.textContent = `Página ${page} de ${totalPages} (${data.total} usuários)`;
+                window.renderPager(pagerEl, page, totalPages, load);
+            }).catch(err=>{
+                if (err.name === 'AbortError') return;
+                console.error('Falha ao carregar todos os usuários (global):', err);
+                tableEl.innerHTML = `<div class="alert alert-danger">Erro ao carregar usuários: ${err.message}</div>`;
+            });
+        }
+
+        input.addEventListener('input', window.debounce(() => load(1), 150));
+        load(1);
+    }
+
+    document.addEventListener('DOMContentLoaded', function(){
+        const kpi = document.getElementById('kpi-total-usuarios');
+        if(kpi){
+            kpi.style.cursor = 'pointer';
+            kpi.addEventListener('click', function(e){
+                try{ openAllUsersModal(); }catch(ex){ console.error(ex); }
+            });
+        }
+    });
+})();
+
+// Lista inline de todos os usuários (mais recentes primeiro): virtualizada, com busca
+// no servidor; a seleção para exportação fica num Set de e-mails, independente das
+// linhas que estão no DOM
+(function(){
+    const listEl = document.getElementById('allusers-list');
+    const loadingEl = document.getElementById('allusers-loading');
+    const input = document.getElementById('allusers-search');
+    const refreshBtn = document.getElementById('allusers-refresh');
+    const exportBtn = document.getElementById('allusers-export');
+    const exportXlsxBtn = document.getElementById('allusers-export-xlsx');
+    const selAll = document.getElementById('allusers-select-all');
+
+    if(!listEl || !loadingEl) return;
+
+    const url = window.API_BASE + '/api/usuarios';
+    const selected = new Set();
+    let termo = '';
+
+    function fetchJSON(query, signal){
+        return fetch(url + window.queryString(query), { signal: signal }).then(r=>{
+            if(!r.ok) throw new Error('HTTP '+r.status);
+            return r.json();
+        });
+    }
+
+    function updateExportButton(){
+        if(exportBtn) exportBtn.disabled = selected.size === 0;
+        if(exportXlsxBtn) exportXlsxBtn.disabled = selected.size === 0;
+    }
+
+    function renderRow(u){
+        const created = u['Data de Criação'] ? String(u['Data de Criação']).replace('T00:00:00','') : '';
+        const email = (u['Email']||'').replace(/"/g,'');
+        return `
+            <div class="user-card mb-2 p-2 border rounded d-flex align-items-center">
+                <div style="width:36px; flex:0 0 36px;">
+                    <input type="checkbox" class="user-select-checkbox form-check-input" data-email="${email}" ${selected.has(email) ? 'checked' : ''}>
+                </div>
+                <div style="flex:1;">
+                    <strong>${u['Colaborador'] || ''}</strong><br>
+                    <small class="text-muted">${u['Email'] || ''} • ${u['Empresa'] || ''} • ${u['Centro de Custo'] || ''}</small>
+                </div>
+                <div style="width:200px; text-align:right;">
+                    <p class="mb-1"><small class="text-muted">${created}</small></p>
+                    <p class="mb-1"><strong>Qtd:</strong> ${u['Quantidade'] ?? ''}</p>
+                    <p class="mb-1"><strong>Valor Unit:</strong> ${u['Valor Unitário']? 'R$ ' + Number(u['Valor Unitário']).toLocaleString('pt-BR', {minimumFractionDigits:2}): ''}</p>
+                    <p class="mb-0"><strong>Valor Total:</strong> ${u['Valor Total'] || ''}</p>
+                </div>
+            </div>`;
+    }
+
+    const list = new window.VirtualList({
+        container: listEl,
+        rowHeight: 140,
+        fetchBlock: (offset, limit, signal) => fetchJSON({ q: termo, ordem: 'recentes', offset: offset, limit: limit }, signal)
+            .then(data => ({ total: data.total, rows: data.usuarios })),
+        renderRow: renderRow,
+        onLoad: () => { loadingEl.style.display = 'none'; listEl.style.display = ''; list.refresh(); },
+        onError: err => {
+            console.error('Erro fetching all users inline:', err);
+            loadingEl.style.display = '';
+            loadingEl.innerHTML = `<div class="text-danger p-3">Erro ao carregar usuários: ${err.message}</div>`;
+        }
+    });
+
+    // Event delegation: um handler no container para todos os checkboxes
+    listEl.addEventListener('change', function(e){
+        if(e.target && e.target.classList.contains('user-select-checkbox')){
+            const email = e.target.getAttribute('data-email');
+            if(e.target.checked) selected.add(email); else selected.delete(email);
+            if(!e.target.checked && selAll) selAll.checked = false;
+            updateExportButton();
+        }
+    });
+
+    // Selecionar todos = todos os usuários encontrados pela busca atual (não só os visíveis)
+    if(selAll){
+        selAll.addEventListener('change', function(){
+            const on = !!this.checked;
+            fetchJSON({ q: termo, campos: 'email' }).then(data=>{
+                data.emails.forEach(email => { if(on) selected.add(email); else selected.delete(email); });
+                updateExportButton();
+                list.refresh();
+            }).catch(err=>{ console.error('Erro ao selecionar usuários:', err); });
+        });
+    }
+
+    if(input) input.addEventListener('input', window.debounce(function(){
+        termo = input.value.trim();
+        if(selAll) selAll.checked = false;
+        list.reset();
+    }, 150));
+    if(refreshBtn) refreshBtn.addEventListener('click', function(){ list.reset(); });
+
+    function exportSelected(format){
+        const emails = Array.from(selected);
+        if(emails.length===0){ alert('Selecione pelo menos um usuário para exportar.'); return; }
+
+        // O servidor calcula os totais por centro de custo a partir da lista de e-mails
+        window.fetchExport(window.API_BASE + '/api/export_selected', { emails: emails, format: format }, 'export_selected.' + format)
+        .then(data=>{ window.saveExport(data); }).catch(err=>{ console.error('Erro export:', err); alert('Erro ao exportar: '+err.message); });
+    }
+    if(exportBtn) exportBtn.addEventListener('click', function(){ exportSelected('csv'); });
+    if(exportXlsxBtn) exportXlsxBtn.addEventListener('click', function(){ exportSelected('xlsx'); });
+})();
+
+// Atualização ao vivo: quando a planilha muda, o servidor avisa por SSE e a página
+// busca só os KPIs e o JSON das figuras, redesenhando apenas os gráficos alterados
+(function(){
+    if (!window.EventSource || !window.fetch) return;
+    const GRAPH_DIVS = { empresas: 'graph1', estados: 'graph2', centro_custo: 'graph3', licencas: 'graph4',
+                         modalidade: 'graph5', setor: 'graph6', faturador: 'graph7' };
+    const figures = {};
+    let version = window.DATASET_VERSION;
+    let pending = null;
+    let loading = false;
+
+    function showNotice(){
+        if (document.getElementById('dataset-update-notice')) return;
+        const notice = document.createElement('div');
+        notice.id = 'dataset-update-notice';
+        notice.className = 'alert alert-info alert-dismissible position-fixed bottom-0 end-0 m-3';
+        notice.style.zIndex = 1080;
+        notice.innerHTML = 'Dados atualizados. Gráficos e indicadores já refletem a nova versão; ' +
+            '<a href="#" onclick="window.location.reload(); return false;">recarregue</a> para atualizar a tabela de contratos.' +
+            '<button type="button" class="btn-close" data-bs-dismiss="alert"></button>';
+        document.body.appendChild(notice);
+    }
+
+    function refresh(target){
+        if (loading || target === version) return;
+        loading = true;
+        fetch(window.API_BASE + '/api/dashboard' + window.location.search).then(function(r){
+            if (!r.ok) throw new Error('HTTP ' + r.status);
+            return r.json();
+        }).then(function(data){
+            version = data.versao;
+            Object.keys(data.kpis).forEach(function(key){
+                const el = document.getElementById('kpi-' + key.replace(/_/g, '-'));
+                if (el) el.textContent = data.kpis[key];
+            });
+            const updated = document.getElementById('update-time');
+            if (updated) updated.textContent = data.atualizado;
+            Object.keys(data.figuras).forEach(function(name){
+                const fig = data.figuras[name];
+                const serialized = JSON.stringify(fig);
+                const el = document.getElementById(GRAPH_DIVS[name]);
+                if (!el || figures[name] === serialized) return;
+                figures[name] = serialized;
+                Plotly.react(el, fig.data, fig.layout, { responsive: true });
+            });
+            showNotice();
+        }).catch(function(err){
+            console.error('Falha ao atualizar o dashboard:', err);
+        }).finally(function(){
+            loading = false;
+            if (pending && pending !== version) refresh(pending);
+        });
+    }
+
+    const source = new EventSource(window.API_BASE + '/api/events?versao=' + encodeURIComponent(version || ''));
+    source.addEventListener('dataset', function(e){
+        const data = JSON.parse(e.data);
+        pending = data.versao;
+        refresh(data.versao);
+    });
+})();
@@ -0,0 +1,190 @@
+// Listas grandes de usuários: só as linhas visíveis ficam no DOM e os dados vêm do
+// servidor em blocos (offset/limit) conforme a rolagem; busca e filtros também
+// rodam no servidor, então digitar não percorre milhares de registros no navegador.
+
+// Adia `fn` até `ms` milissegundos sem novas chamadas (ex.: a cada tecla da busca)
+window.debounce = function(fn, ms){
+    let timer = null;
+    return function(){
+        const args = arguments, self = this;
+        clearTimeout(timer);
+        timer = setTimeout(function(){ fn.apply(self, args); }, ms);
+    };
+};
+
+// Monta a query string ignorando valores vazios
+window.queryString = function(params){
+    const parts = [];
+    Object.keys(params).forEach(function(key){
+        const value = params[key];
+        if (value !== null && value !== undefined && value !== '') {
+            parts.push(encodeURIComponent(key) + '=' + encodeURIComponent(value));
+        }
+    });
+    return parts.length ? '?' + parts.join('&') : '';
+};
+
+// Páginas exibidas no paginador: a primeira, a última e `radius` vizinhas da atual,
+// com null onde há reticências (1 … 4 5 [6] 7 8 … 200)
+window.pageWindow = function(current, totalPages, radius){
+    radius = radius === undefined ? 2 : radius;
+    const pages = [];
+    const start = Math.max(2, current - radius);
+    const end = Math.min(totalPages - 1, current + radius);
+    pages.push(1);
+    if (start > 2) pages.push(null);
+    for (let p = start; p <= end; p++) pages.push(p);
+    if (end < totalPages - 1) pages.push(null);
+    if (totalPages > 1) pages.push(totalPages);
+    return pages;
+};
+
+// Paginador do Bootstrap com janela de páginas; `onPage(p)` é chamado no clique
+window.renderPager = function(el, current, totalPages, onPage){
+    const item = function(page, label, disabled, active){
+        return `<li class="page-item ${disabled ? 'disabled' : ''} ${active ? 'active' : ''}">` +
+               `<a href="#" class="page-link" data-page="${page}">${label}</a></li>`;
+    };
+    let html = '<nav><ul class="pagination pagination-sm mb-0">';
+    html += item(current - 1, '‹', current <= 1, false);
+    window.pageWindow(current, totalPages).forEach(function(p){
+        html += p === null ? '<li class="page-item disabled"><span class="page-link">…</span></li>'
+                           : item(p, p, false, p === current);
+    });
+    html += item(current + 1, '›', current >= totalPages, false);
+    html += '</ul></nav>';
+    el.innerHTML = html;
+    el.onclick = function(e){
+        const link = e.target.closest('.page-link[data-page]');
+        if (!link || link.parentNode.classList.contains('disabled')) return;
+        e.preventDefault();
+        onPage(parseInt(link.getAttribute('data-page'), 10));
+    };
+};
+
+// Lista virtualizada com linhas de altura fixa
+//   container: elemento com altura fixa e overflow-y:auto
+//   fetchBlock(offset, limit, signal) -> Promise<{total, rows}>
+//   renderRow(row, index) -> HTML da linha
+// reset() descarta os blocos (nova busca/filtro) e cancela as requisições em andamento.
+window.VirtualList = function(options){
+    this.el = options.container;
+    this.rowHeight = options.rowHeight;
+    this.blockSize = options.blockSize || 100;
+    this.maxBlocks = options.maxBlocks || 20;
+    this.overscan = options.overscan || 4;
+    this.fetchBlock = options.fetchBlock;
+    this.renderRow = options.renderRow;
+    this.onLoad = options.onLoad || function(){};
+    this.onError = options.onError || function(err){ console.error('Erro ao carregar a lista:', err); };
+    this.emptyText = options.emptyText || 'Nenhum usuário encontrado.';
+    this.generation = 0;
+    this.controller = null;
+    this.frame = null;
+
+    this.spacer = document.createElement('div');
+    this.spacer.style.position = 'relative';
+    this.win = document.createElement('div');
+    this.win.style.cssText = 'position:absolute; top:0; left:0; right:0;';
+    this.spacer.appendChild(this.win);
+    this.el.innerHTML = '';
+    this.el.appendChild(this.spacer);
+
+    const self = this;
+    this.el.addEventListener('scroll', function(){ self.schedule(); }, { passive: true });
+    this.reset();
+};
+
+window.VirtualList.prototype.abort = function(){
+    this.generation++;
+    if (this.controller) this.controller.abort();
+    this.controller = window.AbortController ? new AbortController() : null;
+};
+
+window.VirtualList.prototype.reset = function(){
+    this.abort();
+    this.blocks = new Map();
+    this.pending = new Set();
+    this.total = null;
+    this.range = null;
+    this.el.scrollTop = 0;
+    this.load(0);
+};
+
+window.VirtualList.prototype.load = function(block){
+    if (this.blocks.has(block) || this.pending.has(block)) return;
+    const self = this, generation = this.generation;
+    this.pending.add(block);
+    this.fetchBlock(block * this.blockSize, this.blockSize, this.controller && this.controller.signal)
+        .then(function(data){
+            if (generation !== self.generation) return;
+            self.pending.delete(block);
+            self.blocks.set(block, data.rows);
+            self.total = data.total;
+            self.evict(block);
+            if (block === 0) self.onLoad(data);
+            self.refresh();
+        })
+        .catch(function(err){
+            if (generation !== self.generation || (err && err.name === 'AbortError')) return;
+            self.pending.delete(block);
+            self.onError(err);
+        });
+};
+
+// Mantém em memória só os blocos mais próximos do trecho visível
+window.VirtualList.prototype.evict = function(current){
+    if (this.blocks.size <= this.maxBlocks) return;
+    const far = Array.from(this.blocks.keys()).sort(function(a, b){
+        return Math.abs(b - current) - Math.abs(a - current);
+    });
+    for (let i = 0; i < far.length - this.maxBlocks; i++) this.blocks.delete(far[i]);
+};
+
+window.VirtualList.prototype.schedule = function(){
+    if (this.frame) return;
+    const self = this;
+    this.frame = requestAnimationFrame(function(){ self.frame = null; self.render(); });
+};
+
+// Redesenha as linhas visíveis (ex.: depois de mudar a seleção)
+window.VirtualList.prototype.refresh = function(){
+    this.range = null;
+    this.render();
+};
+
+window.VirtualList.prototype.rowAt = function(index){
+    const rows = this.blocks.get(Math.floor(index / this.blockSize));
+    return rows ? rows[index % this.blockSize] : undefined;
+};
+
+window.VirtualList.prototype.render = function(){
+    if (this.total === null) return;
+    const rh = this.rowHeight;
+    this.spacer.style.height = (this.total * rh) + 'px';
+    if (this.total === 0) {
+        this.win.style.transform = '';
+        this.win.innerHTML = `<div class="text-muted p-3">${this.emptyText}</div>`;
+        return;
+    }
+    const first = Math.max(0, Math.floor(this.el.scrollTop / rh) - this.overscan);
+    const last = Math.min(this.total, Math.ceil((this.el.scrollTop + this.el.clientHeight) / rh) + this.overscan);
+    const range = first + ':' + last;
+    if (range === this.range) return;
+
+    let html = '', missing = false;
+    for (let i = first; i < last; i++) {
+        const row = this.rowAt(i);
+        if (row === undefined) {
+            missing = true;
+            this.load(Math.floor(i / this.blockSize));
+            html += `<div class="vlist-row vlist-placeholder" style="height:${rh}px"></div>`;
+        } else {
+            html += `<div class="vlist-row" style="height:${rh}px" data-index="${i}">${this.renderRow(row, i)}</div>`;
+        }
+    }
+    // Com linhas ainda carregando, redesenha quando o bloco chegar
+    this.range = missing ? null : range;
+    this.win.style.transform = `translateY(${first * rh}px)`;
+    this.win.innerHTML = html;
+};